@@ -0,0 +1,147 @@
+"""Sending an account email to its recipients.
+
+An email can go to any number of contacts. ``send_email`` splits the
+recipients, ordered by id, into shards of ``ACCOUNT_EMAIL_SHARD_SIZE`` and
+queues a ``send_email_shard`` task per shard, so large campaigns are sent by
+all the workers in parallel.
+
+A shard compiles the message template once, loads the contacts it already
+sent to with one query and sends the rest in batches of
+``ACCOUNT_EMAIL_BATCH_SIZE`` over one connection, logging every batch with a
+single insert. Messages are handed to the connection one at a time, so an
+address the server refuses only fails its own message: it is logged as not
+sent and the shard carries on. Running a shard again, e.g. after a worker
+crash, skips the contacts logged as sent, so at most the batch in flight
+during the crash is sent twice.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template import Context, Template
+
+from accounts.models import AccountEmail, AccountEmailLog
+from common.notifications import NOTIFICATION_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_EMAIL_SHARD_SIZE = getattr(settings, "ACCOUNT_EMAIL_SHARD_SIZE", 5000)
+ACCOUNT_EMAIL_BATCH_SIZE = getattr(
+    settings, "ACCOUNT_EMAIL_BATCH_SIZE", NOTIFICATION_BATCH_SIZE
+)
+
+
+def shard_ranges(email, shard_size=ACCOUNT_EMAIL_SHARD_SIZE):
+    """``(first_contact_id, last_contact_id)`` of every shard of the
+    recipients of ``email``."""
+    ranges = []
+    first_id = last_id = None
+    contact_ids = email.recipients.order_by("id").values_list("id", flat=True)
+    for index, contact_id in enumerate(contact_ids.iterator(chunk_size=shard_size)):
+        if index % shard_size == 0:
+            if first_id is not None:
+                ranges.append((first_id, last_id))
+            first_id = contact_id
+        last_id = contact_id
+    if first_id is not None:
+        ranges.append((first_id, last_id))
+    return ranges
+
+
+def _context(contact):
+    return Context(
+        {
+            "email": contact.primary_email or "",
+            "name": " ".join(
+                name for name in (contact.first_name, contact.last_name) if name
+            ),
+        }
+    )
+
+
+def _send_batch(email, connection, batch):
+    started_at = time.monotonic()
+    delivered = set()
+    for contact_id, message in batch:
+        try:
+            if connection.send_messages([message]):
+                delivered.add(contact_id)
+        except Exception:
+            logger.warning(
+                "account email email=%s contact=%s failed",
+                email.id,
+                contact_id,
+                exc_info=True,
+            )
+    AccountEmailLog.objects.bulk_create(
+        [
+            AccountEmailLog(
+                email_id=email.id,
+                contact_id=contact_id,
+                is_sent=contact_id in delivered,
+            )
+            for contact_id, _ in batch
+        ]
+    )
+    logger.info(
+        "account email batch email=%s sent=%s queued=%s duration_ms=%.1f",
+        email.id,
+        len(delivered),
+        len(batch),
+        (time.monotonic() - started_at) * 1000,
+    )
+    return len(delivered)
+
+
+def send_to_recipients(
+    email,
+    first_contact_id=None,
+    last_contact_id=None,
+    connection=None,
+    batch_size=ACCOUNT_EMAIL_BATCH_SIZE,
+):
+    """Send ``email`` to its recipients not sent to yet, between the given
+    contact ids when given, returns the number of messages sent."""
+    contacts = email.recipients.order_by("id")
+    logs = AccountEmailLog.objects.filter(email=email, is_sent=True)
+    if first_contact_id is not None:
+        contacts = contacts.filter(id__gte=first_contact_id, id__lte=last_contact_id)
+        logs = logs.filter(
+            contact_id__gte=first_contact_id, contact_id__lte=last_contact_id
+        )
+    sent_ids = set(logs.order_by().values_list("contact_id", flat=True))
+    template = Template(email.message_body or "")
+    connection = connection or get_connection()
+    sent = 0
+    batch = []
+    html_content = None
+    connection.open()
+    try:
+        for contact in contacts.only(
+            "id", "primary_email", "first_name", "last_name"
+        ).iterator(chunk_size=batch_size):
+            if contact.id in sent_ids or not contact.primary_email:
+                continue
+            html_content = template.render(_context(contact))
+            message = EmailMessage(
+                email.message_subject,
+                html_content,
+                from_email=email.from_email,
+                to=[contact.primary_email],
+                connection=connection,
+            )
+            message.content_subtype = "html"
+            batch.append((contact.id, message))
+            if len(batch) >= batch_size:
+                sent += _send_batch(email, connection, batch)
+                batch = []
+        if batch:
+            sent += _send_batch(email, connection, batch)
+    finally:
+        connection.close()
+    if html_content is not None:
+        AccountEmail.objects.filter(id=email.id).update(
+            rendered_message_body=html_content
+        )
+    return sent
@@ -0,0 +1,95 @@
+import time
+import uuid
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.campaigns import send_to_recipients, shard_ranges
+from accounts.models import AccountEmail, AccountEmailLog
+from common.models import Org
+from contacts.models import Contact
+
+
+class Command(BaseCommand):
+    help = (
+        "Time sending an account email to many recipients, then resuming it "
+        "after half of the logs were lost. Messages go to the dummy email "
+        "backend and everything is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=100000)
+        parser.add_argument(
+            "--email-backend", default="django.core.mail.backends.dummy.EmailBackend"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            email = self.create_email(options["recipients"])
+            backend = options["email_backend"]
+            self.stdout.write("shards: %s" % len(shard_ranges(email)))
+            self.run("send", email, backend)
+            logs = AccountEmailLog.objects.filter(email=email)
+            logs.filter(
+                id__in=logs.order_by("contact_id").values("id")[
+                    : options["recipients"] // 2
+                ]
+            ).delete()
+            self.run("resume", email, backend)
+            transaction.set_rollback(True)
+
+    def create_email(self, recipients):
+        org = Org.objects.create(name="benchmark %s" % uuid.uuid4().hex[:8])
+        contacts = Contact.objects.bulk_create(
+            [
+                Contact(
+                    first_name="first %s" % index,
+                    last_name="last",
+                    primary_email="bench-%s@example.com" % uuid.uuid4().hex,
+                    org=org,
+                )
+                for index in range(recipients)
+            ],
+            batch_size=5000,
+        )
+        email = AccountEmail.objects.create(
+            message_subject="benchmark",
+            message_body="<p>Hello {{ name }}, this was sent to {{ email }}.</p>",
+            from_email="benchmark@example.com",
+        )
+        AccountEmail.recipients.through.objects.bulk_create(
+            [
+                AccountEmail.recipients.through(
+                    accountemail_id=email.id, contact_id=contact.id
+                )
+                for contact in contacts
+            ],
+            batch_size=5000,
+        )
+        return email
+
+    def run(self, name, email, backend):
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.monotonic()
+            sent = 0
+            # the shards one after the other, as a single worker would
+            for first_contact_id, last_contact_id in shard_ranges(email):
+                sent += send_to_recipients(
+                    email,
+                    first_contact_id,
+                    last_contact_id,
+                    connection=get_connection(backend),
+                )
+            elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            "%s: %s messages, %.2fs, %.0f messages/s, %s queries"
+            % (
+                name,
+                sent,
+                elapsed,
+                sent / elapsed if elapsed else 0,
+                len(queries.captured_queries),
+            )
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_autointake_account_current_insurance_company_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='accounts_org_created_idx'),
+        ),
+    ]
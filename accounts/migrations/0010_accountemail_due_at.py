@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:29
+
+import pytz
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_due_at(apps, schema_editor):
+    AccountEmail = apps.get_model("accounts", "AccountEmail")
+    now = timezone.now()
+    emails = AccountEmail.objects.filter(
+        scheduled_later=True, scheduled_date_time__isnull=False
+    )
+    for email in emails.iterator(chunk_size=1000):
+        try:
+            email_timezone = pytz.timezone(email.timezone)
+        except pytz.UnknownTimeZoneError:
+            email_timezone = pytz.UTC
+        # as entered, see accounts.scheduling.get_due_at
+        scheduled = timezone.localtime(email.scheduled_date_time)
+        due_at = email_timezone.localize(scheduled.replace(tzinfo=None)).astimezone(
+            pytz.UTC
+        )
+        # the previous scheduler either sent the past ones or missed them for
+        # good, don't send them all at once now
+        AccountEmail.objects.filter(pk=email.pk).update(
+            due_at=due_at, dispatched_at=now if due_at <= now else None
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_account_accounts_org_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountemail',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='accountemail',
+            name='due_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='accountemail',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', True), ('due_at__isnull', False)), fields=['due_at'], name='account_email_due_idx'),
+        ),
+        migrations.RunPython(fill_due_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_accountemail_due_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='date_of_birth',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
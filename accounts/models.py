@@ -42,7 +42,8 @@ class Account(BaseModel):
     name = models.CharField(pgettext_lazy("Name of Account", "Name"), max_length=64)
     email = models.EmailField()
     phone = CustomPhoneNumberField(null=True, blank=True)
-    date_of_birth = models.DateField()
+    # unknown for the accounts converted from leads
+    date_of_birth = models.DateField(null=True, blank=True)
 
     industry = models.CharField(
         _("Industry Type"), max_length=255, choices=INDCHOICES, blank=True, null=True
@@ -118,6 +119,12 @@ class Account(BaseModel):
         verbose_name_plural = "Accounts"
         db_table = "accounts"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="accounts_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
@@ -177,16 +184,34 @@ class AccountEmail(BaseModel):
     scheduled_later = models.BooleanField(default=False)
     from_email = models.EmailField()
     rendered_message_body = models.TextField(null=True)
+    # scheduled_date_time in UTC, see accounts.scheduling
+    due_at = models.DateTimeField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Account Email"
         verbose_name_plural = "Account Emails"
         db_table = "account_email"
         ordering = ("-created_at",)
+        indexes = [
+            # pending scheduled emails only, see accounts.scheduling
+            models.Index(
+                fields=["due_at"],
+                condition=models.Q(dispatched_at__isnull=True, due_at__isnull=False),
+                name="account_email_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.message_subject}"
 
+    def save(self, *args, **kwargs):
+        # imported here, accounts.scheduling imports this module
+        from accounts.scheduling import get_due_at
+
+        self.due_at = get_due_at(self)
+        super(AccountEmail, self).save(*args, **kwargs)
+
 class AccountEmailLog(BaseModel):
     """this model is used to track if the email is sent or not"""
 
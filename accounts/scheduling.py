@@ -0,0 +1,72 @@
+"""Scheduled account emails.
+
+``scheduled_date_time`` is the wall clock time, as entered, the email goes
+out at in its ``timezone``. ``AccountEmail.save`` stores it in UTC as
+``due_at``, indexed for the emails not dispatched yet, so finding the due
+emails is a range scan of the pending ones only, however many were sent
+before.
+
+``dispatch_due_emails``, run every minute by the ``send_scheduled_emails``
+beat task, claims every email due by now, including the ones a late or
+missed tick left behind, by setting ``dispatched_at`` in the transaction
+queueing its ``send_email`` task. Rows locked by a concurrent run are
+skipped, so each email is queued once; ``send_email`` itself skips the
+contacts it already logged as sent.
+"""
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import AccountEmail
+from common.utils import convert_to_custom_timezone
+
+SCHEDULED_EMAIL_BATCH_SIZE = getattr(settings, "SCHEDULED_EMAIL_BATCH_SIZE", 500)
+
+
+def get_due_at(email):
+    """UTC time ``email`` is due at, ``None`` unless it is scheduled."""
+    if not email.scheduled_later or email.scheduled_date_time is None:
+        return None
+    # the wall clock time entered, naive input is read in TIME_ZONE
+    scheduled = email.scheduled_date_time
+    if timezone.is_aware(scheduled):
+        scheduled = timezone.localtime(scheduled)
+    try:
+        return convert_to_custom_timezone(scheduled, email.timezone, to_utc=True)
+    except pytz.UnknownTimeZoneError:
+        return convert_to_custom_timezone(scheduled, "UTC", to_utc=True)
+
+
+def pending_emails():
+    return AccountEmail.objects.filter(dispatched_at=None, due_at__isnull=False)
+
+
+def _dispatch_batch(now, batch_size):
+    # imported here, accounts.tasks imports this module
+    from accounts.tasks import send_email
+
+    with transaction.atomic():
+        email_ids = list(
+            pending_emails()
+            .filter(due_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by("due_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        AccountEmail.objects.filter(id__in=email_ids).update(dispatched_at=now)
+        # a failure to queue rolls the claim back, the next tick retries
+        for email_id in email_ids:
+            send_email.delay(email_id)
+    return len(email_ids)
+
+
+def dispatch_due_emails(now=None, batch_size=SCHEDULED_EMAIL_BATCH_SIZE):
+    """Queue the emails due by ``now``, returns how many were queued."""
+    now = now or timezone.now()
+    dispatched = 0
+    while True:
+        count = _dispatch_batch(now, batch_size)
+        dispatched += count
+        if count < batch_size:
+            return dispatched
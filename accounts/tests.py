@@ -0,0 +1,141 @@
+import smtplib
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytz
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts import campaigns, scheduling
+from accounts.models import AccountEmail, AccountEmailLog
+from accounts.tasks import send_email
+from contacts.models import Contact
+
+
+class ScheduledEmailTestCase(TestCase):
+    def schedule(self, wall_time, email_timezone="UTC"):
+        return AccountEmail.objects.create(
+            message_subject="subject",
+            message_body="body",
+            from_email="from@example.com",
+            scheduled_later=True,
+            timezone=email_timezone,
+            scheduled_date_time=timezone.make_aware(wall_time),
+        )
+
+    def test_due_at_is_the_wall_clock_time_of_the_email_timezone(self):
+        email = self.schedule(datetime(2026, 1, 5, 9, 30), "America/New_York")
+        self.assertEqual(
+            email.due_at, datetime(2026, 1, 5, 14, 30, tzinfo=pytz.UTC)
+        )
+        email.scheduled_later = False
+        email.save()
+        self.assertIsNone(email.due_at)
+
+    @mock.patch("accounts.tasks.send_email.delay")
+    def test_due_emails_are_dispatched_once(self, delay):
+        now = timezone.now()
+        wall_time = now.astimezone(pytz.UTC).replace(tzinfo=None)
+        # due long before, e.g. missed while the beat was down
+        missed = self.schedule(wall_time - timedelta(hours=3))
+        due = self.schedule(wall_time - timedelta(minutes=1))
+        self.schedule(wall_time + timedelta(minutes=10))
+
+        self.assertEqual(scheduling.dispatch_due_emails(now, batch_size=1), 2)
+        self.assertEqual(
+            [call.args[0] for call in delay.call_args_list], [missed.id, due.id]
+        )
+        self.assertEqual(scheduling.dispatch_due_emails(now), 0)
+        self.assertEqual(
+            scheduling.dispatch_due_emails(now + timedelta(minutes=10)), 1
+        )
+        self.assertFalse(scheduling.pending_emails().exists())
+
+
+class RefusingEmailBackend(EmailBackend):
+    """Locmem backend failing like SMTP on the ``refused`` address."""
+
+    def __init__(self, refused, **kwargs):
+        super().__init__(**kwargs)
+        self.refused = refused
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refused in message.to:
+                raise smtplib.SMTPRecipientsRefused({self.refused: (550, b"refused")})
+        return super().send_messages(messages)
+
+
+class AccountEmailCampaignTestCase(TestCase):
+    def setUp(self):
+        self.email = AccountEmail.objects.create(
+            message_subject="subject",
+            message_body="<p>Hello {{ name }}</p>",
+            from_email="from@example.com",
+        )
+        self.contacts = [
+            Contact.objects.create(
+                first_name="first%s" % index,
+                last_name="last",
+                primary_email="contact%s@example.com" % index,
+            )
+            for index in range(5)
+        ]
+        self.email.recipients.add(*self.contacts)
+
+    def test_send_skips_the_contacts_already_sent_to(self):
+        AccountEmailLog.objects.create(
+            email=self.email, contact=self.contacts[0], is_sent=True
+        )
+        # logs, contacts, a log insert per batch and the rendered body
+        with self.assertNumQueries(2 + 2 + 1):
+            sent = campaigns.send_to_recipients(self.email, batch_size=2)
+        self.assertEqual(sent, 4)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["contact%s@example.com" % index for index in range(1, 5)],
+        )
+        self.assertIn(
+            "<p>Hello first1 last</p>", [message.body for message in mail.outbox]
+        )
+        self.assertEqual(
+            AccountEmailLog.objects.filter(email=self.email, is_sent=True).count(), 5
+        )
+
+        send_email(self.email.id)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_refused_addresses_do_not_stop_the_shard(self):
+        connection = RefusingEmailBackend(refused="contact1@example.com")
+        sent = campaigns.send_to_recipients(
+            self.email, connection=connection, batch_size=2
+        )
+        self.assertEqual(sent, 4)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(
+            AccountEmailLog.objects.filter(email=self.email, is_sent=True).count(), 4
+        )
+        self.assertTrue(
+            AccountEmailLog.objects.filter(
+                email=self.email, contact=self.contacts[1], is_sent=False
+            ).exists()
+        )
+
+        # a rerun only retries the refused address
+        campaigns.send_to_recipients(
+            self.email, connection=RefusingEmailBackend(refused=None)
+        )
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[-1].to, ["contact1@example.com"])
+
+    def test_shards_cover_every_recipient(self):
+        ranges = campaigns.shard_ranges(self.email, shard_size=2)
+        self.assertEqual(len(ranges), 3)
+        sent = sum(
+            campaigns.send_to_recipients(self.email, first, last)
+            for first, last in ranges
+        )
+        self.assertEqual(sent, 5)
+        self.assertEqual(len(mail.outbox), 5)
@@ -7,7 +7,6 @@ from drf_rw_serializers import generics
 
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -37,6 +36,8 @@ from teams.serializer import TeamsSerializer
 from accounts.tasks import send_email, send_email_to_assigned_user
 from cases.serializer import CaseSerializer
 from common.models import Attachments, Comment, Profile
+from common.pagination import KeysetPagination
+from common.search import filter_by_search
 from leads.models import Lead
 from leads.serializer import LeadSerializer
 
@@ -46,6 +47,7 @@ from common.serializer import (
     CommentSerializer,
     ProfileSerializer,
 )
+from common.tasks import send_email_user_mentions
 from common.utils import (
     CASE_TYPE,
     COUNTRIES,
@@ -54,6 +56,7 @@ from common.utils import (
     PRIORITY_CHOICE,
     STATUS_CHOICE,
 )
+from common.visibility import visible_to
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from invoices.serializer import InvoiceSerailizer
@@ -63,7 +66,7 @@ from tasks.serializer import TaskSerializer
 from teams.models import Teams
 
 
-class AccountsListView(APIView, LimitOffsetPagination):
+class AccountsListView(APIView, KeysetPagination):
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
     model = Account
@@ -73,11 +76,13 @@ class AccountsListView(APIView, LimitOffsetPagination):
         params = self.request.query_params
         queryset = self.model.objects.filter(org=self.request.profile.org).order_by("-id")
         if self.request.profile.role != "ADMIN" and not self.request.profile.is_admin:
-            queryset = queryset.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
 
         if params:
+            if params.get("search"):
+                queryset = filter_by_search(
+                    queryset, "accounts", self.request.profile.org, params.get("search")
+                )
             if params.get("name"):
                 queryset = queryset.filter(name__icontains=params.get("name"))
             if params.get("city"):
@@ -92,45 +97,42 @@ class AccountsListView(APIView, LimitOffsetPagination):
         context = {}
         queryset_open = queryset.filter(status="open")
         results_accounts_open = self.paginate_queryset(
-            queryset_open.distinct(), self.request, view=self
+            queryset_open.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="open_cursor",
         )
-        if results_accounts_open:
-            offset = queryset_open.filter(id__gte=results_accounts_open[-1].id).count()
-            if offset == queryset_open.count():
-                offset = None
-        else:
-            offset = 0
         accounts_open = AccountSerializer(results_accounts_open, many=True).data
-        context["per_page"] = 10
-        page_number = (int(self.offset / 10) + 1,)
+        context["per_page"] = self.limit
+        page_number = (int(self.offset / self.limit) + 1,)
         context["page_number"] = page_number
         context["active_accounts"] = {
-            "offset": offset,
+            "accounts_count": self.count,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
             "open_accounts": accounts_open,
         }
 
         queryset_close = queryset.filter(status="close")
         results_accounts_close = self.paginate_queryset(
-            queryset_close.distinct(), self.request, view=self
+            queryset_close.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="close_cursor",
         )
-        if results_accounts_close:
-            offset = queryset_close.filter(
-                id__gte=results_accounts_close[-1].id
-            ).count()
-            if offset == queryset_close.count():
-                offset = None
-        else:
-            offset = 0
         accounts_close = AccountSerializer(results_accounts_close, many=True).data
+        closed_accounts = {
+            "accounts_count": self.count,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
+            "close_accounts": accounts_close,
+        }
 
         contacts = Contact.objects.filter(org=self.request.profile.org).values(
             "id", "first_name"
         )
         context["contacts"] = contacts
-        context["closed_accounts"] = {
-            "offset": offset,
-            "close_accounts": accounts_close,
-        }
+        context["closed_accounts"] = closed_accounts
         context["teams"] = TeamsSerializer(
             Teams.objects.filter(org=self.request.profile.org), many=True
         ).data
@@ -482,10 +484,11 @@ class AccountDetailView(APIView):
         comment_serializer = CommentSerializer(data=data)
         if comment_serializer.is_valid():
             if data.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     account_id=self.account_obj.id,
                     commented_by=self.request.profile,
                 )
+                send_email_user_mentions.delay(comment.id, "accounts")
 
         if self.request.FILES.get("account_attachment"):
             attachment = Attachments()
@@ -638,11 +641,9 @@ class AccountCreateMailView(APIView):
                         email_obj.delete()
                         data["recipients"] = "Please enter valid recipient"
                         return Response({"error": True, "errors": data})
-            if data.get("scheduled_later") != "true":
+            # scheduled ones are queued when due by send_scheduled_emails
+            if not email_obj.scheduled_later:
                 send_email.delay(email_obj.id)
-            else:
-                email_obj.scheduled_later = True
-                email_obj.scheduled_date_time = scheduled_date_time
             return Response(
                 {"error": False, "message": "Email sent successfully"},
                 status=status.HTTP_200_OK,
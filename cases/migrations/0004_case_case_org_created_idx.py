@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0003_alter_case_created_by'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='case_org_created_idx'),
+        ),
+    ]
@@ -46,6 +46,12 @@ class Case(BaseModel):
         verbose_name_plural = "Cases"
         db_table = "case"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="case_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
@@ -3,7 +3,6 @@ import json
 from django.db.models import Q
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -15,16 +14,19 @@ from cases.models import Case
 from cases.serializer import CaseCreateSerializer, CaseSerializer,CaseCreateSwaggerSerializer,CaseDetailEditSwaggerSerializer,CaseCommentEditSwaggerSerializer
 from cases.tasks import send_email_to_assigned_user
 from common.models import Attachments, Comment, Profile
+from common.pagination import KeysetPagination
 
 #from common.external_auth import CustomDualAuthentication
 from common.serializer import AttachmentsSerializer, CommentSerializer
+from common.tasks import send_email_user_mentions
 from common.utils import CASE_TYPE, PRIORITY_CHOICE, STATUS_CHOICE
+from common.visibility import visible_to
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from teams.models import Teams
 
 
-class CaseListView(APIView, LimitOffsetPagination):
+class CaseListView(APIView, KeysetPagination):
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
     model = Case
@@ -36,15 +38,9 @@ class CaseListView(APIView, LimitOffsetPagination):
         contacts = Contact.objects.filter(org=self.request.profile.org).order_by("-id")
         profiles = Profile.objects.filter(is_active=True, org=self.request.profile.org)
         if self.request.profile.role != "ADMIN" and not self.request.profile.is_admin:
-            queryset = queryset.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            accounts = accounts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            contacts = contacts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
+            accounts = visible_to(accounts, self.request.profile)
+            contacts = visible_to(contacts, self.request.profile)
             profiles = profiles.filter(role="ADMIN")
 
         if params:
@@ -62,16 +58,11 @@ class CaseListView(APIView, LimitOffsetPagination):
         results_cases = self.paginate_queryset(queryset, self.request, view=self)
         cases = CaseSerializer(results_cases, many=True).data
 
-        if results_cases:
-            offset = queryset.filter(id__gte=results_cases[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
         context.update(
             {
                 "cases_count": self.count,
-                "offset": offset,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
             }
         )
         context["cases"] = cases
@@ -359,10 +350,11 @@ class CaseDetailView(APIView):
                 )
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     case_id=self.cases_obj.id,
                     commented_by_id=self.request.profile.id,
                 )
+                send_email_user_mentions.delay(comment.id, "cases")
 
         if self.request.FILES.get("case_attachment"):
             attachment = Attachments()
@@ -11,5 +11,6 @@ urlpatterns = [
     path("tasks/", include("tasks.urls", namespace="api_tasks")),
     path("events/", include("events.urls", namespace="api_events")),
     path("cases/", include("cases.urls", namespace="api_cases")),
+    path("invoices/", include("invoices.api_urls", namespace="api_invoices")),
     path("lenders/", include("lender.urls")),
 ]
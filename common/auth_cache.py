@@ -0,0 +1,221 @@
+"""Cached authentication context.
+
+``GetProfileAndOrg`` and the DRF authentication classes resolve the same
+(user, org) -> profile mapping on every request. The resolved snapshots are
+kept in a small per-process LRU in front of the shared Django cache (Redis in
+production) so steady-state authenticated requests never hit the database.
+
+Snapshots only hold the fields of ``AUTH_SNAPSHOT_FIELDS``, never password
+hashes, activation keys nor api keys; the instances rebuilt from them load
+any other field from the database when it is read.
+
+Snapshots are invalidated explicitly from ``common.signals`` whenever a User,
+Profile or Org (including its api_key) changes. Entries in the per-process LRU
+live for at most ``AUTH_CACHE_LOCAL_TTL`` seconds, which bounds how long other
+worker processes can serve a snapshot after it has been invalidated. Without
+a shared cache nothing is cached, see ``shared_cache_enabled``.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from common.models import Org, Profile, User
+from common.utils import shared_cache_enabled
+
+AUTH_CACHE_TTL = getattr(settings, "AUTH_CACHE_TTL", 60 * 15)
+AUTH_CACHE_LOCAL_TTL = getattr(settings, "AUTH_CACHE_LOCAL_TTL", 30)
+AUTH_CACHE_LOCAL_SIZE = getattr(settings, "AUTH_CACHE_LOCAL_SIZE", 2048)
+
+# model -> attnames kept in a snapshot
+AUTH_SNAPSHOT_FIELDS = {
+    User: ("id", "email", "profile_pic", "is_active", "is_staff", "is_superuser"),
+    Org: ("id", "name", "is_active"),
+    Profile: (
+        "id",
+        "user_id",
+        "org_id",
+        "role",
+        "has_sales_access",
+        "has_marketing_access",
+        "is_active",
+        "is_organization_admin",
+    ),
+}
+
+
+class LocalLRUCache(object):
+    """Thread safe, size bounded LRU with a per entry expiry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRUCache(AUTH_CACHE_LOCAL_SIZE, AUTH_CACHE_LOCAL_TTL)
+
+
+def user_cache_key(user_id):
+    return "auth:user:%s" % user_id
+
+
+def profile_cache_key(user_id, org_id):
+    return "auth:profile:%s:%s" % (user_id, org_id)
+
+
+def api_key_cache_key(api_key):
+    # never keep the raw api key in the cache key space
+    digest = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()
+    return "auth:apikey:%s" % digest
+
+
+def org_admin_cache_key(org_id):
+    return "auth:orgadmin:%s" % org_id
+
+
+def _get(key):
+    if not shared_cache_enabled():
+        return None
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is None:
+            return None
+        local_cache.set(key, value)
+    return value
+
+
+def _set(key, value):
+    if not shared_cache_enabled():
+        return
+    cache.set(key, value, AUTH_CACHE_TTL)
+    local_cache.set(key, value)
+
+
+def snapshot(instance):
+    """The fields of ``instance`` kept in the cache, as a dict."""
+    fields = AUTH_SNAPSHOT_FIELDS[type(instance)]
+    return {field: getattr(instance, field) for field in fields}
+
+
+def from_snapshot(model, values):
+    """A new ``model`` instance with the fields of ``values``, the others
+    deferred."""
+    fields = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        DEFAULT_DB_ALIAS, fields, [values[field] for field in fields]
+    )
+
+
+def profile_snapshot(profile):
+    return {
+        "profile": snapshot(profile),
+        "user": snapshot(profile.user),
+        "org": snapshot(profile.org) if profile.org_id else None,
+    }
+
+
+def profile_from_snapshot(values):
+    profile = from_snapshot(Profile, values["profile"])
+    profile.user = from_snapshot(User, values["user"])
+    if values["org"] is not None:
+        profile.org = from_snapshot(Org, values["org"])
+    return profile
+
+
+def invalidate(*keys):
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many(list(keys))
+
+
+def get_user(user_id):
+    """Return the User for ``user_id`` or raise ``User.DoesNotExist``."""
+    key = user_cache_key(user_id)
+    values = _get(key)
+    if values is None:
+        user = User.objects.get(id=user_id)
+        _set(key, snapshot(user))
+        return user
+    return from_snapshot(User, values)
+
+
+def get_profile(user_id, org_id):
+    """Return the active Profile of ``user_id`` in ``org_id`` with its user
+    and org loaded, or raise ``Profile.DoesNotExist``."""
+    # normalise the org header so cache keys match the ones invalidated on save
+    org_id = uuid.UUID(str(org_id))
+    key = profile_cache_key(user_id, org_id)
+    values = _get(key)
+    if values is None:
+        profile = Profile.objects.select_related("user", "org").get(
+            user_id=user_id, org=org_id, is_active=True
+        )
+        _set(key, profile_snapshot(profile))
+        return profile
+    return profile_from_snapshot(values)
+
+
+def get_api_key_org_id(api_key):
+    """Return the id of the Org owning ``api_key`` or raise ``Org.DoesNotExist``."""
+    key = api_key_cache_key(api_key)
+    org_id = _get(key)
+    if org_id is None:
+        org_id = Org.objects.values_list("id", flat=True).get(api_key=api_key)
+        _set(key, org_id)
+    return org_id
+
+
+def get_org_admin_profile(org_id):
+    """Return the first ADMIN profile of the org, used for api key requests."""
+    key = org_admin_cache_key(org_id)
+    values = _get(key)
+    if values is None:
+        profile = (
+            Profile.objects.filter(org=org_id, role="ADMIN")
+            .select_related("user", "org")
+            .first()
+        )
+        if profile is None:
+            return None
+        _set(key, profile_snapshot(profile))
+        return profile
+    return profile_from_snapshot(values)
@@ -0,0 +1,276 @@
+"""Mass updates and deletes of leads, contacts and opportunities.
+
+A bulk action selects its records either by id or by the filters of the list
+views, in one query scoped to what the user may change: the org, the records
+visible to a non admin and, for deletes, the ones they created. The change is
+then applied per batch of ``BULK_ACTION_BATCH_SIZE`` records with set-based
+writes, one ``UPDATE`` for a new status, a ``DELETE`` and an insert on the
+through table for a new assignment and a queryset ``delete()`` for deletes,
+all in one transaction.
+
+None of these writes goes through the per record signal handlers: the
+search documents, blocking keys, visibility and cached lists are refreshed
+per batch and a reconcile of the dashboard counters of the org queued once
+done. The
+profiles newly assigned get one email per profile listing their records,
+rather than one per record.
+
+The outcome is reported per id: ``updated`` / ``deleted``, ``forbidden`` for
+records of the org out of the user's reach and ``not_found`` for the rest.
+"""
+import logging
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from common import dedupe, list_cache, search, visibility
+from common.dashboard import queue_reconcile
+from common.models import Profile
+from common.signals import bulk_writes
+from common.tasks import send_bulk_assignment_email
+from common.utils import LEAD_SOURCE, LEAD_STATUS, SOURCES, STAGES
+
+logger = logging.getLogger(__name__)
+
+BULK_ACTION_BATCH_SIZE = getattr(settings, "BULK_ACTION_BATCH_SIZE", 1000)
+BULK_ACTION_MAX_RECORDS = getattr(settings, "BULK_ACTION_MAX_RECORDS", 10000)
+
+BULK_ACTIONS = ("update", "delete")
+
+# model, status field and its choices (None for entities without one), the
+# exact match filters of the list view with their choices
+BulkEntity = namedtuple("BulkEntity", "model status_field statuses filters")
+
+# leads become converted with their account, through leads.conversion only
+BULK_LEAD_STATUSES = tuple(
+    (key, value) for key, value in LEAD_STATUS if key != "converted"
+)
+
+BULK_ENTITIES = {
+    "leads": BulkEntity(
+        "leads.Lead",
+        "status",
+        BULK_LEAD_STATUSES,
+        {"status": LEAD_STATUS, "source": LEAD_SOURCE},
+    ),
+    "contacts": BulkEntity("contacts.Contact", None, None, {}),
+    "opportunities": BulkEntity(
+        "opportunity.Opportunity",
+        "stage",
+        STAGES,
+        {"stage": STAGES, "lead_source": SOURCES},
+    ),
+}
+
+
+class BulkActionError(Exception):
+    """A bulk action refused, ``errors`` maps the parameters to the
+    problem."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def get_entity_model(entity):
+    return apps.get_model(BULK_ENTITIES[entity].model)
+
+
+def _choice(value, choices, name):
+    if value not in {key for key, _ in choices}:
+        raise BulkActionError({name: "%r is not a valid choice." % value})
+    return value
+
+
+def _uuids(values, name):
+    if not isinstance(values, (list, tuple)):
+        raise BulkActionError({name: "Expected a list of ids."})
+    try:
+        return [uuid.UUID(str(value)) for value in values]
+    except ValueError:
+        raise BulkActionError({name: "Expected a list of ids."})
+
+
+def filter_records(entity, queryset, org, filters):
+    """``queryset`` restricted by the list view ``filters``."""
+    if not isinstance(filters, dict):
+        raise BulkActionError({"filters": "Expected an object."})
+    allowed = BULK_ENTITIES[entity].filters
+    for name, value in filters.items():
+        if name == "search":
+            queryset = search.filter_by_search(queryset, entity, org, str(value))
+        elif name == "assigned_to":
+            queryset = queryset.filter(
+                assigned_to__in=_uuids(value, "filters.assigned_to")
+            ).distinct()
+        elif name in allowed:
+            queryset = queryset.filter(
+                **{name: _choice(value, allowed[name], "filters.%s" % name)}
+            )
+        else:
+            raise BulkActionError({"filters": "Unknown filter %r." % name})
+    return queryset
+
+
+def scope(entity, profile, action):
+    """Records of ``entity`` ``profile`` may apply ``action`` to."""
+    queryset = get_entity_model(entity).objects.filter(org=profile.org)
+    if visibility.sees_all(entity, profile):
+        return queryset
+    if action == "delete":
+        queryset = queryset.filter(created_by=profile.user)
+    return visibility.visible_to(queryset, profile)
+
+
+def select_records(entity, profile, action, ids=None, filters=None):
+    """Ids of the records the action applies to and the outcome of the ids
+    asked for it can't be applied to."""
+    if (ids is None) == (filters is None):
+        raise BulkActionError({"ids": "Give either ids or filters."})
+    allowed = scope(entity, profile, action)
+    if ids is not None:
+        ids = set(_uuids(ids, "ids"))
+        record_ids = list(
+            allowed.filter(id__in=ids).order_by().values_list("id", flat=True)
+        )
+        refused = ids.difference(record_ids)
+    else:
+        record_ids = list(
+            filter_records(entity, allowed, profile.org, filters)
+            .order_by()
+            .values_list("id", flat=True)
+            .distinct()
+        )
+        refused = set()
+    if len(record_ids) > BULK_ACTION_MAX_RECORDS:
+        raise BulkActionError(
+            {"ids": "At most %s records per action." % BULK_ACTION_MAX_RECORDS}
+        )
+    outcomes = {}
+    if refused:
+        existing = set(
+            get_entity_model(entity)
+            .objects.filter(org=profile.org, id__in=refused)
+            .values_list("id", flat=True)
+        )
+        for record_id in refused:
+            outcomes[record_id] = "forbidden" if record_id in existing else "not_found"
+    return record_ids, outcomes
+
+
+def _batches(record_ids, size=BULK_ACTION_BATCH_SIZE):
+    for start in range(0, len(record_ids), size):
+        yield record_ids[start : start + size]
+
+
+def _reassign(model, batch, profile_ids):
+    """Make ``profile_ids`` the assignees of the records of ``batch``, returns
+    the ``(record_id, profile_id)`` assignments added."""
+    field = model._meta.get_field("assigned_to")
+    through = field.remote_field.through
+    record_column = field.m2m_field_name() + "_id"
+    profile_column = field.m2m_reverse_field_name() + "_id"
+    rows = through.objects.filter(**{record_column + "__in": batch})
+    existing = set(rows.values_list(record_column, profile_column))
+    rows.exclude(**{profile_column + "__in": profile_ids}).delete()
+    added = [
+        (record_id, profile_id)
+        for record_id in batch
+        for profile_id in profile_ids
+        if (record_id, profile_id) not in existing
+    ]
+    through.objects.bulk_create(
+        [
+            through(**{record_column: record_id, profile_column: profile_id})
+            for record_id, profile_id in added
+        ],
+        ignore_conflicts=True,
+    )
+    return added
+
+
+def _clean_changes(entity, profile, changes):
+    spec = BULK_ENTITIES[entity]
+    cleaned = {}
+    for name, value in changes.items():
+        if name == "status" and spec.status_field:
+            cleaned[spec.status_field] = _choice(value, spec.statuses, name)
+        elif name == "assigned_to":
+            profile_ids = set(_uuids(value, name))
+            found = set(
+                Profile.objects.filter(
+                    id__in=profile_ids, org=profile.org, is_active=True
+                ).values_list("id", flat=True)
+            )
+            if found != profile_ids:
+                raise BulkActionError({name: "Unknown or inactive users."})
+            cleaned[name] = sorted(found)
+        else:
+            raise BulkActionError({name: "Can't be changed in bulk."})
+    if not cleaned:
+        raise BulkActionError({"changes": "Nothing to change."})
+    return cleaned
+
+
+def bulk_update(entity, profile, changes, ids=None, filters=None):
+    """Apply ``changes``, a new ``status`` and / or ``assigned_to`` list of
+    profile ids, to the selected records, returns the outcome per id."""
+    changes = _clean_changes(entity, profile, changes)
+    record_ids, outcomes = select_records(entity, profile, "update", ids, filters)
+    model = get_entity_model(entity)
+    profile_ids = changes.pop("assigned_to", None)
+    assigned = defaultdict(list)
+    with transaction.atomic():
+        for batch in _batches(record_ids):
+            records = model.objects.filter(id__in=batch)
+            records.update(
+                updated_at=timezone.now(), updated_by=profile.user, **changes
+            )
+            if profile_ids is not None:
+                for record_id, profile_id in _reassign(model, batch, profile_ids):
+                    assigned[profile_id].append(str(record_id))
+                visibility.refresh_records(entity, batch)
+            if entity in search.SEARCH_ENTITIES:
+                search.index_records(entity, records)
+        for profile_id, assigned_ids in assigned.items():
+            transaction.on_commit(
+                lambda profile_id=str(profile_id), assigned_ids=assigned_ids: (
+                    send_bulk_assignment_email.delay(entity, profile_id, assigned_ids)
+                )
+            )
+    _refresh_org(entity, profile.org_id, record_ids)
+    outcomes.update((record_id, "updated") for record_id in record_ids)
+    return {str(record_id): outcome for record_id, outcome in outcomes.items()}
+
+
+def bulk_delete(entity, profile, ids=None, filters=None):
+    """Delete the selected records, returns the outcome per id."""
+    record_ids, outcomes = select_records(entity, profile, "delete", ids, filters)
+    model = get_entity_model(entity)
+    with transaction.atomic():
+        for batch in _batches(record_ids):
+            with bulk_writes():
+                model.objects.filter(id__in=batch).delete()
+            if entity in search.SEARCH_ENTITIES:
+                search.remove_records(entity, batch)
+            if entity in dedupe.DEDUPE_ENTITIES:
+                dedupe.remove_records(entity, batch)
+            visibility.remove_records(entity, batch)
+    _refresh_org(entity, profile.org_id, record_ids)
+    outcomes.update((record_id, "deleted") for record_id in record_ids)
+    return {str(record_id): outcome for record_id, outcome in outcomes.items()}
+
+
+def _refresh_org(entity, org_id, record_ids):
+    if not record_ids:
+        return
+    if entity in list_cache.LIST_CACHE_ENTITIES:
+        list_cache.invalidate(entity, org_id)
+    queue_reconcile(org_id)
+    logger.info(
+        "bulk action entity=%s org=%s records=%s", entity, org_id, len(record_ids)
+    )
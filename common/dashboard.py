@@ -0,0 +1,219 @@
+"""Materialized dashboard counters.
+
+``ApiHomeView`` used to count and serialize every open account, contact, lead
+and opportunity of the org on each load. The counts now live in
+``DashboardCounter`` rows per (org, entity, status, profile): the org wide rows
+have no profile, the per profile rows count the records a non admin can see,
+i.e. the ones assigned to them or created by them.
+
+Counters are kept up to date incrementally from the model signals registered
+in ``common.signals``. Writes that bypass signals (``bulk_create``, queryset
+updates, raw through table writes) are corrected by ``reconcile_org``, run for
+every org by the ``reconcile_dashboard_counters`` beat task, and queued for
+one org when its dashboard is read without a recent reconcile: that read
+serves the counters as they are rather than waiting for the recount.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from common.models import DashboardCounter, Profile
+from common.visibility import visible_to
+
+DASHBOARD_RECENT_ITEMS = getattr(settings, "DASHBOARD_RECENT_ITEMS", 10)
+DASHBOARD_RECONCILED_TTL = 60 * 60 * 24
+# a reconcile queued from a read isn't queued again within this delay
+DASHBOARD_RECONCILE_QUEUED_TTL = 60 * 10
+
+# entity -> (model, status field or None, statuses shown on the dashboard or
+# None for all of them, statuses left out of the dashboard)
+DASHBOARD_ENTITIES = {
+    "accounts": ("accounts.Account", "status", ("open",), ()),
+    "contacts": ("contacts.Contact", None, None, ()),
+    "leads": ("leads.Lead", "status", None, ("converted", "closed")),
+    "opportunities": ("opportunity.Opportunity", "stage", None, ()),
+}
+
+
+def get_entity_model(entity):
+    return apps.get_model(DASHBOARD_ENTITIES[entity][0])
+
+
+def get_entity(model):
+    for entity, (label, _, _, _) in DASHBOARD_ENTITIES.items():
+        if model._meta.label == label:
+            return entity
+    return None
+
+
+def _reconciled_key(org_id):
+    return "dashboard:reconciled:%s" % org_id
+
+
+def _reconcile_queued_key(org_id):
+    return "dashboard:reconcile-queued:%s" % org_id
+
+
+def queue_reconcile(org_id):
+    """Queue ``reconcile_org`` for ``org_id`` unless already queued."""
+    # imported here, common.tasks imports this module
+    from common.tasks import reconcile_dashboard_counters
+
+    if cache.add(_reconcile_queued_key(org_id), True, DASHBOARD_RECONCILE_QUEUED_TTL):
+        org_id = str(org_id)
+        transaction.on_commit(lambda: reconcile_dashboard_counters.delay(org_id))
+
+
+def _creator_profile_id(org_id, user_id):
+    if not (org_id and user_id):
+        return None
+    return (
+        Profile.objects.filter(org_id=org_id, user_id=user_id)
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def record_state(entity, record, assigned_ids=None):
+    """What ``record`` contributes to the counters: ``(org_id, status,
+    visible profile ids)``. ``assigned_ids`` avoids a query when known."""
+    status_field = DASHBOARD_ENTITIES[entity][1]
+    status = (getattr(record, status_field) or "") if status_field else ""
+    if assigned_ids is None:
+        assigned_ids = record.assigned_to.values_list("id", flat=True)
+    profiles = set(assigned_ids)
+    creator = _creator_profile_id(record.org_id, record.created_by_id)
+    if creator:
+        profiles.add(creator)
+    return record.org_id, status, frozenset(profiles)
+
+
+def contributions(entity, state):
+    org_id, status, profiles = state
+    keys = Counter()
+    if org_id is None:
+        return keys
+    keys[(org_id, entity, status, None)] += 1
+    for profile_id in profiles:
+        keys[(org_id, entity, status, profile_id)] += 1
+    return keys
+
+
+def apply_change(entity, before=None, after=None):
+    """Move the counters from record state ``before`` to ``after``."""
+    deltas = Counter()
+    if after is not None:
+        deltas.update(contributions(entity, after))
+    if before is not None:
+        deltas.subtract(contributions(entity, before))
+    for (org_id, entity, status, profile_id), delta in deltas.items():
+        if delta:
+            _increment(org_id, entity, status, profile_id, delta)
+
+
+def _increment(org_id, entity, status, profile_id, delta):
+    counters = DashboardCounter.objects.filter(
+        org_id=org_id, entity=entity, status=status, profile_id=profile_id
+    )
+    if counters.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            DashboardCounter.objects.create(
+                org_id=org_id,
+                entity=entity,
+                status=status,
+                profile_id=profile_id,
+                count=delta,
+            )
+    except IntegrityError:
+        # created concurrently by another worker
+        counters.update(count=F("count") + delta)
+
+
+def _status_rows(records, status_field, *fields):
+    """``values_list`` of ``fields`` with the normalised status appended."""
+    if status_field is None:
+        for row in records.values_list(*fields).iterator():
+            yield row + ("",)
+    else:
+        for row in records.values_list(*fields, status_field).iterator():
+            yield row[:-1] + (row[-1] or "",)
+
+
+def reconcile_org(org_id):
+    """Recompute every counter of ``org_id`` from the records."""
+    creators = dict(Profile.objects.filter(org_id=org_id).values_list("user_id", "id"))
+    totals = Counter()
+    for entity, (_, status_field, _, _) in DASHBOARD_ENTITIES.items():
+        records = get_entity_model(entity).objects.filter(org_id=org_id).order_by()
+        visible = set()
+        for record_id, user_id, status in _status_rows(
+            records, status_field, "id", "created_by_id"
+        ):
+            totals[(entity, status, None)] += 1
+            if creators.get(user_id):
+                visible.add((record_id, status, creators[user_id]))
+        assigned = records.filter(assigned_to__isnull=False)
+        for record_id, profile_id, status in _status_rows(
+            assigned, status_field, "id", "assigned_to"
+        ):
+            visible.add((record_id, status, profile_id))
+        for _, status, profile_id in visible:
+            totals[(entity, status, profile_id)] += 1
+
+    with transaction.atomic():
+        DashboardCounter.objects.filter(org_id=org_id).delete()
+        DashboardCounter.objects.bulk_create(
+            [
+                DashboardCounter(
+                    org_id=org_id,
+                    entity=entity,
+                    status=status,
+                    profile_id=profile_id,
+                    count=count,
+                )
+                for (entity, status, profile_id), count in totals.items()
+            ]
+        )
+    cache.set(_reconciled_key(org_id), True, DASHBOARD_RECONCILED_TTL)
+    cache.delete(_reconcile_queued_key(org_id))
+
+
+def get_dashboard_counts(org_id, profile_id=None):
+    """Dashboard counts per entity, for the whole org or for what
+    ``profile_id`` can see."""
+    if not cache.get(_reconciled_key(org_id)):
+        queue_reconcile(org_id)
+    counts = dict.fromkeys(DASHBOARD_ENTITIES, 0)
+    counters = DashboardCounter.objects.filter(
+        org_id=org_id, profile_id=profile_id
+    ).values_list("entity", "status", "count")
+    for entity, status, count in counters:
+        if entity not in DASHBOARD_ENTITIES:
+            continue
+        _, _, included, excluded = DASHBOARD_ENTITIES[entity]
+        if included is not None and status not in included:
+            continue
+        if status in excluded:
+            continue
+        counts[entity] += count
+    return counts
+
+
+def get_recent_items(entity, org, profile=None):
+    """The last ``DASHBOARD_RECENT_ITEMS`` dashboard records of ``entity``."""
+    model = get_entity_model(entity)
+    _, status_field, included, excluded = DASHBOARD_ENTITIES[entity]
+    queryset = model.objects.filter(org=org)
+    if included is not None:
+        queryset = queryset.filter(**{status_field + "__in": included})
+    if excluded:
+        queryset = queryset.exclude(**{status_field + "__in": excluded})
+    if profile is not None:
+        queryset = visible_to(queryset, profile)
+    return queryset.order_by("-created_at", "-id")[:DASHBOARD_RECENT_ITEMS]
@@ -0,0 +1,376 @@
+"""Duplicate detection of leads and contacts.
+
+Every record of ``DEDUPE_ENTITIES`` has ``BlockingKey`` rows, one per
+normalized email (lower cased, without ``+tags``), phone (its last nine
+digits) and name (its sorted words, and the last name with the first initial),
+kept up to date from the model signals registered in ``common.signals``.
+Records are only ever compared with the records sharing a key with them, so
+finding the duplicates of one record is an index lookup and a handful of
+comparisons, whatever the size of the org.
+
+``find_duplicates`` scores the records sharing a key with some values, e.g.
+of a record being created, with ``similarity``, and returns the ones scoring
+``DEDUPE_THRESHOLD`` or more. ``cluster_org``, run for every org by the
+``cluster_duplicates`` beat task, reads the keys of an org in key order,
+compares the records within every block of records sharing a key, merges the
+likely duplicates into clusters and stores them as ``DuplicateMatch`` rows.
+Blocks larger than ``DEDUPE_MAX_BLOCK_SIZE``, e.g. a shared office phone, are
+skipped: they hold no information telling records apart and would make the
+job quadratic again.
+"""
+import logging
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from common.models import BlockingKey, DuplicateMatch
+from common.visibility import visible_to
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_THRESHOLD = getattr(settings, "DEDUPE_THRESHOLD", 0.75)
+DEDUPE_MAX_BLOCK_SIZE = getattr(settings, "DEDUPE_MAX_BLOCK_SIZE", 50)
+DEDUPE_MAX_CANDIDATES = 200
+DEDUPE_RESULTS_LIMIT = 10
+DEDUPE_BATCH_SIZE = 1000
+PHONE_DIGITS = 9
+
+DedupeEntity = namedtuple(
+    "DedupeEntity",
+    ["model", "email_fields", "phone_fields", "name_fields", "company_fields"],
+)
+
+DEDUPE_ENTITIES = {
+    "leads": DedupeEntity(
+        "leads.Lead",
+        ("email",),
+        ("phone",),
+        ("first_name", "last_name"),
+        ("account_name",),
+    ),
+    "contacts": DedupeEntity(
+        "contacts.Contact",
+        ("primary_email", "secondary_email"),
+        ("mobile_number", "secondary_number"),
+        ("first_name", "last_name"),
+        ("organization",),
+    ),
+}
+
+# weight of each field in similarity, out of the fields both records have
+FIELD_WEIGHTS = {"emails": 0.45, "phones": 0.25, "name": 0.2, "company": 0.1}
+
+COMPANY_SUFFIXES = {
+    "co",
+    "company",
+    "corp",
+    "corporation",
+    "gmbh",
+    "inc",
+    "llc",
+    "ltd",
+}
+
+Signature = namedtuple(
+    "Signature", ["emails", "phones", "name", "short_name", "company"]
+)
+
+
+def get_entity_model(entity):
+    return apps.get_model(DEDUPE_ENTITIES[entity].model)
+
+
+def get_entity(model):
+    for entity, config in DEDUPE_ENTITIES.items():
+        if model._meta.label == config.model:
+            return entity
+    return None
+
+
+def _fields(entity):
+    config = DEDUPE_ENTITIES[entity]
+    return (
+        config.email_fields
+        + config.phone_fields
+        + config.name_fields
+        + config.company_fields
+    )
+
+
+def _words(text):
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def normalize_email(email):
+    email = str(email or "").strip().lower()
+    if "@" not in email:
+        return ""
+    local_part, domain = email.rsplit("@", 1)
+    return "%s@%s" % (local_part.split("+", 1)[0], domain)
+
+
+def normalize_phone(phone):
+    digits = re.sub(r"\D", "", str(phone or ""))
+    # national and international forms of a number share their end
+    return digits[-PHONE_DIGITS:] if len(digits) >= 7 else ""
+
+
+def normalize_company(company):
+    return " ".join(word for word in _words(company) if word not in COMPANY_SUFFIXES)
+
+
+def signature(entity, values):
+    """``Signature`` of a record given its ``values``, a mapping of the
+    fields of ``entity``."""
+    config = DEDUPE_ENTITIES[entity]
+    emails = {normalize_email(values.get(field)) for field in config.email_fields}
+    phones = {normalize_phone(values.get(field)) for field in config.phone_fields}
+    names = [_words(values.get(field)) for field in config.name_fields]
+    short_name = ""
+    if len(names) == 2 and all(names):
+        # "J. Smith" for "John Smith"
+        short_name = "%s %s" % (" ".join(names[1]), names[0][0][0])
+    return Signature(
+        emails=frozenset(email for email in emails if email),
+        phones=frozenset(phone for phone in phones if phone),
+        name=" ".join(sorted(word for words in names for word in words)),
+        short_name=short_name,
+        company=normalize_company(
+            " ".join(str(values.get(field) or "") for field in config.company_fields)
+        ),
+    )
+
+
+def blocking_keys(signature):
+    keys = {"email:%s" % email for email in signature.emails}
+    keys.update("phone:%s" % phone for phone in signature.phones)
+    if signature.name:
+        keys.add("name:%s" % signature.name)
+    if signature.short_name:
+        keys.add("short-name:%s" % signature.short_name)
+    return {key[:255] for key in keys}
+
+
+def similarity(first, second):
+    """Score from 0 to 1 of two signatures being the same person, over the
+    fields both have."""
+    scores = {}
+    if first.emails and second.emails:
+        scores["emails"] = 1.0 if first.emails & second.emails else 0.0
+    if first.phones and second.phones:
+        scores["phones"] = 1.0 if first.phones & second.phones else 0.0
+    for field in ("name", "company"):
+        if getattr(first, field) and getattr(second, field):
+            scores[field] = SequenceMatcher(
+                None, getattr(first, field), getattr(second, field)
+            ).ratio()
+    weight = sum(FIELD_WEIGHTS[field] for field in scores)
+    if not weight:
+        return 0.0
+    return sum(FIELD_WEIGHTS[field] * score for field, score in scores.items()) / weight
+
+
+def _rows(entity, records):
+    fields = _fields(entity)
+    rows = records.order_by().values_list("id", "org_id", *fields)
+    for row in rows.iterator(chunk_size=DEDUPE_BATCH_SIZE):
+        yield row[0], row[1], dict(zip(fields, row[2:]))
+
+
+def _signatures(entity, org_id, record_ids):
+    """``{record_id: Signature}`` of the records of ``entity`` in ``org_id``."""
+    model = get_entity_model(entity)
+    record_ids = list(record_ids)
+    signatures = {}
+    for start in range(0, len(record_ids), DEDUPE_BATCH_SIZE):
+        records = model.objects.filter(
+            org_id=org_id, id__in=record_ids[start : start + DEDUPE_BATCH_SIZE]
+        )
+        for record_id, _, values in _rows(entity, records):
+            signatures[record_id] = signature(entity, values)
+    return signatures
+
+
+def _save_keys(entity, record_ids, keys):
+    with transaction.atomic():
+        BlockingKey.objects.filter(entity=entity, object_id__in=record_ids).delete()
+        BlockingKey.objects.bulk_create(keys, batch_size=DEDUPE_BATCH_SIZE)
+
+
+def index_records(entity, records):
+    """Replace the blocking keys of ``records``, a queryset of ``entity``, in
+    batches of ``DEDUPE_BATCH_SIZE``."""
+    record_ids = []
+    keys = []
+    for record_id, org_id, values in _rows(entity, records):
+        record_ids.append(record_id)
+        if org_id is not None:
+            keys.extend(
+                BlockingKey(org_id=org_id, entity=entity, object_id=record_id, key=key)
+                for key in blocking_keys(signature(entity, values))
+            )
+        if len(record_ids) >= DEDUPE_BATCH_SIZE:
+            _save_keys(entity, record_ids, keys)
+            record_ids, keys = [], []
+    if record_ids:
+        _save_keys(entity, record_ids, keys)
+
+
+def remove_records(entity, record_ids):
+    BlockingKey.objects.filter(entity=entity, object_id__in=record_ids).delete()
+
+
+def reindex_org(org_id):
+    """Rebuild the blocking keys of ``org_id`` from the records."""
+    for entity in DEDUPE_ENTITIES:
+        records = get_entity_model(entity).objects.filter(org_id=org_id)
+        BlockingKey.objects.filter(org_id=org_id, entity=entity).exclude(
+            object_id__in=records.values("id")
+        ).delete()
+        index_records(entity, records)
+
+
+def find_duplicates(
+    entity, org_id, values, exclude_id=None, records=None, limit=DEDUPE_RESULTS_LIMIT
+):
+    """``(record_id, score)`` of the likely duplicates in ``org_id`` of a
+    record of ``entity`` having ``values``, best first, among ``records``, a
+    queryset of ``entity``, when given."""
+    target = signature(entity, values)
+    keys = blocking_keys(target)
+    if not keys or org_id is None:
+        return []
+    candidates = BlockingKey.objects.filter(org_id=org_id, entity=entity, key__in=keys)
+    if exclude_id is not None:
+        candidates = candidates.exclude(object_id=exclude_id)
+    if records is not None:
+        candidates = candidates.filter(object_id__in=records.values("id"))
+    candidate_ids = set(
+        candidates.order_by()
+        .values_list("object_id", flat=True)
+        .distinct()[:DEDUPE_MAX_CANDIDATES]
+    )
+    matches = []
+    for record_id, candidate in _signatures(entity, org_id, candidate_ids).items():
+        score = similarity(target, candidate)
+        if score >= DEDUPE_THRESHOLD:
+            matches.append((record_id, score))
+    matches.sort(key=lambda match: (-match[1], str(match[0])))
+    return matches[:limit]
+
+
+def possible_duplicates(entity, record, profile=None):
+    """Likely duplicates of a saved ``record`` as the API returns them, the
+    ones ``profile`` can see when given."""
+    records = None
+    if profile is not None:
+        records = visible_to(get_entity_model(entity).objects.all(), profile)
+    values = {field: getattr(record, field) for field in _fields(entity)}
+    matches = find_duplicates(
+        entity, record.org_id, values, exclude_id=record.id, records=records
+    )
+    return describe(entity, matches)
+
+
+def describe(entity, matches):
+    """``matches`` of ``find_duplicates`` as the API returns them."""
+    config = DEDUPE_ENTITIES[entity]
+    scores = dict(matches)
+    rows = get_entity_model(entity).objects.filter(id__in=scores).values_list(
+        "id", *(config.name_fields + config.email_fields[:1])
+    )
+    titles = {
+        row[0]: " ".join(str(value) for value in row[1:-1] if value) or row[-1]
+        for row in rows
+    }
+    return [
+        {"id": record_id, "title": titles.get(record_id), "score": round(score, 3)}
+        for record_id, score in matches
+    ]
+
+
+def _blocks(entity, org_id):
+    """Ids of the records sharing each blocking key of ``org_id``."""
+    keys = (
+        BlockingKey.objects.filter(org_id=org_id, entity=entity)
+        .order_by("key", "object_id")
+        .values_list("key", "object_id")
+    )
+    current, block = None, []
+    for key, record_id in keys.iterator(chunk_size=DEDUPE_BATCH_SIZE * 5):
+        if key != current:
+            if len(block) > 1:
+                yield current, block
+            current, block = key, []
+        block.append(record_id)
+    if len(block) > 1:
+        yield current, block
+
+
+def _find(parents, record_id):
+    root = record_id
+    while parents[root] != root:
+        root = parents[root]
+    while parents[record_id] != root:
+        parents[record_id], record_id = root, parents[record_id]
+    return root
+
+
+def cluster_org(entity, org_id):
+    """Store the clusters of likely duplicates of ``entity`` in ``org_id``,
+    returns how many were found."""
+    pairs = set()
+    for key, block in _blocks(entity, org_id):
+        if len(block) > DEDUPE_MAX_BLOCK_SIZE:
+            logger.info(
+                "dedupe skipped block entity=%s org=%s key=%s size=%s",
+                entity,
+                org_id,
+                key,
+                len(block),
+            )
+            continue
+        pairs.update(combinations(block, 2))
+    signatures = _signatures(entity, org_id, {pk for pair in pairs for pk in pair})
+
+    parents = {}
+    scores = defaultdict(float)
+    for first, second in pairs:
+        if first not in signatures or second not in signatures:
+            continue
+        score = similarity(signatures[first], signatures[second])
+        if score < DEDUPE_THRESHOLD:
+            continue
+        for record_id in (first, second):
+            parents.setdefault(record_id, record_id)
+            scores[record_id] = max(scores[record_id], score)
+        parents[_find(parents, first)] = _find(parents, second)
+
+    clusters = defaultdict(list)
+    for record_id in parents:
+        clusters[_find(parents, record_id)].append(record_id)
+    matches = []
+    for members in clusters.values():
+        cluster_id = min(members, key=str)
+        matches.extend(
+            DuplicateMatch(
+                org_id=org_id,
+                entity=entity,
+                cluster_id=cluster_id,
+                object_id=record_id,
+                score=scores[record_id],
+            )
+            for record_id in members
+        )
+    with transaction.atomic():
+        DuplicateMatch.objects.filter(org_id=org_id, entity=entity).delete()
+        DuplicateMatch.objects.bulk_create(matches, batch_size=DEDUPE_BATCH_SIZE)
+    return len(clusters)
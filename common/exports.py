@@ -0,0 +1,250 @@
+"""CSV and XLSX exports of leads, contacts, accounts and opportunities.
+
+An export reads the columns of ``EXPORT_ENTITIES`` with ``values_list``, no
+model instances nor serializers, through ``iterator(chunk_size=...)``: a
+server-side cursor on PostgreSQL, so memory stays flat whatever the number of
+rows. Records are scoped like the list views, to the org and, for non
+admins, to the records they can see.
+
+CSV is streamed to the client row by row as it is read. XLSX can't be
+streamed, the archive is only complete once every row is written; it is
+written by openpyxl in write-only mode, which keeps rows in a temporary file
+rather than in memory, and sent once done. Selections of more than
+``EXPORT_SYNC_LIMITS`` rows for the format are written to the storage by the
+``export_records`` task instead, tracked by a ``DataExport``.
+
+openpyxl is optional; without it XLSX exports are refused.
+"""
+import csv
+import datetime
+import io
+import logging
+import re
+import tempfile
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from common.models import DataExport
+from common.search import filter_by_search
+from common.visibility import sees_all, visible_to
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+# rows exported within the request, per format, beyond them in the background
+EXPORT_SYNC_LIMITS = getattr(
+    settings, "EXPORT_SYNC_LIMITS", {"csv": 500000, "xlsx": 50000}
+)
+EXPORT_FORMATS = ("csv", "xlsx")
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# entity -> (model, ((header, field path), ...))
+EXPORT_ENTITIES = {
+    "leads": (
+        "leads.Lead",
+        (
+            ("Title", "title"),
+            ("First name", "first_name"),
+            ("Last name", "last_name"),
+            ("Email", "email"),
+            ("Phone", "phone"),
+            ("Status", "status"),
+            ("Source", "source"),
+            ("Account name", "account_name"),
+            ("City", "city"),
+            ("State", "state"),
+            ("Country", "country"),
+            ("Website", "website"),
+            ("Created at", "created_at"),
+        ),
+    ),
+    "contacts": (
+        "contacts.Contact",
+        (
+            ("First name", "first_name"),
+            ("Last name", "last_name"),
+            ("Email", "primary_email"),
+            ("Mobile number", "mobile_number"),
+            ("Organization", "organization"),
+            ("Title", "title"),
+            ("City", "address__city"),
+            ("Created at", "created_at"),
+        ),
+    ),
+    "accounts": (
+        "accounts.Account",
+        (
+            ("Name", "name"),
+            ("Email", "email"),
+            ("Phone", "phone"),
+            ("Industry", "industry"),
+            ("Status", "status"),
+            ("City", "billing_city"),
+            ("Country", "billing_country"),
+            ("Website", "website"),
+            ("Created at", "created_at"),
+        ),
+    ),
+    "opportunities": (
+        "opportunity.Opportunity",
+        (
+            ("Name", "name"),
+            ("Account", "account__name"),
+            ("Stage", "stage"),
+            ("Amount", "amount"),
+            ("Currency", "currency"),
+            ("Lead source", "lead_source"),
+            ("Closed on", "closed_on"),
+            ("Created at", "created_at"),
+        ),
+    ),
+}
+
+# spreadsheets evaluate cells starting with these as formulas, the values
+# are prefixed with a quote unless they are plain numbers, e.g. phones
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+NUMBER_PATTERN = re.compile(r"^[+-]?[\d\s().-]+$")
+
+
+def get_entity_model(entity):
+    return apps.get_model(EXPORT_ENTITIES[entity][0])
+
+
+def headers(entity):
+    return [header for header, _ in EXPORT_ENTITIES[entity][1]]
+
+
+def get_records(entity, profile, search=""):
+    """Queryset of the rows of ``entity`` ``profile`` can export."""
+    queryset = get_entity_model(entity).objects.filter(org=profile.org)
+    if not sees_all(entity, profile):
+        queryset = visible_to(queryset, profile)
+    if search:
+        queryset = filter_by_search(queryset, entity, profile.org, search)
+    return queryset.order_by("-created_at", "-id")
+
+
+def iter_rows(entity, records):
+    paths = [path for _, path in EXPORT_ENTITIES[entity][1]]
+    return records.values_list(*paths).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    value = str(value)
+    if value.startswith(FORMULA_PREFIXES) and not NUMBER_PATTERN.match(value):
+        return "'" + value
+    return value
+
+
+def _cell(value):
+    if isinstance(value, datetime.datetime):
+        # spreadsheets have no time zones
+        return timezone.make_naive(value, datetime.timezone.utc)
+    if value is None or isinstance(value, (int, float, Decimal, datetime.date)):
+        return value
+    return _text(value)
+
+
+class Echo(object):
+    """File-like object handing back what is written, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(entity, records):
+    """Yield the CSV of ``records`` line by line."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers(entity))
+    for row in iter_rows(entity, records):
+        yield writer.writerow([_text(value) for value in row])
+
+
+def write_csv(entity, records, file):
+    """Write the CSV of ``records`` to ``file``, a text file, returns the
+    number of rows."""
+    writer = csv.writer(file)
+    writer.writerow(headers(entity))
+    count = 0
+    for row in iter_rows(entity, records):
+        writer.writerow([_text(value) for value in row])
+        count += 1
+    return count
+
+
+def xlsx_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_xlsx(entity, records, file):
+    """Write the XLSX of ``records`` to ``file``, a binary file, returns the
+    number of rows."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(entity.capitalize())
+    sheet.append(headers(entity))
+    count = 0
+    for row in iter_rows(entity, records):
+        sheet.append([_cell(value) for value in row])
+        count += 1
+    workbook.save(file)
+    return count
+
+
+def export_file_name(entity, file_format):
+    return "%s-%s.%s" % (entity, timezone.now().strftime("%Y%m%d-%H%M%S"), file_format)
+
+
+def run_export(data_export):
+    """Write the file of ``data_export`` to the storage."""
+    DataExport.objects.filter(id=data_export.id).update(
+        status=DataExport.STATUS_RUNNING
+    )
+    records = get_records(data_export.entity, data_export.profile, data_export.search)
+    try:
+        with tempfile.TemporaryFile() as temporary:
+            if data_export.file_format == "xlsx":
+                rows = write_xlsx(data_export.entity, records, temporary)
+            else:
+                text = io.TextIOWrapper(temporary, encoding="utf-8", newline="")
+                rows = write_csv(data_export.entity, records, text)
+                text.flush()
+                text.detach()
+            temporary.seek(0)
+            data_export.file.save(
+                export_file_name(data_export.entity, data_export.file_format),
+                File(temporary),
+                save=False,
+            )
+    except Exception as error:
+        logger.exception("export %s failed", data_export.id)
+        DataExport.objects.filter(id=data_export.id).update(
+            status=DataExport.STATUS_FAILED,
+            error=str(error),
+            finished_at=timezone.now(),
+        )
+        raise
+    # bypassing save(), the creator of the export stays as it is
+    DataExport.objects.filter(id=data_export.id).update(
+        status=DataExport.STATUS_COMPLETED,
+        file=data_export.file.name,
+        rows=rows,
+        finished_at=timezone.now(),
+    )
+    logger.info("export %s completed rows=%s", data_export.id, rows)
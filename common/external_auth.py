@@ -2,6 +2,10 @@ import jwt
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from common import auth_cache
 from common.models import Org,Profile,User
 from django.conf import settings
 
@@ -15,6 +19,23 @@ def verify_jwt_token(token):
     except jwt.InvalidTokenError:
         return False, "Invalid token"
 
+class CachedJWTAuthentication(JWTAuthentication):
+    """simplejwt authentication that still verifies the token signature but
+    resolves the user from the auth cache instead of the database."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        try:
+            user = auth_cache.get_user(user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
 class CustomDualAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
@@ -26,11 +47,11 @@ class CustomDualAuthentication(BaseAuthentication):
         if jwt_token:
             is_valid, jwt_payload = verify_jwt_token(jwt_token)
             if is_valid:
-                jwt_user = (User.objects.get(id=jwt_payload['user_id']), True)
+                jwt_user = (auth_cache.get_user(jwt_payload['user_id']), True)
                 if jwt_payload['user_id'] is not None:
                     if request.headers.get("org"):
-                        profile = Profile.objects.get(
-                            user_id=jwt_payload['user_id'], org=request.headers.get("org"), is_active=True
+                        profile = auth_cache.get_profile(
+                            jwt_payload['user_id'], request.headers.get("org")
                         )
                         if profile:
                             request.profile = profile
@@ -39,10 +60,9 @@ class CustomDualAuthentication(BaseAuthentication):
         api_key = request.headers.get('Token')  # Get API key from request query params
         if api_key:
             try:
-                organization = Org.objects.get(api_key=api_key)
-                api_key_user = organization
-                request.META['org'] = api_key_user.id
-                profile = Profile.objects.filter(org=api_key_user, role="ADMIN").first()
+                org_id = auth_cache.get_api_key_org_id(api_key)
+                request.META['org'] = org_id
+                profile = auth_cache.get_org_admin_profile(org_id)
                 request.profile = profile
                 profile = (profile.user, True)
             except Org.DoesNotExist:
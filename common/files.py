@@ -0,0 +1,169 @@
+"""Uploaded files of attachments and documents.
+
+The category, MIME type, size and SHA-256 of an upload are worked out once,
+by ``update_file_details`` as the row holding it is saved, and stored on the
+row; listing files doesn't open them or parse their URLs. Categories come
+from ``FILE_CATEGORIES``, an extension lookup built from the extension sets
+of ``common_tags``.
+
+Images and PDFs get a PNG thumbnail, generated by the
+``generate_file_thumbnail`` task queued once the upload is committed. It is
+stored under the hash of the file, ``thumbnails/<hash>.png``, so uploads of
+the same file share it. PDF previews need the optional ``pdf2image`` and
+poppler; without them PDFs are listed with their icon only.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from common.templatetags.common_tags import (
+    AUDIO_EXTENSIONS,
+    CODE_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    PDF_EXTENSIONS,
+    SHEET_EXTENSIONS,
+    TEXT_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    ZIP_EXTENSIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIRECTORY = "thumbnails"
+THUMBNAIL_SIZE = getattr(settings, "THUMBNAIL_SIZE", (320, 320))
+THUMBNAIL_CATEGORIES = ("image", "pdf")
+HASH_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_FILE_CATEGORY = ("file", "fa fa-file")
+
+# category, icon, by the precedence of extensions in several sets
+CATEGORY_EXTENSIONS = (
+    ("audio", "fa fa-file-audio", AUDIO_EXTENSIONS),
+    ("video", "fa fa-file-video", VIDEO_EXTENSIONS),
+    ("image", "fa fa-file-image", IMAGE_EXTENSIONS),
+    ("pdf", "fa fa-file-pdf", PDF_EXTENSIONS),
+    ("code", "fa fa-file-code", CODE_EXTENSIONS),
+    ("text", "fa fa-file-alt", TEXT_EXTENSIONS),
+    ("sheet", "fa fa-file-excel", SHEET_EXTENSIONS),
+    ("zip", "fa fa-file-archive", ZIP_EXTENSIONS),
+)
+
+# extension -> (category, icon)
+FILE_CATEGORIES = {}
+for category, icon, extensions in reversed(CATEGORY_EXTENSIONS):
+    for extension in extensions:
+        FILE_CATEGORIES[extension] = (category, icon)
+
+CATEGORY_ICONS = {category: icon for category, icon, _ in CATEGORY_EXTENSIONS}
+
+
+def classify(name):
+    """``(category, icon)`` of a file named ``name``."""
+    extension = os.path.splitext(name or "")[1][1:].lower()
+    return FILE_CATEGORIES.get(extension, DEFAULT_FILE_CATEGORY)
+
+
+def category_icon(category):
+    return CATEGORY_ICONS.get(category, DEFAULT_FILE_CATEGORY[1])
+
+
+def guess_mime_type(name):
+    return mimetypes.guess_type(name or "")[0] or "application/octet-stream"
+
+
+def content_hash(file):
+    """SHA-256 of ``file``, read in chunks."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def update_file_details(instance, field_file):
+    """Set the file details of ``instance`` from ``field_file``, an upload
+    not saved to the storage yet."""
+    upload = field_file.file
+    instance.file_category = classify(field_file.name)[0]
+    instance.mime_type = (
+        getattr(upload, "content_type", None) or guess_mime_type(field_file.name)
+    )[:255]
+    instance.file_size = upload.size
+    instance.content_hash = content_hash(upload)
+    instance.thumbnail = ""
+    # no longer the stored file of a chunked upload, see common.uploads
+    instance._previous_stored_file_id = instance.stored_file_id
+    instance.stored_file = None
+    instance._file_changed = True
+
+
+def thumbnail_path(digest):
+    return "%s/%s.png" % (THUMBNAIL_DIRECTORY, digest)
+
+
+def _image_thumbnail(image):
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def render_thumbnail(field_file, category):
+    """PNG thumbnail of ``field_file``, ``None`` when it can't be made."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with field_file.open("rb") as file:
+        data = file.read()
+    if category == "pdf":
+        try:
+            from pdf2image import convert_from_bytes
+        except ImportError:
+            return None
+        try:
+            pages = convert_from_bytes(
+                data, first_page=1, last_page=1, size=THUMBNAIL_SIZE
+            )
+        except Exception:
+            logger.warning("no preview of %s", field_file.name, exc_info=True)
+            return None
+        return _image_thumbnail(pages[0]) if pages else None
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return _image_thumbnail(image)
+    except (OSError, Image.DecompressionBombError):
+        logger.warning("no thumbnail of %s", field_file.name, exc_info=True)
+        return None
+
+
+def store_thumbnail(instance):
+    """Generate the thumbnail of ``instance`` unless stored already, returns
+    its storage path, ``None`` for files without one."""
+    if (
+        instance.file_category not in THUMBNAIL_CATEGORIES
+        or not instance.content_hash
+    ):
+        return None
+    path = thumbnail_path(instance.content_hash)
+    if not default_storage.exists(path):
+        thumbnail = render_thumbnail(
+            getattr(instance, instance.FILE_FIELD), instance.file_category
+        )
+        if thumbnail is None:
+            return None
+        # unless stored concurrently by another worker meanwhile
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(thumbnail))
+    # bypassing save(), the file details stay as they are
+    type(instance).objects.filter(pk=instance.pk).update(thumbnail=path)
+    return path
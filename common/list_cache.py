@@ -0,0 +1,118 @@
+"""Cached list responses.
+
+List endpoints of ``LIST_CACHE_ENTITIES`` keep their serialized response in
+the shared cache, keyed on the org, who is asking (admins share one entry,
+other users see their own records) and the query parameters, so reloading
+the same page of a list doesn't touch the database.
+
+Every key embeds a generation counter of the org and entity, bumped by
+``invalidate`` on any write: the model and assignment signals registered in
+``common.signals``, plus the writes bypassing them (CSV imports, team
+propagation). A bump makes every cached page of the org unreachable at once;
+the entries themselves simply expire after ``LIST_CACHE_TTL`` seconds, which
+also bounds how long a page shows a renamed tag or user.
+
+Without a shared cache a bump would only reach the process doing the write,
+so lists are built on every request.
+
+Hits and misses are counted per process in ``stats`` and logged at debug
+level.
+"""
+import hashlib
+import logging
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from common.utils import shared_cache_enabled
+
+logger = logging.getLogger(__name__)
+
+LIST_CACHE_TTL = getattr(settings, "LIST_CACHE_TTL", 60 * 5)
+LIST_CACHE_GENERATION_TTL = 60 * 60 * 24 * 7
+
+# entity -> model
+LIST_CACHE_ENTITIES = {
+    "leads": "leads.Lead",
+}
+
+# (entity, "hit" / "miss") -> count, since the process started
+stats = Counter()
+
+
+def get_entity_model(entity):
+    return apps.get_model(LIST_CACHE_ENTITIES[entity])
+
+
+def get_entity(model):
+    for entity, label in LIST_CACHE_ENTITIES.items():
+        if model._meta.label == label:
+            return entity
+    return None
+
+
+def generation_key(entity, org_id):
+    return "list-cache:generation:%s:%s" % (entity, org_id)
+
+
+def get_generation(entity, org_id):
+    key = generation_key(entity, org_id)
+    generation = cache.get(key)
+    if generation is None:
+        # starts from the clock, so an evicted counter never reuses a value
+        cache.add(key, int(time.time() * 1000), LIST_CACHE_GENERATION_TTL)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(entity, org_id):
+    try:
+        cache.incr(generation_key(entity, org_id))
+    except ValueError:
+        get_generation(entity, org_id)
+
+
+def invalidate(entity, org_id):
+    """Drop every cached list of ``entity`` in ``org_id``."""
+    if org_id is None:
+        return
+    _bump(entity, org_id)
+    # and again once committed, dropping the pages cached meanwhile from the
+    # data before the write
+    transaction.on_commit(lambda: _bump(entity, org_id))
+
+
+def cache_key(entity, profile, params, is_admin):
+    """Key of the list of ``entity`` ``profile`` gets for the query
+    ``params``, a ``QueryDict``."""
+    query = "&".join(
+        "%s=%s" % (name, ",".join(sorted(values)))
+        for name, values in sorted(params.lists())
+    )
+    return "list-cache:%s:%s:%s:%s:%s" % (
+        entity,
+        profile.org_id,
+        get_generation(entity, profile.org_id),
+        "admin" if is_admin else profile.id,
+        hashlib.sha1(query.encode("utf-8")).hexdigest(),
+    )
+
+
+def get_or_build(entity, profile, params, is_admin, build):
+    """The cached response of the list, else the one ``build()`` returns,
+    cached on the way out."""
+    if not shared_cache_enabled():
+        return build()
+    key = cache_key(entity, profile, params, is_admin)
+    response = cache.get(key)
+    outcome = "hit" if response is not None else "miss"
+    stats[(entity, outcome)] += 1
+    logger.debug("list cache %s entity=%s org=%s", outcome, entity, profile.org_id)
+    if response is None:
+        response = build()
+        cache.set(key, response, LIST_CACHE_TTL)
+    return response
@@ -0,0 +1,70 @@
+"""Versioned, cached reference payloads ("lookups") served next to list views.
+
+Every (namespace, org) pair has a version token kept in the cache. Writes that
+affect a payload call ``bump_lookup_version`` which swaps the token, so cached
+payloads are never updated in place: readers simply stop finding them. The
+token doubles as the ETag of the lookup endpoint, letting clients revalidate
+with ``If-None-Match`` without the payload being rebuilt or even loaded.
+
+Without a shared cache the tokens of each process would drift apart, so
+payloads are built on every request and served without an ETag.
+"""
+import uuid
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from common.utils import shared_cache_enabled
+
+LOOKUP_CACHE_TTL = 60 * 60 * 24
+
+
+def _version_key(namespace, org_id):
+    return "lookups:%s:%s:version" % (namespace, org_id or "global")
+
+
+def _get_token(namespace, org_id):
+    key = _version_key(namespace, org_id)
+    # a missing token (first use or eviction) gets a fresh random one so a
+    # payload cached under an older token can never be served again
+    cache.add(key, uuid.uuid4().hex, None)
+    return cache.get(key)
+
+
+def get_lookup_version(namespace, org_id):
+    return "%s.%s" % (_get_token(namespace, org_id), _get_token(namespace, None))
+
+
+def bump_lookup_version(namespace, org_id=None):
+    """Invalidate the payloads of ``org_id``, or of every org when omitted."""
+    cache.set(_version_key(namespace, org_id), uuid.uuid4().hex, None)
+
+
+def get_lookups(namespace, org_id, build):
+    """Return ``(version, payload)``, building the payload on a cache miss."""
+    version = get_lookup_version(namespace, org_id)
+    key = "lookups:%s:%s:%s" % (namespace, org_id, version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, LOOKUP_CACHE_TTL)
+    return version, payload
+
+
+def lookup_response(request, namespace, org_id, build):
+    """Serve a lookup payload with ETag revalidation."""
+    if not shared_cache_enabled():
+        response = Response(build())
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    etag = '"%s:%s"' % (namespace, get_lookup_version(namespace, org_id))
+    if request.headers.get("If-None-Match") == etag:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        version, payload = get_lookups(namespace, org_id, build)
+        etag = '"%s:%s"' % (namespace, version)
+        response = Response(payload)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,126 @@
+"""@mentions in comments.
+
+Members of an org are mentioned by their email, ``@jane@example.com``, or by
+the part of it before the ``@``, ``@jane``, as long as no other member of the
+org shares it. ``MemberDirectory`` holds the active members of one org with
+their handles sorted, so a comment resolves all of its mentions with lookups
+in memory and the autocomplete endpoint matches a prefix with a binary search.
+
+The directory of an org is built with one query and kept in the shared cache
+for ``MENTION_DIRECTORY_TTL`` seconds; ``common.signals`` drops it whenever a
+profile of the org or the user behind it changes. Without a shared cache
+that would only reach the process doing the write, so the directory is built
+for every use.
+"""
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from common.models import Profile
+from common.utils import shared_cache_enabled
+
+MENTION_DIRECTORY_TTL = getattr(settings, "MENTION_DIRECTORY_TTL", 60 * 60)
+MENTION_AUTOCOMPLETE_LIMIT = 10
+MENTION_AUTOCOMPLETE_MAX_LIMIT = 50
+
+# "@jane", "@jane.doe" or "@jane@example.com", not the domain of an email
+MENTION_PATTERN = re.compile(r"(?<![\w.@])@([\w.+-]+(?:@[\w-]+(?:\.[\w-]+)+)?)")
+
+Member = namedtuple("Member", ["profile_id", "user_id", "email", "handle"])
+
+
+def directory_cache_key(org_id):
+    return "mentions:directory:%s" % org_id
+
+
+def extract_handles(text):
+    """The distinct handles mentioned in ``text``, lowercased, in order."""
+    handles = []
+    for match in MENTION_PATTERN.finditer(text or ""):
+        # a mention ending a sentence
+        handle = match.group(1).rstrip(".").lower()
+        if handle and handle not in handles:
+            handles.append(handle)
+    return handles
+
+
+class MemberDirectory(object):
+    """Handle to member map of an org, sorted for prefix lookups."""
+
+    def __init__(self, members):
+        local_parts = {}
+        for profile_id, user_id, email in members:
+            local_part = email.lower().split("@")[0]
+            local_parts[local_part] = local_parts.get(local_part, 0) + 1
+        self.members = []
+        self.handles = {}
+        for profile_id, user_id, email in members:
+            email = email.lower()
+            local_part = email.split("@")[0]
+            unique = local_parts[local_part] == 1
+            member = Member(profile_id, user_id, email, local_part if unique else email)
+            self.members.append(member)
+            self.handles[email] = member
+            if unique:
+                self.handles[local_part] = member
+        self._sorted = sorted(self.handles)
+
+    def resolve(self, handles):
+        """The members of ``handles``, unknown handles are skipped."""
+        members = []
+        for handle in handles:
+            member = self.handles.get(handle.lower())
+            if member is not None and member not in members:
+                members.append(member)
+        return members
+
+    def autocomplete(self, prefix, limit=MENTION_AUTOCOMPLETE_LIMIT):
+        """Members having a handle starting with ``prefix``, by handle."""
+        prefix = prefix.lower().lstrip("@")
+        members = []
+        position = bisect_left(self._sorted, prefix)
+        while position < len(self._sorted) and len(members) < limit:
+            handle = self._sorted[position]
+            if not handle.startswith(prefix):
+                break
+            position += 1
+            member = self.handles[handle]
+            if member not in members:
+                members.append(member)
+        return members
+
+
+def build_directory(org_id):
+    members = list(
+        Profile.objects.filter(org_id=org_id, is_active=True, user__is_active=True)
+        .exclude(user__email="")
+        .order_by("user__email")
+        .values_list("id", "user_id", "user__email")
+    )
+    return MemberDirectory(members)
+
+
+def get_directory(org_id):
+    if not shared_cache_enabled():
+        return build_directory(org_id)
+    key = directory_cache_key(org_id)
+    directory = cache.get(key)
+    if directory is None:
+        directory = build_directory(org_id)
+        cache.set(key, directory, MENTION_DIRECTORY_TTL)
+    return directory
+
+
+def invalidate_directories(*org_ids):
+    cache.delete_many([directory_cache_key(org_id) for org_id in org_ids])
+
+
+def resolve_mentions(org_id, text):
+    """The members of ``org_id`` mentioned in ``text``."""
+    handles = extract_handles(text)
+    if not handles or org_id is None:
+        return []
+    return get_directory(org_id).resolve(handles)
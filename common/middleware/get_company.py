@@ -6,7 +6,9 @@ from rest_framework import status
 from rest_framework.response import Response
 from crum import get_current_user
 from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
 
+from common import auth_cache
 from common.models import Org, Profile, User
 
 
@@ -44,34 +46,32 @@ class GetProfileAndOrg(object):
         return self.get_response(request)
 
     def process_request(self, request):
-        print("executing middleware")
+        request.profile = None
+        # static files, wagtail pages etc. carry no credentials, skip them early
+        if not (request.headers.get("Authorization") or request.headers.get("Token")):
+            return
         try :
-            request.profile = None
             user_id = None
             # here I am getting the the jwt token passing in header
             if request.headers.get("Authorization"):
                 token1 = request.headers.get("Authorization")
                 token = token1.split(" ")[1]  # getting the token value
+                # the signature is always verified, only the lookups are cached
                 decoded = jwt.decode(token, (settings.SECRET_KEY), algorithms=[settings.JWT_ALGO])
                 user_id = decoded['user_id']
             api_key = request.headers.get('Token')  # Get API key from request query params
             if api_key:
                 try:
-                    organization = Org.objects.get(api_key=api_key)
-                    api_key_user = organization
-                    request.META['org'] = api_key_user.id
-                    profile = Profile.objects.filter(org=api_key_user, role="ADMIN").first()
-                    user_id = profile.user.id
+                    org_id = auth_cache.get_api_key_org_id(api_key)
+                    request.META['org'] = org_id
+                    profile = auth_cache.get_org_admin_profile(org_id)
+                    user_id = profile.user_id
                 except Org.DoesNotExist:
                     raise AuthenticationFailed('Invalid API Key')
             if user_id is not None:
                 if request.headers.get("org"):
-                    print(user_id)
-                    profile = Profile.objects.get(
-                        user_id=user_id, org=request.headers.get("org"), is_active=True
+                    request.profile = auth_cache.get_profile(
+                        user_id, request.headers.get("org")
                     )
-                    if profile:
-                        request.profile = profile
         except :
-             print('test1')
              raise PermissionDenied()
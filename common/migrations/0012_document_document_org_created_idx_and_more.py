@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0011_modify_phone_req'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='document_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='profile_org_created_idx'),
+        ),
+    ]
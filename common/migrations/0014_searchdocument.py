@@ -0,0 +1,66 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:03
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+# GIN indexes only exist on PostgreSQL, other databases search in process
+SEARCH_INDEXES = [
+    GinIndex(fields=["vector"], name="search_document_vector_gin"),
+    GinIndex(
+        fields=["title"], name="search_document_title_trgm", opclasses=["gin_trgm_ops"]
+    ),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    SearchDocument = apps.get_model("common", "SearchDocument")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(SearchDocument, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    SearchDocument = apps.get_model("common", "SearchDocument")
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(SearchDocument, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0013_dashboardcounter'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32)),
+                ('object_id', models.UUIDField()),
+                ('title', models.CharField(max_length=1024)),
+                ('body', models.TextField(blank=True, default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='common.org')),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'db_table': 'search_document',
+                'indexes': [models.Index(fields=['org', 'entity'], name='search_document_org_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('entity', 'object_id'), name='search_document_unique'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# (app, model, many to many of the assigned profiles or None), see
+# common.visibility.VISIBILITY_ENTITIES
+VISIBILITY_ENTITIES = {
+    "accounts": ("accounts", "Account", "assigned_to"),
+    "cases": ("cases", "Case", "assigned_to"),
+    "contacts": ("contacts", "Contact", "assigned_to"),
+    "events": ("events", "Event", "assigned_to"),
+    "leads": ("leads", "Lead", "assigned_to"),
+    "lenders": ("lender", "Lender", None),
+    "opportunities": ("opportunity", "Opportunity", "assigned_to"),
+    "tasks": ("tasks", "Task", "assigned_to"),
+}
+
+
+def _insert(RecordVisibility, entity, reason, rows):
+    batch = []
+    for record_id, profile_id in rows.iterator(chunk_size=1000):
+        batch.append(
+            RecordVisibility(
+                entity=entity, record_id=record_id, profile_id=profile_id, reason=reason
+            )
+        )
+        if len(batch) >= 1000:
+            RecordVisibility.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    RecordVisibility.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fill_record_visibility(apps, schema_editor):
+    Profile = apps.get_model("common", "Profile")
+    RecordVisibility = apps.get_model("common", "RecordVisibility")
+    for entity, (app_label, model_name, field_name) in VISIBILITY_ENTITIES.items():
+        model = apps.get_model(app_label, model_name)
+        creator = Profile.objects.filter(
+            org_id=models.OuterRef("org_id"), user_id=models.OuterRef("created_by_id")
+        ).values("id")[:1]
+        rows = (
+            model.objects.exclude(created_by=None)
+            .annotate(creator_profile=models.Subquery(creator))
+            .exclude(creator_profile=None)
+            .values_list("id", "creator_profile")
+        )
+        _insert(RecordVisibility, entity, "creator", rows)
+        if field_name is None:
+            continue
+        field = model._meta.get_field(field_name)
+        assignments = field.remote_field.through.objects.values_list(
+            field.m2m_field_name(), field.m2m_reverse_field_name()
+        )
+        _insert(RecordVisibility, entity, "assigned", assignments)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0014_searchdocument'),
+        ('accounts', '0009_account_accounts_org_created_idx'),
+        ('cases', '0004_case_case_org_created_idx'),
+        ('contacts', '0007_contact_contacts_org_created_idx'),
+        ('events', '0002_event_event_org_created_idx'),
+        ('leads', '0007_leadimport'),
+        ('lender', '0003_lender_lender_org_created_idx'),
+        ('opportunity', '0006_opportunity_opportunity_org_created_idx'),
+        ('tasks', '0004_task_task_org_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32)),
+                ('record_id', models.UUIDField()),
+                ('reason', models.CharField(choices=[('assigned', 'Assigned'), ('creator', 'Creator')], max_length=16)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='record_visibility', to='common.profile')),
+            ],
+            options={
+                'verbose_name': 'Record Visibility',
+                'verbose_name_plural': 'Record Visibility',
+                'db_table': 'record_visibility',
+                'indexes': [models.Index(fields=['profile', 'entity', 'record_id'], name='record_visibility_profile_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recordvisibility',
+            constraint=models.UniqueConstraint(fields=('entity', 'record_id', 'profile', 'reason'), name='record_visibility_unique'),
+        ),
+        migrations.RunPython(fill_record_visibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:50
+
+import mimetypes
+
+from django.db import migrations, models
+
+from common.files import classify
+
+
+def fill_file_details(apps, schema_editor):
+    # from the names only, size and hash would take reading every file
+    for model_name, field_name in (
+        ("Attachments", "attachment"),
+        ("Document", "document_file"),
+    ):
+        model = apps.get_model("common", model_name)
+        rows = model.objects.values_list("id", field_name)
+        for pk, name in rows.iterator(chunk_size=1000):
+            model.objects.filter(pk=pk).update(
+                file_category=classify(name)[0],
+                mime_type=mimetypes.guess_type(name or "")[0] or "",
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0015_recordvisibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachments',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='attachments',
+            name='file_category',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='attachments',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attachments',
+            name='mime_type',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='attachments',
+            name='thumbnail',
+            field=models.FileField(blank=True, default='', max_length=255, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='file_category',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='mime_type',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='thumbnail',
+            field=models.FileField(blank=True, default='', max_length=255, upload_to=''),
+        ),
+        migrations.RunPython(fill_file_details, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0017_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateMatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32)),
+                ('cluster_id', models.UUIDField()),
+                ('object_id', models.UUIDField()),
+                ('score', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_matches', to='common.org')),
+            ],
+            options={
+                'verbose_name': 'Duplicate Match',
+                'verbose_name_plural': 'Duplicate Matches',
+                'db_table': 'duplicate_match',
+                'indexes': [models.Index(fields=['org', 'entity', 'cluster_id'], name='duplicate_match_org_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BlockingKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32)),
+                ('object_id', models.UUIDField()),
+                ('key', models.CharField(max_length=255)),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocking_keys', to='common.org')),
+            ],
+            options={
+                'verbose_name': 'Blocking Key',
+                'verbose_name_plural': 'Blocking Keys',
+                'db_table': 'blocking_key',
+                'indexes': [models.Index(fields=['org', 'entity', 'key', 'object_id'], name='blocking_key_lookup_idx'), models.Index(fields=['object_id', 'entity'], name='blocking_key_record_idx')],
+            },
+        ),
+    ]
@@ -5,6 +5,7 @@ import uuid
 import arrow
 import re
 from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from .manager import UserManager
@@ -13,16 +14,7 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
-from common.templatetags.common_tags import (
-    is_document_file_audio,
-    is_document_file_code,
-    is_document_file_image,
-    is_document_file_pdf,
-    is_document_file_sheet,
-    is_document_file_text,
-    is_document_file_video,
-    is_document_file_zip,
-)
+from common import files
 from common.utils import COUNTRIES, ROLES
 from common.base import BaseModel
 
@@ -191,6 +183,12 @@ class Profile(BaseModel):
         db_table = "profile"
         ordering = ("-created_at",)
         unique_together = ["user", "org"]
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="profile_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} <{self.org.name}>"
@@ -332,6 +330,21 @@ class Attachments(BaseModel):
     )
     file_name = models.CharField(max_length=60)
     attachment = models.FileField(max_length=1001, upload_to="attachments/%Y/%m/")
+    # set on upload, see common.files
+    file_category = models.CharField(max_length=16, blank=True, default="")
+    mime_type = models.CharField(max_length=255, blank=True, default="")
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", db_index=True
+    )
+    thumbnail = models.FileField(max_length=255, blank=True, default="")
+    stored_file = models.ForeignKey(
+        "common.StoredFile",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="attachments",
+    )
     lead = models.ForeignKey(
         "leads.Lead",
         null=True,
@@ -400,28 +413,19 @@ class Attachments(BaseModel):
     def __str__(self):
         return f"{self.file_name}"
 
+    FILE_FIELD = "attachment"
+
+    def save(self, *args, **kwargs):
+        if self.attachment and not self.attachment._committed:
+            files.update_file_details(self, self.attachment)
+        super().save(*args, **kwargs)
+        self._file_changed = False
+
     def file_type(self):
-        name_ext_list = self.attachment.url.split(".")
-        if len(name_ext_list) > 1:
-            ext = name_ext_list[int(len(name_ext_list) - 1)]
-            if is_document_file_audio(ext):
-                return ("audio", "fa fa-file-audio")
-            if is_document_file_video(ext):
-                return ("video", "fa fa-file-video")
-            if is_document_file_image(ext):
-                return ("image", "fa fa-file-image")
-            if is_document_file_pdf(ext):
-                return ("pdf", "fa fa-file-pdf")
-            if is_document_file_code(ext):
-                return ("code", "fa fa-file-code")
-            if is_document_file_text(ext):
-                return ("text", "fa fa-file-alt")
-            if is_document_file_sheet(ext):
-                return ("sheet", "fa fa-file-excel")
-            if is_document_file_zip(ext):
-                return ("zip", "fa fa-file-archive")
-            return ("file", "fa fa-file")
-        return ("file", "fa fa-file")
+        if self.file_category:
+            return (self.file_category, files.category_icon(self.file_category))
+        # rows saved before the details were stored
+        return files.classify(self.attachment.name)
 
     def get_file_type_display(self):
         if self.attachment:
@@ -444,6 +448,21 @@ class Document(BaseModel):
 
     title = models.TextField(blank=True, null=True)
     document_file = models.FileField(upload_to=document_path, max_length=5000)
+    # set on upload, see common.files
+    file_category = models.CharField(max_length=16, blank=True, default="")
+    mime_type = models.CharField(max_length=255, blank=True, default="")
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", db_index=True
+    )
+    thumbnail = models.FileField(max_length=255, blank=True, default="")
+    stored_file = models.ForeignKey(
+        "common.StoredFile",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="documents",
+    )
     created_by = models.ForeignKey(
         Profile,
         related_name="document_uploaded",
@@ -470,32 +489,29 @@ class Document(BaseModel):
         verbose_name_plural = "Documents"
         db_table = "document"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="document_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title}"
- 
+
+    FILE_FIELD = "document_file"
+
+    def save(self, *args, **kwargs):
+        if self.document_file and not self.document_file._committed:
+            files.update_file_details(self, self.document_file)
+        super().save(*args, **kwargs)
+        self._file_changed = False
+
     def file_type(self):
-        name_ext_list = self.document_file.url.split(".")
-        if len(name_ext_list) > 1:
-            ext = name_ext_list[int(len(name_ext_list) - 1)]
-            if is_document_file_audio(ext):
-                return ("audio", "fa fa-file-audio")
-            if is_document_file_video(ext):
-                return ("video", "fa fa-file-video")
-            if is_document_file_image(ext):
-                return ("image", "fa fa-file-image")
-            if is_document_file_pdf(ext):
-                return ("pdf", "fa fa-file-pdf")
-            if is_document_file_code(ext):
-                return ("code", "fa fa-file-code")
-            if is_document_file_text(ext):
-                return ("text", "fa fa-file-alt")
-            if is_document_file_sheet(ext):
-                return ("sheet", "fa fa-file-excel")
-            if is_document_file_zip(ext):
-                return ("zip", "fa fa-file-archive")
-            return ("file", "fa fa-file")
-        return ("file", "fa fa-file")
+        if self.file_category:
+            return (self.file_category, files.category_icon(self.file_category))
+        # rows saved before the details were stored
+        return files.classify(self.document_file.name)
 
     @property
     def get_team_users(self):
@@ -563,3 +579,264 @@ class APISettings(BaseModel):
         if not self.apikey or self.apikey is None or self.apikey == "":
             self.apikey = generate_key()
         super().save(*args, **kwargs)
+
+
+class DashboardCounter(models.Model):
+    """Record counts of an org per entity, status and profile, maintained by
+    ``common.dashboard``. ``profile`` is empty on the org wide counters."""
+
+    org = models.ForeignKey(
+        Org, on_delete=models.CASCADE, related_name="dashboard_counters"
+    )
+    entity = models.CharField(max_length=32)
+    status = models.CharField(max_length=64, blank=True, default="")
+    profile = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="dashboard_counters",
+    )
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Dashboard Counter"
+        verbose_name_plural = "Dashboard Counters"
+        db_table = "dashboard_counter"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["org", "entity", "status", "profile"],
+                name="dashboard_counter_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["org", "entity", "status"],
+                condition=models.Q(profile__isnull=True),
+                name="dashboard_counter_org_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.status}: {self.count}"
+
+
+class SearchDocument(models.Model):
+    """Searchable text of a lead, contact, account or opportunity, maintained
+    by ``common.search``. ``vector`` is only filled on PostgreSQL."""
+
+    org = models.ForeignKey(
+        Org, on_delete=models.CASCADE, related_name="search_documents"
+    )
+    entity = models.CharField(max_length=32)
+    object_id = models.UUIDField()
+    title = models.CharField(max_length=1024)
+    body = models.TextField(blank=True, default="")
+    vector = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Search Document"
+        verbose_name_plural = "Search Documents"
+        db_table = "search_document"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity", "object_id"], name="search_document_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["org", "entity"], name="search_document_org_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.entity}: {self.title}"
+
+
+class RecordVisibility(models.Model):
+    """A profile that can see a record, and why, maintained by
+    ``common.visibility``."""
+
+    REASON_ASSIGNED = "assigned"
+    REASON_CREATOR = "creator"
+    REASON_CHOICES = (
+        (REASON_ASSIGNED, "Assigned"),
+        (REASON_CREATOR, "Creator"),
+    )
+
+    entity = models.CharField(max_length=32)
+    record_id = models.UUIDField()
+    profile = models.ForeignKey(
+        Profile, on_delete=models.CASCADE, related_name="record_visibility"
+    )
+    reason = models.CharField(max_length=16, choices=REASON_CHOICES)
+
+    class Meta:
+        verbose_name = "Record Visibility"
+        verbose_name_plural = "Record Visibility"
+        db_table = "record_visibility"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity", "record_id", "profile", "reason"],
+                name="record_visibility_unique",
+            ),
+        ]
+        indexes = [
+            # the semi-join of common.visibility.visible_to
+            models.Index(
+                fields=["profile", "entity", "record_id"],
+                name="record_visibility_profile_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.record_id}: {self.reason}"
+
+
+class BlockingKey(models.Model):
+    """A normalized email, phone or name of a lead or contact, records
+    sharing one are compared for duplicates, see ``common.dedupe``."""
+
+    org = models.ForeignKey(Org, on_delete=models.CASCADE, related_name="blocking_keys")
+    entity = models.CharField(max_length=32)
+    object_id = models.UUIDField()
+    key = models.CharField(max_length=255)
+
+    class Meta:
+        verbose_name = "Blocking Key"
+        verbose_name_plural = "Blocking Keys"
+        db_table = "blocking_key"
+        indexes = [
+            # the candidates of a record, and the blocks of an org in order
+            models.Index(
+                fields=["org", "entity", "key", "object_id"],
+                name="blocking_key_lookup_idx",
+            ),
+            # not led by entity, no planner should prefer it for lookups
+            models.Index(
+                fields=["object_id", "entity"], name="blocking_key_record_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id}: {self.key}"
+
+
+class DuplicateMatch(models.Model):
+    """A record of a cluster of likely duplicates found by the
+    ``cluster_duplicates`` job; clusters are named after their first
+    record."""
+
+    org = models.ForeignKey(
+        Org, on_delete=models.CASCADE, related_name="duplicate_matches"
+    )
+    entity = models.CharField(max_length=32)
+    cluster_id = models.UUIDField()
+    object_id = models.UUIDField()
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Duplicate Match"
+        verbose_name_plural = "Duplicate Matches"
+        db_table = "duplicate_match"
+        indexes = [
+            models.Index(
+                fields=["org", "entity", "cluster_id"], name="duplicate_match_org_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id} in {self.cluster_id}: {self.score}"
+
+
+class StoredFile(models.Model):
+    """Content of uploads, stored once per SHA-256 and shared by the
+    attachments and documents referencing it, see ``common.uploads``."""
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=1001)
+    size = models.PositiveBigIntegerField()
+    mime_type = models.CharField(max_length=255, blank=True, default="")
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stored File"
+        verbose_name_plural = "Stored Files"
+        db_table = "stored_file"
+
+    def __str__(self):
+        return f"{self.content_hash}: {self.references}"
+
+
+class UploadSession(BaseModel):
+    """A chunked upload in progress, resumed from ``received`` bytes."""
+
+    org = models.ForeignKey(Org, on_delete=models.CASCADE, related_name="uploads")
+    profile = models.ForeignKey(
+        Profile, on_delete=models.CASCADE, related_name="uploads"
+    )
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, blank=True, default="")
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    parts = models.PositiveIntegerField(default=0)
+    stored_file = models.ForeignKey(
+        StoredFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="uploads",
+    )
+
+    class Meta:
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        db_table = "upload_session"
+
+    def __str__(self):
+        return f"{self.file_name}: {self.received}/{self.size}"
+
+    @property
+    def is_complete(self):
+        return self.stored_file_id is not None
+
+
+class DataExport(BaseModel):
+    """A CSV or XLSX export too large to stream, written to the storage by
+    ``export_records``."""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    org = models.ForeignKey(Org, on_delete=models.CASCADE, related_name="exports")
+    profile = models.ForeignKey(
+        Profile, on_delete=models.CASCADE, related_name="exports"
+    )
+    entity = models.CharField(max_length=32)
+    file_format = models.CharField(max_length=8)
+    search = models.CharField(max_length=255, blank=True, default="")
+    file = models.FileField(
+        max_length=1001, upload_to="exports/%Y/%m/", null=True, blank=True
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Data Export"
+        verbose_name_plural = "Data Exports"
+        db_table = "data_export"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.entity}.{self.file_format} ({self.status})"
@@ -0,0 +1,129 @@
+"""Keyset (cursor) pagination shared by the CRM list views.
+
+Pages are ordered on ``(created_at, id)`` and the next page is requested with
+an opaque cursor encoding the last row of the current one, so fetching a deep
+page costs the same as fetching the first. Totals are not computed on the hot
+path: ``?count=exact`` runs a COUNT(*), ``?count=approximate`` (the default)
+asks the PostgreSQL planner for its row estimate and ``?count=none`` skips it.
+
+Clients still sending ``?offset=`` keep working through a plain LIMIT/OFFSET
+fallback, without the extra COUNT queries the old views ran.
+"""
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+COUNT_EXACT = "exact"
+COUNT_APPROXIMATE = "approximate"
+COUNT_NONE = "none"
+
+
+def approximate_count(queryset):
+    """Planner row estimate for ``queryset``, falls back to COUNT(*) on
+    databases without ``EXPLAIN (FORMAT JSON)``."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def encode_cursor(created_at, pk):
+    position = json.dumps([created_at.isoformat(), str(pk)])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = parse_datetime(created_at)
+        pk = uuid.UUID(pk)
+    except (AttributeError, TypeError, ValueError, UnicodeError):
+        raise NotFound("Invalid cursor")
+    if created_at is None:
+        raise NotFound("Invalid cursor")
+    return created_at, pk
+
+
+class KeysetPagination(object):
+    """Drop-in replacement for ``LimitOffsetPagination`` on the list views.
+
+    After ``paginate_queryset`` the view can read ``count``, ``next_cursor``,
+    ``next_offset`` and ``offset``. Views returning several buckets from one
+    request pass a distinct ``cursor_query_param`` per bucket, and views that
+    already know their totals pass ``with_count=False``.
+    """
+
+    default_limit = settings.REST_FRAMEWORK.get("PAGE_SIZE", 10)
+    max_limit = 100
+    limit_query_param = "limit"
+    offset_query_param = "offset"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    default_count = getattr(settings, "PAGINATION_DEFAULT_COUNT", COUNT_APPROXIMATE)
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def get_offset(self, request):
+        try:
+            return max(int(request.query_params[self.offset_query_param]), 0)
+        except (KeyError, ValueError):
+            return 0
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, self.default_count)
+        if mode == COUNT_EXACT:
+            return queryset.count()
+        if mode == COUNT_APPROXIMATE:
+            return approximate_count(queryset)
+        return None
+
+    def paginate_queryset(
+        self, queryset, request, view=None, cursor_query_param=None, with_count=True
+    ):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = 0
+        self.next_cursor = None
+        self.next_offset = None
+        cursor_query_param = cursor_query_param or self.cursor_query_param
+
+        self.count = self.get_count(queryset, request) if with_count else None
+        queryset = queryset.order_by("-created_at", "-id")
+        cursor = request.query_params.get(cursor_query_param)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        else:
+            self.offset = self.get_offset(request)
+            queryset = queryset[self.offset :]
+
+        # one extra row tells whether a next page exists without counting
+        results = list(queryset[: self.limit + 1])
+        if len(results) > self.limit:
+            results = results[: self.limit]
+            last = results[-1]
+            self.next_cursor = encode_cursor(last.created_at, last.pk)
+            if not cursor:
+                self.next_offset = self.offset + self.limit
+        return results
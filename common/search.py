@@ -0,0 +1,319 @@
+"""Full text search over leads, contacts, accounts and opportunities.
+
+Every record of ``SEARCH_ENTITIES`` has a ``SearchDocument`` holding its
+searchable text, kept up to date from the model signals registered in
+``common.signals``. Writes that bypass signals are indexed explicitly with
+``index_records`` or corrected by ``reindex_org``, run for every org by the
+``reindex_search_documents`` beat task.
+
+On PostgreSQL the document carries a weighted ``tsvector`` (the name weighs
+more than emails, phones and cities) behind a GIN index, plus a trigram index
+on the title for misspelled names, so a search is an index lookup whatever the
+size of the org. Other databases, i.e. the SQLite test runs, search an in
+process ``InvertedIndex`` of the org built from its documents on first use.
+"""
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import Count, F, Max, Q
+
+from common.models import SearchDocument
+from common.visibility import sees_all, visible_to
+
+SEARCH_RESULTS_LIMIT = getattr(settings, "SEARCH_RESULTS_LIMIT", 20)
+SEARCH_MAX_RESULTS = 100
+SEARCH_INDEX_BATCH_SIZE = 1000
+# names, emails and phone numbers, nothing to stem
+SEARCH_CONFIG = "simple"
+
+# entity -> (model, fields making the title, other searchable fields)
+SEARCH_ENTITIES = {
+    "leads": (
+        "leads.Lead",
+        ("first_name", "last_name", "title", "account_name"),
+        ("email", "phone", "city", "state", "website"),
+    ),
+    "contacts": (
+        "contacts.Contact",
+        ("first_name", "last_name"),
+        (
+            "primary_email",
+            "secondary_email",
+            "mobile_number",
+            "organization",
+            "title",
+            "address__city",
+        ),
+    ),
+    "accounts": (
+        "accounts.Account",
+        ("name",),
+        ("email", "phone", "industry", "billing_city", "website"),
+    ),
+    "opportunities": (
+        "opportunity.Opportunity",
+        ("name",),
+        ("account__name", "stage", "lead_source"),
+    ),
+}
+
+SEARCH_VECTOR = SearchVector("title", weight="A", config=SEARCH_CONFIG) + SearchVector(
+    "body", weight="B", config=SEARCH_CONFIG
+)
+
+# org id -> (documents stamp, InvertedIndex), see _memory_index
+_memory_indexes = {}
+
+
+def get_entity_model(entity):
+    return apps.get_model(SEARCH_ENTITIES[entity][0])
+
+
+def get_entity(model):
+    for entity, (label, _, _) in SEARCH_ENTITIES.items():
+        if model._meta.label == label:
+            return entity
+    return None
+
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def _join(values):
+    return " ".join(str(value) for value in values if value)
+
+
+def _documents(entity, records):
+    """Yield the ``SearchDocument`` of every record of ``records`` having an
+    org, and the ids of the ones without."""
+    _, title_fields, body_fields = SEARCH_ENTITIES[entity]
+    rows = records.order_by().values_list(
+        "id", "org_id", *(title_fields + body_fields)
+    )
+    for row in rows.iterator(chunk_size=SEARCH_INDEX_BATCH_SIZE):
+        record_id, org_id, values = row[0], row[1], row[2:]
+        if org_id is None:
+            yield record_id, None
+            continue
+        yield record_id, SearchDocument(
+            org_id=org_id,
+            entity=entity,
+            object_id=record_id,
+            title=_join(values[: len(title_fields)])[:1024],
+            # stored tokenized so every backend splits words the same way
+            body=" ".join(tokenize(_join(values[len(title_fields) :]))),
+        )
+
+
+def _save_documents(entity, documents):
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["entity", "object_id"],
+        update_fields=["org", "title", "body", "updated_at"],
+    )
+    if connection.vendor == "postgresql":
+        SearchDocument.objects.filter(
+            entity=entity, object_id__in=[document.object_id for document in documents]
+        ).update(vector=SEARCH_VECTOR)
+    for org_id in {document.org_id for document in documents}:
+        _memory_indexes.pop(str(org_id), None)
+
+
+def index_records(entity, records):
+    """Create or refresh the documents of ``records``, a queryset of
+    ``entity``, in batches of ``SEARCH_INDEX_BATCH_SIZE``."""
+    batch = []
+    orphans = []
+    for record_id, document in _documents(entity, records):
+        if document is None:
+            orphans.append(record_id)
+            continue
+        batch.append(document)
+        if len(batch) >= SEARCH_INDEX_BATCH_SIZE:
+            _save_documents(entity, batch)
+            batch = []
+    if batch:
+        _save_documents(entity, batch)
+    if orphans:
+        remove_records(entity, orphans)
+
+
+def remove_records(entity, record_ids):
+    documents = SearchDocument.objects.filter(entity=entity, object_id__in=record_ids)
+    for org_id in set(documents.values_list("org_id", flat=True)):
+        _memory_indexes.pop(str(org_id), None)
+    documents.delete()
+
+
+def reindex_org(org_id):
+    """Rebuild the documents of ``org_id`` from the records."""
+    for entity in SEARCH_ENTITIES:
+        records = get_entity_model(entity).objects.filter(org_id=org_id)
+        SearchDocument.objects.filter(org_id=org_id, entity=entity).exclude(
+            object_id__in=records.values("id")
+        ).delete()
+        index_records(entity, records)
+    _memory_indexes.pop(str(org_id), None)
+
+
+class InvertedIndex(object):
+    """Token to documents map matched by token prefix, the search backend of
+    databases without full text indexes."""
+
+    TITLE_WEIGHT = 1.0
+    BODY_WEIGHT = 0.4
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.titles = {}
+        self._vocabulary = None
+
+    def add(self, key, title, body):
+        self.titles[key] = title
+        for weight, text in ((self.BODY_WEIGHT, body), (self.TITLE_WEIGHT, title)):
+            for token in tokenize(text):
+                postings = self.postings[token]
+                postings[key] = max(postings.get(key, 0), weight)
+        self._vocabulary = None
+
+    def _matches(self, term):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        scores = {}
+        position = bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary):
+            token = self._vocabulary[position]
+            if not token.startswith(term):
+                break
+            position += 1
+            for key, weight in self.postings[token].items():
+                # whole words rank above prefixes
+                weight = weight if token == term else weight / 2
+                scores[key] = max(scores.get(key, 0), weight)
+        return scores
+
+    def search(self, terms):
+        """``(key, rank)`` of the documents matching every term, best first."""
+        scores = None
+        for term in terms:
+            matches = self._matches(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    key: scores[key] + rank
+                    for key, rank in matches.items()
+                    if key in scores
+                }
+        return sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+
+
+def _memory_index(org_id):
+    documents = SearchDocument.objects.filter(org_id=org_id)
+    # rebuilt whenever the documents changed, e.g. in another process
+    stamp = tuple(documents.aggregate(Count("id"), Max("updated_at")).values())
+    cached = _memory_indexes.get(str(org_id))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    index = InvertedIndex()
+    for entity, object_id, title, body in documents.values_list(
+        "entity", "object_id", "title", "body"
+    ).iterator():
+        index.add((entity, object_id), title, body)
+    _memory_indexes[str(org_id)] = (stamp, index)
+    return index
+
+
+def _visible_to(profile, entities):
+    visible = Q()
+    for entity in entities:
+        if sees_all(entity, profile):
+            visible |= Q(entity=entity)
+            continue
+        records = visible_to(get_entity_model(entity).objects.all(), profile)
+        visible |= Q(entity=entity, object_id__in=records.values("id"))
+    return visible
+
+
+def _search_query(terms):
+    return SearchQuery(
+        " & ".join("%s:*" % term for term in terms),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+
+
+def _search_postgres(documents, terms, limit):
+    query = _search_query(terms)
+    text = " ".join(terms)
+    return list(
+        documents.filter(Q(vector=query) | Q(title__trigram_similar=text))
+        .annotate(rank=SearchRank(F("vector"), query) + TrigramSimilarity("title", text))
+        .order_by("-rank", "entity", "object_id")
+        .values_list("entity", "object_id", "title", "rank")[:limit]
+    )
+
+
+def _search_memory(org_id, documents, terms, limit, scoped):
+    index = _memory_index(org_id)
+    allowed = None
+    if scoped:
+        allowed = {
+            (entity, object_id)
+            for entity, object_id in documents.values_list("entity", "object_id")
+        }
+    results = []
+    for key, rank in index.search(terms):
+        if allowed is not None and key not in allowed:
+            continue
+        results.append(key + (index.titles[key], rank))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def search(org, text, entities=None, profile=None, limit=SEARCH_RESULTS_LIMIT):
+    """Best matches of ``text`` in ``org`` as ``(entity, object_id, title,
+    rank)``, restricted to the records ``profile`` sees in the list views
+    when given. Every word of ``text`` must match the start of a word."""
+    terms = tokenize(text)
+    if not terms:
+        return []
+    entities = list(entities or SEARCH_ENTITIES)
+    if profile is not None and all(sees_all(entity, profile) for entity in entities):
+        profile = None
+    documents = SearchDocument.objects.filter(org=org, entity__in=entities)
+    if profile is not None:
+        documents = documents.filter(_visible_to(profile, entities))
+    if connection.vendor == "postgresql":
+        return _search_postgres(documents, terms, limit)
+    scoped = profile is not None or len(entities) < len(SEARCH_ENTITIES)
+    return _search_memory(org.id, documents, terms, limit, scoped)
+
+
+def filter_by_search(queryset, entity, org, text):
+    """Restrict ``queryset`` of ``entity`` to the records matching ``text``."""
+    terms = tokenize(text)
+    if not terms:
+        return queryset
+    if connection.vendor == "postgresql":
+        documents = SearchDocument.objects.filter(
+            org=org, entity=entity, vector=_search_query(terms)
+        )
+        return queryset.filter(id__in=documents.values("object_id"))
+    matches = _memory_index(org.id).search(terms)
+    return queryset.filter(
+        id__in=[key[1] for key, _ in matches if key[0] == entity]
+    )
@@ -12,9 +12,11 @@ from common.models import (
     APISettings,
     Attachments,
     Comment,
+    DataExport,
     Document,
     Org,
     Profile,
+    UploadSession,
     User,
 )
 
@@ -199,6 +201,8 @@ class ProfileSerializer(serializers.ModelSerializer):
             "date_of_joining",
             "is_active",
         )
+        # user_details reads profile.user, see common.fieldsets
+        select_related_hints = {"user_details": ("user",)}
 
 
 class AttachmentsSerializer(serializers.ModelSerializer):
@@ -211,7 +215,17 @@ class AttachmentsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Attachments
-        fields = ["id", "created_by", "file_name", "created_at", "file_path"]
+        fields = [
+            "id",
+            "created_by",
+            "file_name",
+            "created_at",
+            "file_path",
+            "file_category",
+            "mime_type",
+            "file_size",
+            "thumbnail",
+        ]
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -229,6 +243,10 @@ class DocumentSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "document_file",
+            "file_category",
+            "mime_type",
+            "file_size",
+            "thumbnail",
             "status",
             "shared_to",
             "teams",
@@ -243,6 +261,9 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
         request_obj = kwargs.pop("request_obj", None)
         super().__init__(*args, **kwargs)
         self.fields["title"].required = True
+        # or the id of a chunked upload, see common.uploads
+        if request_obj.data.get("document_file_upload"):
+            self.fields["document_file"].required = False
         self.org = request_obj.profile.org
 
     def validate_title(self, title):
@@ -331,12 +352,42 @@ class APISettingsSwaggerSerializer(serializers.ModelSerializer):
         ]
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    content_hash = serializers.CharField(
+        source="stored_file.content_hash", read_only=True, default=None
+    )
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "file_name",
+            "content_type",
+            "size",
+            "received",
+            "is_complete",
+            "content_hash",
+            "created_at",
+        ]
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(
+        max_length=255, required=False, allow_blank=True, default=""
+    )
+
+
 class DocumentCreateSwaggerSerializer(serializers.ModelSerializer):
+    document_file_upload = serializers.UUIDField(required=False)
+
     class Meta:
         model = Document
         fields = [
             "title",
             "document_file",
+            "document_file_upload",
             "teams",
             "shared_to",
         ]
@@ -376,6 +427,33 @@ class UserUpdateStatusSwaggerSerializer(serializers.Serializer):
 
     status = serializers.ChoiceField(choices = STATUS_CHOICES,required=True)
 
+
+class DataExportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DataExport
+        fields = (
+            "id",
+            "entity",
+            "file_format",
+            "search",
+            "status",
+            "rows",
+            "error",
+            "created_at",
+            "finished_at",
+        )
+
+
+class BulkDeleteSwaggerSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    filters = serializers.DictField(required=False)
+
+
+class BulkUpdateSwaggerSerializer(BulkDeleteSwaggerSerializer):
+    changes = serializers.DictField(
+        help_text="New status and / or assigned_to list of profile ids"
+    )
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
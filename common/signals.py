@@ -0,0 +1,376 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from common import (
+    auth_cache,
+    dashboard,
+    dedupe,
+    files,
+    list_cache,
+    mentions,
+    search,
+    uploads,
+    visibility,
+)
+from common.models import Attachments, Comment, Document, Org, Profile, User
+from common.tasks import generate_file_thumbnail
+
+_bulk_writes = threading.local()
+
+
+@contextmanager
+def bulk_writes():
+    """Within the block the handlers maintaining the dashboard counters,
+    search documents, blocking keys, visibility and cached lists do nothing:
+    the bulk write refreshes them itself once per batch, see common.bulk."""
+    previous = getattr(_bulk_writes, "active", False)
+    _bulk_writes.active = True
+    try:
+        yield
+    finally:
+        _bulk_writes.active = previous
+
+
+def skipped_in_bulk(handler):
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if getattr(_bulk_writes, "active", False):
+            return None
+        return handler(*args, **kwargs)
+
+    return wrapper
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile_auth_cache(sender, instance, **kwargs):
+    auth_cache.invalidate(
+        auth_cache.profile_cache_key(instance.user_id, instance.org_id),
+        auth_cache.org_admin_cache_key(instance.org_id),
+    )
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    keys = [auth_cache.user_cache_key(instance.id)]
+    # profile snapshots embed the user, drop them for every org of the user
+    for org_id in Profile.objects.filter(user_id=instance.id).values_list(
+        "org_id", flat=True
+    ):
+        keys.append(auth_cache.profile_cache_key(instance.id, org_id))
+        keys.append(auth_cache.org_admin_cache_key(org_id))
+    auth_cache.invalidate(*keys)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile_mention_directory(sender, instance, **kwargs):
+    mentions.invalidate_directories(instance.org_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_mention_directories(sender, instance, **kwargs):
+    mentions.invalidate_directories(
+        *Profile.objects.filter(user_id=instance.id).values_list("org_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Attachments)
+@receiver(post_save, sender=Document)
+def queue_file_thumbnail(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, "_file_changed", False):
+        return
+    if instance.file_category not in files.THUMBNAIL_CATEGORIES:
+        return
+    label, pk = sender._meta.label, str(instance.pk)
+    transaction.on_commit(lambda: generate_file_thumbnail.delay(label, pk))
+
+
+@receiver(post_save, sender=Attachments)
+@receiver(post_save, sender=Document)
+def count_stored_file_references_on_save(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, "_file_changed", False):
+        return
+    uploads.count_references(
+        [instance.stored_file_id, getattr(instance, "_previous_stored_file_id", None)]
+    )
+
+
+@receiver(post_delete, sender=Attachments)
+@receiver(post_delete, sender=Document)
+def count_stored_file_references_on_delete(sender, instance, **kwargs):
+    uploads.count_references([instance.stored_file_id])
+
+
+@receiver(pre_save, sender=Org)
+def remember_previous_api_key(sender, instance, **kwargs):
+    instance._previous_api_key = (
+        Org.objects.filter(pk=instance.pk).values_list("api_key", flat=True).first()
+    )
+
+
+@receiver([post_save, post_delete], sender=Org)
+def invalidate_org_auth_cache(sender, instance, **kwargs):
+    keys = [
+        auth_cache.api_key_cache_key(instance.api_key),
+        auth_cache.org_admin_cache_key(instance.id),
+    ]
+    previous_api_key = getattr(instance, "_previous_api_key", None)
+    if previous_api_key:
+        keys.append(auth_cache.api_key_cache_key(previous_api_key))
+    # profile snapshots embed the org, drop them for every member
+    for user_id in Profile.objects.filter(org_id=instance.id).values_list(
+        "user_id", flat=True
+    ):
+        keys.append(auth_cache.profile_cache_key(user_id, instance.id))
+    auth_cache.invalidate(*keys)
+
+
+@skipped_in_bulk
+def remember_dashboard_state(sender, instance, raw=False, **kwargs):
+    instance._dashboard_state = None
+    if raw or instance._state.adding:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._dashboard_state = dashboard.record_state(
+            dashboard.get_entity(sender), previous
+        )
+
+
+@skipped_in_bulk
+def update_dashboard_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    entity = dashboard.get_entity(sender)
+    dashboard.apply_change(
+        entity,
+        before=getattr(instance, "_dashboard_state", None),
+        # a new record has no assignments yet, they are added afterwards
+        after=dashboard.record_state(
+            entity, instance, assigned_ids=() if created else None
+        ),
+    )
+
+
+@skipped_in_bulk
+def remember_dashboard_state_on_delete(sender, instance, **kwargs):
+    instance._dashboard_state = dashboard.record_state(
+        dashboard.get_entity(sender), instance
+    )
+
+
+@skipped_in_bulk
+def update_dashboard_on_delete(sender, instance, **kwargs):
+    dashboard.apply_change(
+        dashboard.get_entity(sender),
+        before=getattr(instance, "_dashboard_state", None),
+    )
+
+
+@skipped_in_bulk
+def update_dashboard_on_assignment(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    if action.startswith("pre_"):
+        if reverse:
+            # the profile side changed, recount the records it touches
+            entity = dashboard.get_entity(model)
+            records = (
+                model.objects.filter(assigned_to=instance)
+                if pk_set is None
+                else model.objects.filter(pk__in=pk_set)
+            )
+        else:
+            entity = dashboard.get_entity(type(instance))
+            records = [instance]
+        instance._dashboard_assignments = [
+            (entity, record, dashboard.record_state(entity, record))
+            for record in records
+        ]
+    else:
+        for entity, record, before in getattr(instance, "_dashboard_assignments", ()):
+            after = dashboard.record_state(entity, record)
+            dashboard.apply_change(entity, before=before, after=after)
+        instance._dashboard_assignments = ()
+
+
+def connect_dashboard_signals():
+    for entity in dashboard.DASHBOARD_ENTITIES:
+        model = dashboard.get_entity_model(entity)
+        uid = "dashboard_%s" % entity
+        pre_save.connect(remember_dashboard_state, sender=model, dispatch_uid=uid)
+        post_save.connect(update_dashboard_on_save, sender=model, dispatch_uid=uid)
+        pre_delete.connect(
+            remember_dashboard_state_on_delete, sender=model, dispatch_uid=uid
+        )
+        post_delete.connect(update_dashboard_on_delete, sender=model, dispatch_uid=uid)
+        m2m_changed.connect(
+            update_dashboard_on_assignment,
+            sender=model.assigned_to.through,
+            dispatch_uid=uid,
+        )
+
+
+@skipped_in_bulk
+def update_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_records(search.get_entity(sender), sender.objects.filter(pk=instance.pk))
+
+
+@skipped_in_bulk
+def remove_search_document(sender, instance, **kwargs):
+    search.remove_records(search.get_entity(sender), [instance.pk])
+
+
+def connect_search_signals():
+    for entity in search.SEARCH_ENTITIES:
+        model = search.get_entity_model(entity)
+        uid = "search_%s" % entity
+        post_save.connect(update_search_document, sender=model, dispatch_uid=uid)
+        post_delete.connect(remove_search_document, sender=model, dispatch_uid=uid)
+
+
+@skipped_in_bulk
+def update_blocking_keys(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    dedupe.index_records(dedupe.get_entity(sender), sender.objects.filter(pk=instance.pk))
+
+
+@skipped_in_bulk
+def remove_blocking_keys(sender, instance, **kwargs):
+    dedupe.remove_records(dedupe.get_entity(sender), [instance.pk])
+
+
+def connect_dedupe_signals():
+    for entity in dedupe.DEDUPE_ENTITIES:
+        model = dedupe.get_entity_model(entity)
+        uid = "dedupe_%s" % entity
+        post_save.connect(update_blocking_keys, sender=model, dispatch_uid=uid)
+        post_delete.connect(remove_blocking_keys, sender=model, dispatch_uid=uid)
+
+
+@skipped_in_bulk
+def update_visibility_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    visibility.refresh_records(visibility.get_entity(sender), [instance.pk])
+
+
+@skipped_in_bulk
+def update_visibility_on_delete(sender, instance, **kwargs):
+    visibility.remove_records(visibility.get_entity(sender), [instance.pk])
+
+
+@skipped_in_bulk
+def update_visibility_on_assignment(sender, instance, action, reverse, model, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        visibility.refresh_profile(visibility.get_entity(model), instance)
+    else:
+        visibility.refresh_records(visibility.get_entity(type(instance)), [instance.pk])
+
+
+def connect_visibility_signals():
+    for entity, (_, field_name) in visibility.VISIBILITY_ENTITIES.items():
+        model = visibility.get_entity_model(entity)
+        uid = "visibility_%s" % entity
+        post_save.connect(update_visibility_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(
+            update_visibility_on_delete, sender=model, dispatch_uid=uid
+        )
+        if field_name:
+            m2m_changed.connect(
+                update_visibility_on_assignment,
+                sender=getattr(model, field_name).through,
+                dispatch_uid=uid,
+            )
+
+
+@skipped_in_bulk
+def invalidate_list_cache_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    list_cache.invalidate(list_cache.get_entity(sender), instance.org_id)
+
+
+@skipped_in_bulk
+def invalidate_list_cache_on_m2m(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        list_cache.invalidate(list_cache.get_entity(type(instance)), instance.org_id)
+        return
+    entity = list_cache.get_entity(model)
+    if pk_set:
+        org_ids = set(
+            model.objects.filter(id__in=pk_set).values_list("org_id", flat=True)
+        )
+    else:
+        org_ids = {getattr(instance, "org_id", None)}
+    for org_id in org_ids:
+        list_cache.invalidate(entity, org_id)
+
+
+@skipped_in_bulk
+def invalidate_list_cache_on_related(sender, instance, raw=False, **kwargs):
+    """Comments and attachments are listed with ``?expand=``."""
+    if raw:
+        return
+    for entity in list_cache.LIST_CACHE_ENTITIES:
+        model = list_cache.get_entity_model(entity)
+        for field in sender._meta.get_fields():
+            if field.many_to_one and field.related_model is model:
+                record_id = getattr(instance, field.attname)
+                if record_id is not None:
+                    list_cache.invalidate(
+                        entity,
+                        model.objects.filter(id=record_id)
+                        .values_list("org_id", flat=True)
+                        .first(),
+                    )
+
+
+def connect_list_cache_signals():
+    for entity in list_cache.LIST_CACHE_ENTITIES:
+        model = list_cache.get_entity_model(entity)
+        uid = "list_cache_%s" % entity
+        post_save.connect(invalidate_list_cache_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(
+            invalidate_list_cache_on_save, sender=model, dispatch_uid=uid
+        )
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(
+                invalidate_list_cache_on_m2m,
+                sender=field.remote_field.through,
+                dispatch_uid="%s_%s" % (uid, field.name),
+            )
+    for related in (Comment, Attachments):
+        uid = "list_cache_%s" % related._meta.model_name
+        post_save.connect(
+            invalidate_list_cache_on_related, sender=related, dispatch_uid=uid
+        )
+        post_delete.connect(
+            invalidate_list_cache_on_related, sender=related, dispatch_uid=uid
+        )
+
+
+connect_dashboard_signals()
+connect_search_signals()
+connect_dedupe_signals()
+connect_visibility_signals()
+connect_list_cache_signals()
@@ -9,6 +9,23 @@ organization_params = [
     organization_params_in_header,
 ]
 
+
+def keyset_pagination_params(*cursor_params):
+    """Query params understood by common.pagination.KeysetPagination."""
+    return [
+        OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY),
+        OpenApiParameter("offset", OpenApiTypes.INT, OpenApiParameter.QUERY),
+        OpenApiParameter(
+            "count",
+            OpenApiTypes.STR,
+            OpenApiParameter.QUERY,
+            enum=["exact", "approximate", "none"],
+        ),
+    ] + [
+        OpenApiParameter(name, OpenApiTypes.STR, OpenApiParameter.QUERY)
+        for name in cursor_params or ("cursor",)
+    ]
+
 user_list_params = [
     organization_params_in_header,
     OpenApiParameter("email",  OpenApiTypes.STR,OpenApiParameter.QUERY),
@@ -21,6 +38,7 @@ user_list_params = [
         OpenApiParameter.QUERY,
         enum=["Active", "In Active"],
     ),
+    *keyset_pagination_params("active_cursor", "inactive_cursor"),
 ]
 
 document_get_params = [
@@ -33,5 +51,84 @@ document_get_params = [
         enum=["Active", "In Active"],
     ),
     OpenApiParameter("shared_to", OpenApiTypes.STR,OpenApiParameter.QUERY),
+    *keyset_pagination_params("active_cursor", "inactive_cursor"),
+]
+
+
+mention_autocomplete_params = [
+    organization_params_in_header,
+    OpenApiParameter(
+        "q",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Start of the handle, e.g. jo for @john",
+    ),
+    OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY),
+]
+
+search_params = [
+    organization_params_in_header,
+    OpenApiParameter("q", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True),
+    OpenApiParameter(
+        "entity",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Comma separated: leads, contacts, accounts, opportunities",
+    ),
+    OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY),
+]
+
+upload_chunk_params = [
+    organization_params_in_header,
+    OpenApiParameter(
+        "Upload-Offset",
+        OpenApiTypes.INT,
+        OpenApiParameter.HEADER,
+        required=True,
+        description="Byte of the file the chunk in the body starts at",
+    ),
+]
+
+duplicate_check_params = [
+    organization_params_in_header,
+    OpenApiParameter(
+        "entity",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        required=True,
+        description="leads or contacts",
+    ),
+    OpenApiParameter(
+        "email",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Fields of the record by their names, e.g. email, phone, "
+        "first_name, last_name, account_name, or primary_email and "
+        "mobile_number of contacts",
+    ),
 ]
 
+duplicate_cluster_params = [
+    organization_params_in_header,
+    OpenApiParameter(
+        "entity",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        required=True,
+        description="leads or contacts",
+    ),
+    OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("offset", OpenApiTypes.INT, OpenApiParameter.QUERY),
+]
+
+export_params = [
+    organization_params_in_header,
+    OpenApiParameter(
+        "file_format",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        enum=["csv", "xlsx"],
+        description="csv by default",
+    ),
+    OpenApiParameter("search", OpenApiTypes.STR, OpenApiParameter.QUERY),
+]
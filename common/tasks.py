@@ -1,18 +1,30 @@
 import datetime
 
-from celery import Celery
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.text import capfirst
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
-from common.models import Comment, Profile, User
+from common import dedupe
+from common.dashboard import reconcile_org
+from common.exports import run_export
+from common.files import store_thumbnail
+from common.uploads import purge_stale_uploads
+from common.mentions import resolve_mentions
+from common.search import reindex_org
+from common.visibility import rebuild_org
+from common.models import Comment, DataExport, Org, Profile, SearchDocument, User
+from common.notifications import NotificationDispatcher, send_assignment_emails
 from common.token_generator import account_activation_token
+from crm.celery import app
 
-app = Celery("redis://")
+# records named in a bulk assignment email, the rest are counted
+BULK_ASSIGNMENT_LISTED = 20
 
 
 @app.task
@@ -64,25 +76,16 @@ def send_email_user_mentions(
     called_from,
 ):
     """Send Mail To Mentioned Users In The Comment"""
-    comment = Comment.objects.filter(id=comment_id).first()
+    comment = (
+        Comment.objects.select_related("commented_by__user")
+        .filter(id=comment_id)
+        .first()
+    )
     if comment:
-        comment_text = comment.comment
-        comment_text_list = comment_text.split()
-        recipients = []
-        for comment_text in comment_text_list:
-            if comment_text.startswith("@"):
-                if comment_text.strip("@").strip(",") not in recipients:
-                    if User.objects.filter(
-                        username=comment_text.strip("@").strip(","), is_active=True
-                    ).exists():
-                        email = (
-                            User.objects.filter(
-                                username=comment_text.strip("@").strip(",")
-                            )
-                            .first()
-                            .email
-                        )
-                        recipients.append(email)
+        org_id = comment.commented_by.org_id if comment.commented_by else None
+        recipients = [
+            member.email for member in resolve_mentions(org_id, comment.comment)
+        ]
 
         context = {}
         context["commented_by"] = comment.commented_by
@@ -109,21 +112,17 @@ def send_email_user_mentions(
         else:
             context["url"] = ""
         # subject = 'Django CRM : comment '
-        if recipients:
-            for recipient in recipients:
-                recipients_list = [
-                    recipient,
-                ]
-                context["mentioned_user"] = recipient
-                html_content = render_to_string("comment_email.html", context=context)
-                msg = EmailMessage(
-                    subject,
-                    html_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=recipients_list,
-                )
-                msg.content_subtype = "html"
-                msg.send()
+        dispatcher = NotificationDispatcher()
+        for recipient in recipients:
+            context["mentioned_user"] = recipient
+            html_content = dispatcher.render("comment_email.html", context)
+            dispatcher.add(
+                subject,
+                html_content,
+                [recipient],
+                from_email=settings.DEFAULT_FROM_EMAIL,
+            )
+        dispatcher.send()
 
 
 @app.task
@@ -269,3 +268,99 @@ def send_email_to_reset_password(user_email):
         )
         msg.content_subtype = "html"
         msg.send()
+
+
+@app.task
+def reconcile_dashboard_counters(org_id=None):
+    """Rebuild the dashboard counters of one org, or fan out to every org."""
+    if org_id is not None:
+        reconcile_org(org_id)
+        return
+    for org_id in Org.objects.values_list("id", flat=True):
+        reconcile_dashboard_counters.delay(str(org_id))
+
+
+@app.task
+def reindex_search_documents(org_id=None):
+    """Rebuild the search documents of one org, or fan out to every org."""
+    if org_id is not None:
+        reindex_org(org_id)
+        return
+    for org_id in Org.objects.values_list("id", flat=True):
+        reindex_search_documents.delay(str(org_id))
+
+
+@app.task
+def rebuild_record_visibility(org_id=None):
+    """Rebuild the record visibility of one org, or fan out to every org."""
+    if org_id is not None:
+        rebuild_org(org_id)
+        return
+    for org_id in Org.objects.values_list("id", flat=True):
+        rebuild_record_visibility.delay(str(org_id))
+
+
+@app.task
+def send_bulk_assignment_email(entity, profile_id, record_ids):
+    """One email to a profile assigned many records at once by a bulk
+    action, see common.bulk."""
+    titles = SearchDocument.objects.filter(
+        entity=entity, object_id__in=record_ids[:BULK_ASSIGNMENT_LISTED]
+    ).values_list("title", flat=True)
+    context = {
+        "url": settings.DOMAIN_NAME,
+        "entity": entity,
+        "count": len(record_ids),
+        "titles": list(titles),
+        "more": max(0, len(record_ids) - BULK_ASSIGNMENT_LISTED),
+    }
+    return send_assignment_emails(
+        [profile_id],
+        "%s %s were assigned to you." % (len(record_ids), capfirst(entity)),
+        "assigned_to/bulk_assigned.html",
+        context,
+    )
+
+
+@app.task
+def export_records(data_export_id):
+    """Write a large CSV or XLSX export to the storage, see common.exports."""
+    data_export = (
+        DataExport.objects.filter(
+            id=data_export_id, status=DataExport.STATUS_PENDING
+        )
+        .select_related("org", "profile")
+        .first()
+    )
+    if data_export is None:
+        return False
+    run_export(data_export)
+    return True
+
+
+@app.task
+def generate_file_thumbnail(model_label, pk):
+    """Generate the thumbnail of an attachment or document."""
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is not None:
+        store_thumbnail(instance)
+
+
+@app.task
+def purge_upload_sessions():
+    """Delete abandoned chunked uploads and unreferenced stored files."""
+    purge_stale_uploads()
+
+
+@app.task
+def cluster_duplicates(org_id=None):
+    """Cluster the likely duplicate leads and contacts of one org, or fan out
+    to every org."""
+    if org_id is not None:
+        # picks up the writes that bypass signals first
+        dedupe.reindex_org(org_id)
+        for entity in dedupe.DEDUPE_ENTITIES:
+            dedupe.cluster_org(entity, org_id)
+        return
+    for org_id in Org.objects.values_list("id", flat=True):
+        cluster_duplicates.delay(str(org_id))
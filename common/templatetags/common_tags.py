@@ -3,8 +3,8 @@ from django import template
 register = template.Library()
 
 
-def is_document_file_image(ext):
-    image_ext_list = [
+IMAGE_EXTENSIONS = frozenset(
+    [
         "bmp",
         "dds",
         "gif",
@@ -19,16 +19,24 @@ def is_document_file_image(ext):
         "tiff",
         "yuv",
     ]
-    return ext.lower() in image_ext_list
+)
+
+
+def is_document_file_image(ext):
+    return ext.lower() in IMAGE_EXTENSIONS
+
+
+AUDIO_EXTENSIONS = frozenset(
+    ["aif", "iff", "m3u", "m4a", "mid", "mp3", "mpa", "wav", "wma"]
+)
 
 
 def is_document_file_audio(ext):
-    audio_ext_list = ["aif", "iff", "m3u", "m4a", "mid", "mp3", "mpa", "wav", "wma"]
-    return ext.lower() in audio_ext_list
+    return ext.lower() in AUDIO_EXTENSIONS
 
 
-def is_document_file_video(ext):
-    video_ext_list = [
+VIDEO_EXTENSIONS = frozenset(
+    [
         "3g2",
         "3gp",
         "asf",
@@ -44,16 +52,24 @@ def is_document_file_video(ext):
         "vob",
         "wmv",
     ]
-    return ext.lower() in video_ext_list
+)
+
+
+def is_document_file_video(ext):
+    return ext.lower() in VIDEO_EXTENSIONS
+
+
+PDF_EXTENSIONS = frozenset(
+    ["indd", "pct", "pdf"]
+)
 
 
 def is_document_file_pdf(ext):
-    pdf_ext_list = ["indd", "pct", "pdf"]
-    return ext.lower() in pdf_ext_list
+    return ext.lower() in PDF_EXTENSIONS
 
 
-def is_document_file_code(ext):
-    code_ext_list = [
+CODE_EXTENSIONS = frozenset(
+    [
         "aspx",
         "json",
         "jsp",
@@ -556,11 +572,15 @@ def is_document_file_code(ext):
         "drc",
         "appxsym",
     ]
-    return ext.lower() in code_ext_list
+)
 
 
-def is_document_file_text(ext):
-    text_ext_list = [
+def is_document_file_code(ext):
+    return ext.lower() in CODE_EXTENSIONS
+
+
+TEXT_EXTENSIONS = frozenset(
+    [
         "doc",
         "docx",
         "log",
@@ -573,25 +593,37 @@ def is_document_file_text(ext):
         "wpd",
         "wps",
     ]
-    return ext.lower() in text_ext_list
+)
+
+
+def is_document_file_text(ext):
+    return ext.lower() in TEXT_EXTENSIONS
+
+
+SHEET_EXTENSIONS = frozenset(
+    ["csv", "xls", "xlsx", "xlsm", "xlsb", "xltx", "xltm", "xlt"]
+)
 
 
 def is_document_file_sheet(ext):
-    sheet_ext_list = ["csv", "xls", "xlsx", "xlsm", "xlsb", "xltx", "xltm", "xlt"]
-    return ext.lower() in sheet_ext_list
+    return ext.lower() in SHEET_EXTENSIONS
 
 
-def is_document_file_zip(ext):
-    ext_list = [
+ZIP_EXTENSIONS = frozenset(
+    [
         "zip",
-        "7Z",
+        "7z",
         "gz",
         "rar",
-        "ZIPX",
-        "ACE",
+        "zipx",
+        "ace",
         "tar",
     ]
-    return ext.lower() in ext_list
+)
+
+
+def is_document_file_zip(ext):
+    return ext.lower() in ZIP_EXTENSIONS
 
 
 @register.filter
@@ -0,0 +1,1074 @@
+import hashlib
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+import jwt
+from crum import impersonate
+from django.conf import settings
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common import (
+    auth_cache,
+    bulk,
+    dashboard,
+    dedupe,
+    exports,
+    files,
+    mentions,
+    search,
+    uploads,
+    visibility,
+)
+from common.middleware.get_company import GetProfileAndOrg
+from common.models import (
+    Attachments,
+    Comment,
+    DashboardCounter,
+    DataExport,
+    DuplicateMatch,
+    Org,
+    Profile,
+    RecordVisibility,
+    StoredFile,
+    User,
+)
+from common.notifications import NotificationDispatcher, send_assignment_emails
+from common.pagination import KeysetPagination, encode_cursor
+from common.tasks import (
+    reconcile_dashboard_counters,
+    send_bulk_assignment_email,
+    send_email_user_mentions,
+)
+from common.visibility import visible_to
+from crm.celery import app
+from contacts.models import Contact
+from leads.models import Lead
+from teams.models import Teams
+
+
+class AuthCacheObjects(object):
+    def setUp(self):
+        cache.clear()
+        auth_cache.local_cache.clear()
+        self.org = Org.objects.create(name="test org")
+        self.user = User.objects.create(email="johnAuthCache@example.com")
+        self.profile = Profile.objects.create(
+            user=self.user, org=self.org, role="ADMIN", is_active=True
+        )
+        self.token = jwt.encode(
+            {"user_id": str(self.user.id)}, settings.SECRET_KEY, algorithm=settings.JWT_ALGO
+        )
+        self.factory = RequestFactory()
+        self.middleware = GetProfileAndOrg(lambda request: None)
+
+    def make_request(self, **headers):
+        headers.setdefault("HTTP_AUTHORIZATION", "Bearer %s" % self.token)
+        headers.setdefault("HTTP_ORG", str(self.org.id))
+        return self.factory.get("/api/leads/", **headers)
+
+
+@override_settings(SHARED_CACHE=True)
+class GetProfileAndOrgCacheTestCase(AuthCacheObjects, TestCase):
+    def test_profile_resolved_without_queries_when_warm(self):
+        request = self.make_request()
+        self.middleware.process_request(request)
+        self.assertEqual(request.profile.id, self.profile.id)
+
+        request = self.make_request()
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+            self.assertEqual(request.profile.org.id, self.org.id)
+            self.assertEqual(request.profile.user.email, self.user.email)
+
+    def test_snapshots_leave_secrets_out(self):
+        self.middleware.process_request(self.make_request())
+        values = cache.get(auth_cache.profile_cache_key(self.user.id, self.org.id))
+        self.assertNotIn("password", values["user"])
+        self.assertNotIn("api_key", values["org"])
+        request = self.make_request()
+        self.middleware.process_request(request)
+        # read from the database when asked for
+        self.assertEqual(request.profile.org.api_key, self.org.api_key)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_nothing_is_cached_without_a_shared_cache(self):
+        self.middleware.process_request(self.make_request())
+        self.assertIsNone(
+            cache.get(auth_cache.profile_cache_key(self.user.id, self.org.id))
+        )
+
+    def test_requests_without_credentials_skip_lookups(self):
+        request = self.factory.get("/static/css/style.css")
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+        self.assertIsNone(request.profile)
+
+    def test_profile_change_invalidates_snapshot(self):
+        self.middleware.process_request(self.make_request())
+        self.profile.role = "USER"
+        self.profile.save()
+        request = self.make_request()
+        self.middleware.process_request(request)
+        self.assertEqual(request.profile.role, "USER")
+
+    def test_deactivated_profile_is_rejected(self):
+        self.middleware.process_request(self.make_request())
+        self.profile.is_active = False
+        self.profile.save()
+        with self.assertRaises(PermissionDenied):
+            self.middleware.process_request(self.make_request())
+
+    def test_api_key_rotation_invalidates_snapshot(self):
+        old_api_key = self.org.api_key
+        request = self.make_request(HTTP_TOKEN=old_api_key, HTTP_AUTHORIZATION="")
+        self.middleware.process_request(request)
+        self.assertEqual(request.profile.id, self.profile.id)
+
+        self.org.api_key = "rotated-key"
+        self.org.save()
+        with self.assertRaises(PermissionDenied):
+            self.middleware.process_request(
+                self.make_request(HTTP_TOKEN=old_api_key, HTTP_AUTHORIZATION="")
+            )
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        for index in range(25):
+            Teams.objects.create(name="team %s" % index, org=self.org)
+        self.queryset = Teams.objects.filter(org=self.org)
+        self.factory = RequestFactory()
+
+    def paginate(self, **params):
+        paginator = KeysetPagination()
+        request = Request(self.factory.get("/api/teams/", params))
+        return paginator, paginator.paginate_queryset(self.queryset, request)
+
+    def test_cursor_walks_every_row_once(self):
+        seen = []
+        paginator, page = self.paginate()
+        seen.extend(page)
+        while paginator.next_cursor:
+            paginator, page = self.paginate(cursor=paginator.next_cursor)
+            seen.extend(page)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(
+            [team.id for team in seen],
+            list(self.queryset.order_by("-created_at", "-id").values_list("id", flat=True)),
+        )
+
+    def test_deep_page_does_not_count(self):
+        paginator, page = self.paginate(count="none")
+        with self.assertNumQueries(1):
+            paginator, page = self.paginate(cursor=paginator.next_cursor, count="none")
+        self.assertIsNone(paginator.count)
+        self.assertEqual(len(page), 10)
+
+    def test_offset_fallback_and_exact_count(self):
+        paginator, page = self.paginate(offset=20, count="exact")
+        self.assertEqual(paginator.count, 25)
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(paginator.next_offset)
+        self.assertIsNone(paginator.next_cursor)
+
+    def test_invalid_cursor(self):
+        for cursor in ("garbage", encode_cursor(timezone.now(), "1 OR 1=1")):
+            with self.assertRaises(NotFound):
+                self.paginate(cursor=cursor)
+
+
+class CountingEmailBackend(EmailBackend):
+    def __init__(self, *args, **kwargs):
+        super(CountingEmailBackend, self).__init__(*args, **kwargs)
+        self.opened = 0
+        self.batches = []
+
+    def open(self):
+        self.opened += 1
+
+    def send_messages(self, messages):
+        self.batches.append(len(messages))
+        return super(CountingEmailBackend, self).send_messages(messages)
+
+
+class NotificationDispatcherTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.profiles = []
+        for index in range(3):
+            user = User.objects.create(email="notified%s@example.com" % index)
+            self.profiles.append(
+                Profile.objects.create(user=user, org=self.org, is_active=True)
+            )
+        self.profiles[2].is_active = False
+        self.profiles[2].save()
+
+    def test_batches_share_one_connection(self):
+        connection = CountingEmailBackend()
+        dispatcher = NotificationDispatcher(batch_size=2, connection=connection)
+        for index in range(5):
+            dispatcher.add("subject", "<p>%s</p>" % index, ["to@example.com"])
+        self.assertEqual(dispatcher.send(), 5)
+        self.assertEqual(connection.opened, 1)
+        self.assertEqual(connection.batches, [2, 2, 1])
+
+    def test_assignment_emails_load_recipients_once(self):
+        profile_ids = [profile.id for profile in self.profiles]
+        with self.assertNumQueries(1):
+            sent = send_assignment_emails(
+                profile_ids,
+                "Assigned a lead for you.",
+                "assigned_to/leads_assigned.html",
+                {"url": "example.com", "lead": None, "created_by": None},
+            )
+        self.assertEqual(sent, 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["notified0@example.com", "notified1@example.com"],
+        )
+
+
+class DashboardCountersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = Org.objects.create(name="test org")
+        self.user = User.objects.create(email="johnDashboard@example.com")
+        self.admin = Profile.objects.create(
+            user=self.user, org=self.org, role="ADMIN", is_active=True
+        )
+        self.member = Profile.objects.create(
+            user=User.objects.create(email="janeDashboard@example.com"),
+            org=self.org,
+            role="USER",
+            is_active=True,
+        )
+        # counters start from a reconcile, later writes are incremental
+        dashboard.reconcile_org(self.org.id)
+        self.leads = [
+            Lead.objects.create(title="lead %s" % index, status="assigned", org=self.org)
+            for index in range(3)
+        ]
+        self.leads[0].assigned_to.add(self.member)
+
+    def counters(self):
+        return sorted(
+            DashboardCounter.objects.filter(org=self.org).values_list(
+                "entity", "status", "profile_id", "count"
+            ),
+            key=str,
+        )
+
+    def test_counters_follow_writes(self):
+        self.assertEqual(dashboard.get_dashboard_counts(self.org.id)["leads"], 3)
+        self.assertEqual(
+            dashboard.get_dashboard_counts(self.org.id, self.member.id)["leads"], 1
+        )
+
+        self.leads[1].status = "closed"
+        self.leads[1].save()
+        self.leads[2].delete()
+        self.leads[0].assigned_to.remove(self.member)
+
+        self.assertEqual(dashboard.get_dashboard_counts(self.org.id)["leads"], 1)
+        self.assertEqual(
+            dashboard.get_dashboard_counts(self.org.id, self.member.id)["leads"], 0
+        )
+
+    def test_incremental_counters_match_reconcile(self):
+        self.leads[1].assigned_to.add(self.member, self.admin)
+        self.member.lead_assigned_users.remove(self.leads[0])
+        self.leads[2].status = "closed"
+        self.leads[2].save()
+        incremental = [row for row in self.counters() if row[3]]
+        dashboard.reconcile_org(self.org.id)
+        self.assertEqual(incremental, self.counters())
+
+    def test_read_queues_missing_reconcile(self):
+        cache.clear()
+        with mock.patch.object(
+            reconcile_dashboard_counters, "delay"
+        ) as delay, self.captureOnCommitCallbacks(execute=True):
+            # served from the counters as they are
+            self.assertEqual(dashboard.get_dashboard_counts(self.org.id)["leads"], 3)
+            dashboard.get_dashboard_counts(self.org.id, self.member.id)
+        delay.assert_called_once_with(str(self.org.id))
+
+    def test_dashboard_reads_counters(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(self.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get("/api/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["leads_count"], 3)
+        self.assertEqual(len(response.data["leads"]), 3)
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.user = User.objects.create(email="johnSearch@example.com")
+        Profile.objects.create(user=self.user, org=self.org, role="ADMIN", is_active=True)
+        self.member_user = User.objects.create(email="janeSearch@example.com")
+        self.member = Profile.objects.create(
+            user=self.member_user, org=self.org, role="USER", is_active=True
+        )
+        self.john = Lead.objects.create(
+            title="ceo", first_name="John", last_name="Smith", org=self.org
+        )
+        self.johnny = Lead.objects.create(
+            title="cto",
+            first_name="Johnny",
+            last_name="Walker",
+            city="Springfield",
+            org=self.org,
+        )
+        self.contact = Contact.objects.create(
+            first_name="John",
+            last_name="Doe",
+            primary_email="john.doe@example.com",
+            org=self.org,
+        )
+        self.johnny.assigned_to.add(self.member)
+
+    def get(self, user, **params):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        return client.get("/api/search/", params)
+
+    def result_ids(self, response):
+        return [(row["entity"], str(row["id"])) for row in response.data["results"]]
+
+    def test_search_ranks_and_scopes_results(self):
+        response = self.get(self.user, q="john")
+        self.assertEqual(response.status_code, 200)
+        ids = self.result_ids(response)
+        self.assertEqual(len(ids), 3)
+        # whole word matches rank above prefix ones
+        self.assertEqual(ids[-1], ("leads", str(self.johnny.id)))
+
+        response = self.get(self.user, q="john smi", entity="leads")
+        self.assertEqual(self.result_ids(response), [("leads", str(self.john.id))])
+
+        response = self.get(self.member_user, q="john")
+        self.assertEqual(self.result_ids(response), [("leads", str(self.johnny.id))])
+
+        # organization admins see every contact but only their leads, as in
+        # the list views
+        self.member.is_organization_admin = True
+        self.member.save()
+        response = self.get(self.member_user, q="john")
+        self.assertEqual(
+            sorted(self.result_ids(response)),
+            sorted(
+                [("contacts", str(self.contact.id)), ("leads", str(self.johnny.id))]
+            ),
+        )
+
+        self.assertEqual(self.get(self.user, q=" ").status_code, 400)
+        self.assertEqual(self.get(self.user, q="john", entity="users").status_code, 400)
+
+    def test_documents_follow_writes(self):
+        self.john.first_name = "Jonathan"
+        self.john.save()
+        self.contact.delete()
+        self.assertEqual(
+            [row[:2] for row in search.search(self.org, "jonathan")],
+            [("leads", self.john.id)],
+        )
+        self.assertEqual(search.search(self.org, "doe"), [])
+
+        Lead.objects.filter(id=self.johnny.id).update(city="Shelbyville")
+        self.assertEqual(search.search(self.org, "shelbyville"), [])
+        search.reindex_org(self.org.id)
+        self.assertEqual(
+            [row[:2] for row in search.search(self.org, "shelbyville")],
+            [("leads", self.johnny.id)],
+        )
+
+    def test_list_views_filter_by_search(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(self.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get("/api/leads/", {"search": "spring"})
+        self.assertEqual(
+            [lead["id"] for lead in response.data["open_leads"]["open_leads"]],
+            [str(self.johnny.id)],
+        )
+
+
+class RecordVisibilityTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.member = Profile.objects.create(
+            user=User.objects.create(email="janeVisibility@example.com"),
+            org=self.org,
+            role="USER",
+            is_active=True,
+        )
+        with impersonate(self.member.user):
+            self.created = Lead.objects.create(title="created", org=self.org)
+        self.assigned = Lead.objects.create(title="assigned", org=self.org)
+        self.other = Lead.objects.create(title="other", org=self.org)
+        self.assigned.assigned_to.add(self.member)
+
+    def visible(self):
+        return set(visible_to(Lead.objects.all(), self.member))
+
+    def rows(self):
+        return sorted(
+            RecordVisibility.objects.values_list(
+                "entity", "record_id", "profile_id", "reason"
+            ),
+            key=str,
+        )
+
+    def test_visibility_follows_writes(self):
+        self.assertEqual(self.visible(), {self.created, self.assigned})
+
+        self.assigned.assigned_to.remove(self.member)
+        self.member.lead_assigned_users.add(self.other)
+        self.assertEqual(self.visible(), {self.created, self.other})
+
+        self.member.lead_assigned_users.clear()
+        self.created.delete()
+        self.assertEqual(self.visible(), set())
+        self.assertEqual(self.rows(), [])
+
+    def test_incremental_rows_match_rebuild(self):
+        self.other.assigned_to.add(self.member)
+        self.assigned.assigned_to.clear()
+        incremental = self.rows()
+        RecordVisibility.objects.all().delete()
+        visibility.rebuild_org(self.org.id)
+        self.assertEqual(incremental, self.rows())
+
+
+@override_settings(SHARED_CACHE=True)
+class MentionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = Org.objects.create(name="test org")
+        self.other_org = Org.objects.create(name="other org")
+        self.author = Profile.objects.create(
+            user=User.objects.create(email="author@example.com"), org=self.org
+        )
+        self.jane = Profile.objects.create(
+            user=User.objects.create(email="jane.doe@example.com"), org=self.org
+        )
+        self.john = Profile.objects.create(
+            user=User.objects.create(email="john@example.com"), org=self.org
+        )
+        self.other_john = Profile.objects.create(
+            user=User.objects.create(email="john@example.org"), org=self.org
+        )
+        Profile.objects.create(
+            user=User.objects.create(email="joe@example.com"), org=self.other_org
+        )
+
+    def test_mentions_are_resolved_in_one_query(self):
+        text = "@jane.doe, see @john@example.org. @joe and @jane.doe too, jim@work"
+        self.assertEqual(
+            mentions.extract_handles(text), ["jane.doe", "john@example.org", "joe"]
+        )
+        with self.assertNumQueries(1):
+            members = mentions.resolve_mentions(self.org.id, text)
+        # @john is ambiguous and joe isn't a member of the org
+        self.assertEqual(
+            [member.profile_id for member in members],
+            [self.jane.id, self.other_john.id],
+        )
+        with self.assertNumQueries(0):
+            mentions.resolve_mentions(self.org.id, "@john@example.com")
+        with override_settings(SHARED_CACHE=False), self.assertNumQueries(1):
+            mentions.resolve_mentions(self.org.id, "@john@example.com")
+
+        self.jane.is_active = False
+        self.jane.save()
+        self.assertEqual(mentions.resolve_mentions(self.org.id, "@jane.doe"), [])
+
+        comment = Comment.objects.create(
+            comment="thanks @john@example.com @author", commented_by=self.author
+        )
+        send_email_user_mentions(comment.id, "leads")
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["author@example.com", "john@example.com"],
+        )
+
+    def test_autocomplete(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.author.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get("/api/mentions/autocomplete/", {"q": "@jo"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [member["handle"] for member in response.data["members"]],
+            ["john@example.com", "john@example.org"],
+        )
+        response = client.get("/api/mentions/autocomplete/", {"q": "j", "limit": 1})
+        self.assertEqual(
+            [member["id"] for member in response.data["members"]], [self.jane.id]
+        )
+        response = client.get("/api/mentions/autocomplete/", {"limit": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CeleryRoutingTestCase(TestCase):
+    def route(self, task_name):
+        return app.amqp.router.route({}, task_name)
+
+    def test_tasks_are_routed_by_workload(self):
+        app.loader.import_default_modules()
+        route = self.route("common.tasks.send_email_to_reset_password")
+        self.assertEqual(route["queue"].name, "transactional-email")
+        self.assertEqual(route["priority"], 0)
+        self.assertEqual(
+            self.route("leads.tasks.import_leads_from_file")["queue"].name, "imports"
+        )
+        self.assertEqual(
+            self.route("teams.tasks.update_team_users")["queue"].name, "imports"
+        )
+        self.assertEqual(
+            self.route("accounts.tasks.send_email_shard")["queue"].name, "bulk-email"
+        )
+        # notifications fanned out per recipient stay off the transactional queue
+        for task_name in (
+            "common.tasks.send_bulk_assignment_email",
+            "common.tasks.send_email_user_mentions",
+            "invoices.tasks.send_invoice_email",
+            "leads.tasks.send_lead_assigned_emails",
+        ):
+            self.assertEqual(self.route(task_name)["queue"].name, "bulk-email")
+        self.assertEqual(
+            self.route("common.tasks.send_email_user_status")["queue"].name,
+            "transactional-email",
+        )
+        # every task is registered on the project app
+        self.assertIn("tasks.celery_tasks.send_email", app.tasks)
+        self.assertIn("leads.tasks.send_email_to_assigned_user", app.tasks)
+
+
+class TemporaryMediaRoot(object):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class FileDetailsTestCase(TemporaryMediaRoot, TestCase):
+    def setUp(self):
+        super().setUp()
+        output = BytesIO()
+        Image.new("RGB", (800, 600), "red").save(output, format="PNG")
+        self.image = output.getvalue()
+
+    def attach(self, name, content, content_type):
+        return Attachments.objects.create(
+            file_name=name,
+            attachment=SimpleUploadedFile(name, content, content_type=content_type),
+        )
+
+    def test_details_are_stored_on_upload(self):
+        attachment = self.attach("logo.PNG", self.image, "image/png")
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.file_category, "image")
+        self.assertEqual(attachment.mime_type, "image/png")
+        self.assertEqual(attachment.file_size, len(self.image))
+        self.assertEqual(
+            attachment.content_hash, hashlib.sha256(self.image).hexdigest()
+        )
+        self.assertEqual(attachment.file_type(), ("image", "fa fa-file-image"))
+        self.assertEqual(attachment.get_file_type_display(), "fa fa-file-image")
+        self.assertEqual(files.classify("backup.7Z"), ("zip", "fa fa-file-archive"))
+        self.assertEqual(files.classify("notes"), ("file", "fa fa-file"))
+
+    def test_thumbnails_are_shared_by_identical_files(self):
+        first = self.attach("logo.png", self.image, "image/png")
+        second = self.attach("copy.png", self.image, "image/png")
+        path = files.store_thumbnail(first)
+        self.assertEqual(path, "thumbnails/%s.png" % first.content_hash)
+        with default_storage.open(path) as thumbnail:
+            self.assertLessEqual(max(Image.open(thumbnail).size), 320)
+        self.assertEqual(files.store_thumbnail(second), path)
+        second.refresh_from_db()
+        self.assertEqual(second.thumbnail.name, path)
+        text = self.attach("notes.txt", b"notes", "text/plain")
+        self.assertIsNone(files.store_thumbnail(text))
+
+
+class ChunkedUploadTestCase(TemporaryMediaRoot, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.org = Org.objects.create(name="test org")
+        self.profile = Profile.objects.create(
+            user=User.objects.create(email="uploader@example.com"), org=self.org
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.profile.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+
+    def send_chunk(self, upload_id, offset, data):
+        return self.client.put(
+            "/api/uploads/%s/" % upload_id,
+            data,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, content, chunk_size=4):
+        response = self.client.post(
+            "/api/uploads/", {"file_name": "contract.pdf", "size": len(content)}
+        )
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data["upload"]["id"]
+        for offset in range(0, len(content), chunk_size):
+            response = self.send_chunk(
+                upload_id, offset, content[offset : offset + chunk_size]
+            )
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post("/api/uploads/%s/" % upload_id)
+        self.assertEqual(response.status_code, 200)
+        return uploads.get_completed_upload(upload_id, self.profile)
+
+    def test_upload_resumes_from_the_stored_offset(self):
+        response = self.client.post(
+            "/api/uploads/", {"file_name": "contract.pdf", "size": 10}
+        )
+        upload_id = response.data["upload"]["id"]
+        self.assertEqual(self.send_chunk(upload_id, 0, b"01234").status_code, 200)
+        # a retried chunk, and completing early, are told where to go on
+        response = self.send_chunk(upload_id, 0, b"01234")
+        self.assertEqual((response.status_code, response.data["offset"]), (409, 5))
+        response = self.client.post("/api/uploads/%s/" % upload_id)
+        self.assertEqual((response.status_code, response.data["offset"]), (409, 5))
+        self.assertEqual(self.send_chunk(upload_id, 5, b"56789").status_code, 200)
+        response = self.client.post("/api/uploads/%s/" % upload_id)
+        self.assertEqual(
+            response.data["upload"]["content_hash"],
+            hashlib.sha256(b"0123456789").hexdigest(),
+        )
+        upload = uploads.get_completed_upload(upload_id, self.profile)
+        with upload.stored_file.file.open("rb") as stored:
+            self.assertEqual(stored.read(), b"0123456789")
+        self.assertFalse(default_storage.exists(uploads.part_path(upload, 0)))
+        response = self.client.post("/api/uploads/not-an-id/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_identical_uploads_are_stored_once(self):
+        content = b"%PDF-1.4 the same contract"
+        first = self.upload(content)
+        second = self.upload(content, chunk_size=7)
+        self.assertEqual(first.stored_file_id, second.stored_file_id)
+        self.assertEqual(StoredFile.objects.count(), 1)
+        self.assertFalse(default_storage.exists(uploads.file_path(second)))
+
+        attachments = [
+            uploads.create_attachment(first, self.profile.user),
+            uploads.create_attachment(second, self.profile.user),
+        ]
+        stored_file = StoredFile.objects.get()
+        self.assertEqual(stored_file.references, 2)
+        self.assertEqual(attachments[1].attachment.name, stored_file.file.name)
+        self.assertEqual(attachments[1].file_category, "pdf")
+        self.assertEqual(attachments[1].content_hash, first.stored_file.content_hash)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for attachment in attachments:
+                attachment.delete()
+        stored_file.refresh_from_db()
+        # the sessions can still be attached
+        self.assertEqual(stored_file.references, 0)
+        self.assertTrue(default_storage.exists(stored_file.file.name))
+
+        uploads.purge_stale_uploads(
+            now=timezone.now() + timedelta(seconds=uploads.UPLOAD_SESSION_TTL + 1)
+        )
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertFalse(default_storage.exists(stored_file.file.name))
+
+
+class DedupeTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.john = Lead.objects.create(
+            title="ceo",
+            first_name="John",
+            last_name="Smith",
+            email="john@example.com",
+            phone="+1 555 123 4567",
+            account_name="Acme Inc",
+            org=self.org,
+        )
+        self.initial = Lead.objects.create(
+            title="ceo",
+            first_name="J.",
+            last_name="Smith",
+            email="John+crm@Example.com",
+            org=self.org,
+        )
+        self.same_phone = Lead.objects.create(
+            title="ceo",
+            first_name="Jon",
+            last_name="Smith",
+            phone="5551234567",
+            org=self.org,
+        )
+        # the same name is not enough
+        self.namesake = Lead.objects.create(
+            title="cto",
+            first_name="John",
+            last_name="Smith",
+            email="smith@example.org",
+            phone="5559999999",
+            org=self.org,
+        )
+        Lead.objects.create(
+            title="cfo", first_name="Jane", last_name="Doe", org=self.org
+        )
+
+    def test_duplicates_are_found_through_blocking_keys(self):
+        values = {
+            "email": " JOHN@example.com",
+            "first_name": "John",
+            "last_name": "Smith",
+        }
+        with self.assertNumQueries(2):
+            matches = dedupe.find_duplicates("leads", self.org.id, values)
+        self.assertEqual(matches[0], (self.john.id, 1.0))
+        self.assertEqual(
+            {record_id for record_id, _ in matches[1:]},
+            {self.initial.id, self.same_phone.id},
+        )
+        self.assertEqual(
+            {record["id"] for record in dedupe.possible_duplicates("leads", self.john)},
+            {self.initial.id, self.same_phone.id},
+        )
+
+        self.namesake.delete()
+        self.same_phone.phone = "5550000000"
+        self.same_phone.save()
+        # a different phone now tells them apart
+        self.assertEqual(
+            [record["id"] for record in dedupe.possible_duplicates("leads", self.john)],
+            [self.initial.id],
+        )
+
+    def test_records_are_clustered(self):
+        self.assertEqual(dedupe.cluster_org("leads", self.org.id), 1)
+        matches = DuplicateMatch.objects.filter(org=self.org, entity="leads")
+        self.assertEqual(
+            set(matches.values_list("object_id", flat=True)),
+            {self.john.id, self.initial.id, self.same_phone.id},
+        )
+        self.assertEqual(len(set(matches.values_list("cluster_id", flat=True))), 1)
+
+        client = APIClient()
+        user = User.objects.create(email="admin@example.com")
+        Profile.objects.create(user=user, org=self.org, role="ADMIN", is_active=True)
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get("/api/duplicates/", {"entity": "leads"})
+        self.assertEqual(len(response.data["clusters"]), 1)
+        self.assertEqual(len(response.data["clusters"][0]["records"]), 3)
+        response = client.get(
+            "/api/duplicates/check/", {"entity": "contacts", "primary_email": "x@y.z"}
+        )
+        self.assertEqual(response.data["duplicates"], [])
+
+        # organization admins only see the leads the lead list shows them
+        member = User.objects.create(email="member@example.com")
+        Profile.objects.create(
+            user=member,
+            org=self.org,
+            role="USER",
+            is_organization_admin=True,
+            is_active=True,
+        )
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(member).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get(
+            "/api/duplicates/check/",
+            {"entity": "leads", "email": "john@example.com"},
+        )
+        self.assertEqual(response.data["duplicates"], [])
+        response = client.get("/api/duplicates/", {"entity": "leads"})
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkActionTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.admin = Profile.objects.create(
+            user=User.objects.create(email="admin@example.com"),
+            org=self.org,
+            role="ADMIN",
+            is_active=True,
+        )
+        self.member = Profile.objects.create(
+            user=User.objects.create(email="member@example.com"),
+            org=self.org,
+            role="USER",
+            is_active=True,
+        )
+        self.leads = [
+            Lead.objects.create(title="lead %s" % index, status="assigned", org=self.org)
+            for index in range(3)
+        ]
+        with impersonate(self.member.user):
+            self.own = Lead.objects.create(title="own lead", org=self.org)
+        self.other_org = Lead.objects.create(
+            title="elsewhere", org=Org.objects.create(name="other org")
+        )
+
+    def client_for(self, profile):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(profile.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        return client
+
+    def test_update_by_filters_with_one_email_per_assignee(self):
+        with mock.patch.object(
+            bulk.send_bulk_assignment_email, "delay"
+        ) as delay, mock.patch.object(
+            reconcile_dashboard_counters, "delay"
+        ) as reconcile, self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.admin).post(
+                "/api/bulk/leads/update/",
+                {
+                    "filters": {"status": "assigned"},
+                    "changes": {
+                        "status": "in process",
+                        "assigned_to": [str(self.member.id)],
+                    },
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data["results"]), {str(lead.id) for lead in self.leads}
+        )
+        self.assertEqual(
+            Lead.objects.filter(status="in process", assigned_to=self.member).count(),
+            3,
+        )
+        # visible to the assignee right away, counted once recounted
+        self.assertEqual(visible_to(Lead.objects.all(), self.member).count(), 4)
+        reconcile.assert_called_once_with(str(self.org.id))
+        reconcile_dashboard_counters(*reconcile.call_args[0])
+        self.assertEqual(
+            dashboard.get_dashboard_counts(self.org.id, self.member.id)["leads"], 4
+        )
+        delay.assert_called_once()
+        entity, profile_id, record_ids = delay.call_args[0]
+        self.assertEqual((entity, profile_id), ("leads", str(self.member.id)))
+        self.assertEqual(len(record_ids), 3)
+
+        send_bulk_assignment_email(entity, profile_id, record_ids)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("lead 1", mail.outbox[0].body)
+
+        response = self.client_for(self.admin).post(
+            "/api/bulk/leads/update/",
+            {"ids": [str(self.own.id)], "changes": {"status": "unknown"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        # converting creates the accounts, it isn't a plain status change
+        response = self.client_for(self.admin).post(
+            "/api/bulk/leads/update/",
+            {"ids": [str(self.own.id)], "changes": {"status": "converted"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Lead.objects.filter(status="converted").exists())
+
+    def test_organization_admins_reach_what_the_list_views_show(self):
+        self.member.is_organization_admin = True
+        self.member.save()
+        contact = Contact.objects.create(
+            first_name="jane", primary_email="jane@example.com", org=self.org
+        )
+        response = self.client_for(self.member).post(
+            "/api/bulk/contacts/update/",
+            {
+                "ids": [str(contact.id)],
+                "changes": {"assigned_to": [str(self.member.id)]},
+            },
+            format="json",
+        )
+        self.assertEqual(response.data["results"], {str(contact.id): "updated"})
+        response = self.client_for(self.member).post(
+            "/api/bulk/leads/update/",
+            {"ids": [str(self.leads[0].id)], "changes": {"status": "in process"}},
+            format="json",
+        )
+        self.assertEqual(
+            response.data["results"], {str(self.leads[0].id): "forbidden"}
+        )
+
+    def test_delete_reports_each_id(self):
+        self.leads[0].assigned_to.add(self.member)
+        missing = "00000000-0000-0000-0000-000000000000"
+        response = self.client_for(self.member).post(
+            "/api/bulk/leads/delete/",
+            {
+                "ids": [
+                    str(self.own.id),
+                    str(self.leads[0].id),
+                    str(self.other_org.id),
+                    missing,
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"],
+            {
+                str(self.own.id): "deleted",
+                # visible but created by someone else
+                str(self.leads[0].id): "forbidden",
+                str(self.other_org.id): "not_found",
+                missing: "not_found",
+            },
+        )
+        self.assertFalse(Lead.objects.filter(id=self.own.id).exists())
+        self.assertFalse(
+            RecordVisibility.objects.filter(record_id=self.own.id).exists()
+        )
+        self.assertEqual(search.search(self.org, "own lead"), [])
+
+
+class ExportTestCase(TemporaryMediaRoot, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.org = Org.objects.create(name="test org")
+        self.admin = Profile.objects.create(
+            user=User.objects.create(email="admin@example.com"),
+            org=self.org,
+            role="ADMIN",
+            is_active=True,
+        )
+        self.member = Profile.objects.create(
+            user=User.objects.create(email="member@example.com"),
+            org=self.org,
+            role="USER",
+            is_active=True,
+        )
+        self.lead = Lead.objects.create(
+            title="=HYPERLINK(0)",
+            first_name="John",
+            phone="+1 555 123 4567",
+            org=self.org,
+        )
+        self.lead.assigned_to.add(self.member)
+        Lead.objects.create(title="hidden", org=self.org)
+        Lead.objects.create(title="elsewhere", org=Org.objects.create(name="other"))
+
+    def client_for(self, profile):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(profile.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        return client
+
+    def read_csv(self, response):
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        return [line.split(",") for line in content.splitlines()]
+
+    def test_csv_is_streamed_for_what_the_user_sees(self):
+        rows = self.read_csv(self.client_for(self.admin).get("/api/exports/leads/"))
+        self.assertEqual(rows[0][:3], ["Title", "First name", "Last name"])
+        self.assertEqual(sorted(row[0] for row in rows[1:]), ["'=HYPERLINK(0)", "hidden"])
+        # phone numbers aren't taken for formulas
+        self.assertIn("+1 555 123 4567", rows[1] + rows[2])
+
+        rows = self.read_csv(self.client_for(self.member).get("/api/exports/leads/"))
+        self.assertEqual([row[0] for row in rows[1:]], ["'=HYPERLINK(0)"])
+
+        # organization admins export every contact, as the contacts list shows
+        self.member.is_organization_admin = True
+        self.member.save()
+        Contact.objects.create(first_name="Jane", org=self.org)
+        client = self.client_for(self.member)
+        rows = self.read_csv(client.get("/api/exports/contacts/"))
+        self.assertEqual([row[0] for row in rows[1:]], ["Jane"])
+        rows = self.read_csv(client.get("/api/exports/leads/"))
+        self.assertEqual([row[0] for row in rows[1:]], ["'=HYPERLINK(0)"])
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client_for(self.admin).get(
+            "/api/exports/leads/", {"file_format": "xlsx", "search": "john"}
+        )
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:2], ("'=HYPERLINK(0)", "John"))
+
+    def test_large_exports_are_written_in_the_background(self):
+        client = self.client_for(self.member)
+        with mock.patch.dict(exports.EXPORT_SYNC_LIMITS, {"csv": 0}), mock.patch(
+            "common.views.export_records.delay"
+        ) as delay, self.captureOnCommitCallbacks(execute=True):
+            response = client.get("/api/exports/leads/")
+        self.assertEqual(response.status_code, 202)
+        data_export = DataExport.objects.get(id=response.data["export"]["id"])
+        delay.assert_called_once_with(str(data_export.id))
+
+        exports.run_export(data_export)
+        response = client.get("/api/exports/jobs/%s/" % data_export.id)
+        self.assertEqual(response.data["export"]["status"], "completed")
+        self.assertEqual(response.data["export"]["rows"], 1)
+        response = client.get(
+            "/api/exports/jobs/%s/" % data_export.id, {"download": 1}
+        )
+        self.assertEqual(len(self.read_csv(response)), 2)
+        # exports are only visible to who asked for them
+        response = self.client_for(self.admin).get(
+            "/api/exports/jobs/%s/" % data_export.id
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,282 @@
+"""Resumable chunked uploads, stored once per content.
+
+A client opens an ``UploadSession`` with the name and size of its file, then
+sends the file in order, a chunk of at most ``UPLOAD_CHUNK_SIZE`` bytes per
+request, each stored as is as a part, ``uploads/<session>/parts/<n>``. A
+chunk names the offset it starts at; one not starting where the session
+stands is refused with that offset, so an interrupted upload resumes from the
+last stored part. Requests stay small, nothing is buffered to the local disk
+and a request never holds a worker for the length of a whole upload.
+
+Completing the session joins the parts into one file while hashing them.
+Content already stored under the same SHA-256 is kept instead, the joined
+copy dropped, so every content is stored once as a ``StoredFile`` whatever
+the number of uploads of it. ``attach_upload`` points an attachment or
+document at the stored file; ``StoredFile.references`` counts them and the
+file is deleted with its last reference, once no session of it is left to
+attach. ``purge_stale_uploads`` deletes the sessions idle for
+``UPLOAD_SESSION_TTL`` seconds, with their parts or unreferenced file.
+"""
+import hashlib
+import io
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from common import files
+from common.models import Attachments, Document, StoredFile, UploadSession
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = getattr(settings, "UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+UPLOAD_MAX_SIZE = getattr(settings, "UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+UPLOAD_SESSION_TTL = getattr(settings, "UPLOAD_SESSION_TTL", 60 * 60 * 24)
+UPLOAD_DIRECTORY = "uploads"
+
+# models referencing stored files
+REFERENCING_MODELS = (Attachments, Document)
+
+
+class UploadError(Exception):
+    """A chunk or completion refused, ``offset`` is where the session
+    stands."""
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def part_path(upload, index):
+    return "%s/%s/parts/%08d" % (UPLOAD_DIRECTORY, upload.id, index)
+
+
+def file_path(upload):
+    return "%s/%s/%s" % (UPLOAD_DIRECTORY, upload.id, upload.file_name)
+
+
+def create_upload(profile, file_name, size, content_type=""):
+    if size > UPLOAD_MAX_SIZE:
+        raise UploadError("File is larger than %s bytes." % UPLOAD_MAX_SIZE)
+    return UploadSession.objects.create(
+        org=profile.org,
+        profile=profile,
+        # the storage path ends with the name
+        file_name=file_name.replace("/", "_").replace("\\", "_")[:255],
+        content_type=content_type[:255],
+        size=size,
+    )
+
+
+def store_chunk(upload_id, offset, data):
+    """Store ``data``, starting at byte ``offset`` of the upload, returns the
+    session updated."""
+    with transaction.atomic():
+        # serializes concurrent retries of the same chunk
+        upload = UploadSession.objects.select_for_update().get(id=upload_id)
+        if upload.is_complete:
+            raise UploadError("Upload is already complete.", upload.received)
+        if offset != upload.received:
+            raise UploadError(
+                "Upload continues at %s." % upload.received, upload.received
+            )
+        if not data or len(data) > UPLOAD_CHUNK_SIZE:
+            raise UploadError(
+                "Chunks hold 1 to %s bytes." % UPLOAD_CHUNK_SIZE, upload.received
+            )
+        if upload.received + len(data) > upload.size:
+            raise UploadError("Chunk goes past the end of the file.", upload.received)
+        path = part_path(upload, upload.parts)
+        # left over by an attempt rolled back after storing it
+        default_storage.delete(path)
+        default_storage.save(path, ContentFile(data))
+        upload.received += len(data)
+        upload.parts += 1
+        upload.save(update_fields=["received", "parts", "updated_at"])
+    return upload
+
+
+class PartsReader(io.RawIOBase):
+    """The parts of an upload read one after the other, hashed on the way."""
+
+    def __init__(self, upload):
+        self.paths = [part_path(upload, index) for index in range(upload.parts)]
+        self.digest = hashlib.sha256()
+        self.part = None
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # storages rewind the content before writing it
+        if offset != 0 or whence != io.SEEK_SET or self.position != 0:
+            raise io.UnsupportedOperation("seek")
+        return 0
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        while True:
+            if self.part is None:
+                if not self.paths:
+                    return 0
+                self.part = default_storage.open(self.paths.pop(0), "rb")
+            data = self.part.read(len(buffer))
+            if data:
+                break
+            self.part.close()
+            self.part = None
+        buffer[: len(data)] = data
+        self.digest.update(data)
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if self.part is not None:
+            self.part.close()
+            self.part = None
+        super().close()
+
+
+def _delete_parts(upload):
+    for index in range(upload.parts):
+        default_storage.delete(part_path(upload, index))
+
+
+def complete_upload(upload_id):
+    """Join the parts of the upload into its stored file, returns the session
+    updated."""
+    upload = UploadSession.objects.get(id=upload_id)
+    if upload.is_complete:
+        return upload
+    if upload.received != upload.size:
+        raise UploadError(
+            "Upload continues at %s." % upload.received, upload.received
+        )
+    reader = PartsReader(upload)
+    content = File(io.BufferedReader(reader, files.HASH_CHUNK_SIZE), upload.file_name)
+    content.size = upload.size
+    path = default_storage.save(file_path(upload), content)
+    content_hash = reader.digest.hexdigest()
+    reader.close()
+    try:
+        with transaction.atomic():
+            stored_file, created = StoredFile.objects.get_or_create(
+                content_hash=content_hash,
+                defaults={
+                    "file": path,
+                    "size": upload.size,
+                    "mime_type": upload.content_type,
+                },
+            )
+    except IntegrityError:
+        # stored concurrently by another upload of the same content
+        stored_file = StoredFile.objects.get(content_hash=content_hash)
+        created = False
+    if not created:
+        default_storage.delete(path)
+    UploadSession.objects.filter(id=upload.id).update(
+        stored_file=stored_file, updated_at=timezone.now()
+    )
+    upload.stored_file = stored_file
+    _delete_parts(upload)
+    logger.info(
+        "upload %s completed size=%s deduplicated=%s",
+        upload.id,
+        upload.size,
+        not created,
+    )
+    return upload
+
+
+def get_completed_upload(upload_id, profile):
+    """The completed upload ``upload_id`` of ``profile``, else ``None``."""
+    if not upload_id:
+        return None
+    try:
+        return (
+            UploadSession.objects.filter(
+                id=upload_id, profile=profile, stored_file__isnull=False
+            )
+            .select_related("stored_file")
+            .first()
+        )
+    except ValidationError:
+        return None
+
+
+def create_attachment(upload, created_by, **related):
+    """Attachment of the stored file of ``upload`` to the ``related``
+    records."""
+    attachment = Attachments(
+        created_by=created_by, file_name=upload.file_name[:60], **related
+    )
+    attach_upload(attachment, upload)
+    attachment.save()
+    return attachment
+
+
+def attach_upload(instance, upload):
+    """Point the file of ``instance``, an unsaved attachment or document, at
+    the stored file of ``upload``; references are counted once it is
+    saved."""
+    stored_file = upload.stored_file
+    instance._previous_stored_file_id = instance.stored_file_id
+    getattr(instance, instance.FILE_FIELD).name = stored_file.file.name
+    instance.stored_file = stored_file
+    instance.file_category = files.classify(upload.file_name)[0]
+    instance.mime_type = stored_file.mime_type or files.guess_mime_type(
+        upload.file_name
+    )
+    instance.file_size = stored_file.size
+    instance.content_hash = stored_file.content_hash
+    instance.thumbnail = ""
+    instance._file_changed = True
+
+
+def count_references(stored_file_ids):
+    """Recount the references of the stored files, deleting the ones left
+    without any once committed."""
+    stored_file_ids = {pk for pk in stored_file_ids if pk is not None}
+    if not stored_file_ids:
+        return
+    for stored_file_id in stored_file_ids:
+        references = sum(
+            model.objects.filter(stored_file_id=stored_file_id).count()
+            for model in REFERENCING_MODELS
+        )
+        StoredFile.objects.filter(id=stored_file_id).update(references=references)
+        if references == 0:
+            transaction.on_commit(lambda pk=stored_file_id: _delete_unreferenced(pk))
+
+
+def _delete_unreferenced(stored_file_id):
+    # kept while a session of it can still be attached, until purged
+    stored_file = StoredFile.objects.filter(
+        id=stored_file_id, references=0, uploads__isnull=True
+    ).first()
+    if stored_file is None:
+        return
+    stored_file.delete()
+    stored_file.file.delete(save=False)
+
+
+def purge_stale_uploads(now=None):
+    """Delete the sessions and unreferenced stored files idle for
+    ``UPLOAD_SESSION_TTL`` seconds, returns how many sessions were deleted."""
+    stale = (now or timezone.now()) - timedelta(seconds=UPLOAD_SESSION_TTL)
+    sessions = UploadSession.objects.filter(updated_at__lt=stale)
+    for upload in sessions.filter(stored_file__isnull=True).iterator():
+        _delete_parts(upload)
+    deleted, _ = sessions.delete()
+    unreferenced = StoredFile.objects.filter(references=0, uploads__isnull=True)
+    for stored_file_id in unreferenced.values_list("id", flat=True):
+        _delete_unreferenced(stored_file_id)
+    return deleted
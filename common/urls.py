@@ -8,6 +8,14 @@ app_name = "api_common"
 
 urlpatterns = [
     path("dashboard/", views.ApiHomeView.as_view()),
+    path("search/", views.SearchView.as_view()),
+    path("mentions/autocomplete/", views.MentionAutocompleteView.as_view()),
+    path("duplicates/", views.DuplicateClusterView.as_view()),
+    path("duplicates/check/", views.DuplicateCheckView.as_view()),
+    path("bulk/<str:entity>/update/", views.BulkUpdateView.as_view()),
+    path("bulk/<str:entity>/delete/", views.BulkDeleteView.as_view()),
+    path("exports/jobs/<str:pk>/", views.ExportDetailView.as_view()),
+    path("exports/<str:entity>/", views.ExportView.as_view()),
     path(
         "auth/refresh-token/",
         jwt_views.TokenRefreshView.as_view(),
@@ -21,6 +29,8 @@ urlpatterns = [
     path("users/get-teams-and-users/", views.GetTeamsAndUsersView.as_view()),
     path("users/", views.UsersListView.as_view()),
     path("user/<str:pk>/", views.UserDetailView.as_view()),
+    path("uploads/", views.UploadListView.as_view()),
+    path("uploads/<str:pk>/", views.UploadDetailView.as_view()),
     path("documents/", views.DocumentListView.as_view()),
     path("documents/<str:pk>/", views.DocumentDetailView.as_view()),
     path("api-settings/", views.DomainList.as_view()),
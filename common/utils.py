@@ -1,4 +1,5 @@
 import pytz
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 
@@ -587,6 +588,17 @@ def return_complete_address(self):
     return address
 
 
+def shared_cache_enabled():
+    """Whether the default cache is shared by every worker process.
+
+    The auth, lookup and list caches invalidate entries from the process
+    handling the write; with a per process cache (LocMemCache, the default
+    without ``REDIS_CACHE_URL``) the other processes would keep serving them,
+    so these caches are bypassed.
+    """
+    return getattr(settings, "SHARED_CACHE", False)
+
+
 def get_client_ip(request):
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
     if x_forwarded_for:
@@ -1,11 +1,13 @@
 import json
 import secrets
+import tempfile
 from multiprocessing import context
 from re import template
 
 import requests
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.utils import json
 from django.conf import settings
@@ -13,6 +15,7 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.hashers import make_password
 from django.db import transaction
 from django.db.models import Q
+from django.http import FileResponse, StreamingHttpResponse
 from django.http.response import JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
@@ -27,7 +30,6 @@ from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schem
 #from common.external_auth import CustomDualAuthentication
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -38,8 +40,31 @@ from cases.models import Case
 from cases.serializer import CaseSerializer
 
 ##from common.custom_auth import JSONWebTokenAuthentication
-from common import serializer, swagger_params1
-from common.models import APISettings, Document, Org, Profile, User
+from common import serializer, swagger_params1, uploads
+from common import bulk, dedupe, exports
+from common.dashboard import get_dashboard_counts, get_recent_items
+from common.mentions import (
+    MENTION_AUTOCOMPLETE_LIMIT,
+    MENTION_AUTOCOMPLETE_MAX_LIMIT,
+    get_directory,
+)
+from common.search import (
+    SEARCH_ENTITIES,
+    SEARCH_MAX_RESULTS,
+    SEARCH_RESULTS_LIMIT,
+    search,
+)
+from common.models import (
+    APISettings,
+    DataExport,
+    Document,
+    DuplicateMatch,
+    Org,
+    Profile,
+    User,
+)
+from common.pagination import KeysetPagination
+from common.visibility import sees_all, visible_to
 from common.serializer import *
 # from common.serializer import (
 #     CreateUserSerializer,
@@ -47,6 +72,7 @@ from common.serializer import *
 #     RegisterOrganizationSerializer,
 # )
 from common.tasks import (
+    export_records,
     resend_activation_link_to_user,
     send_email_to_new_user,
     send_email_to_reset_password,
@@ -83,7 +109,7 @@ class GetTeamsAndUsersView(APIView):
         return Response(data)
 
 
-class UsersListView(APIView, LimitOffsetPagination):
+class UsersListView(APIView, KeysetPagination):
 
     permission_classes = (IsAuthenticated,)
     @extend_schema(parameters=swagger_params1.organization_params,request=UserCreateSwaggerSerializer)
@@ -160,40 +186,32 @@ class UsersListView(APIView, LimitOffsetPagination):
         context = {}
         queryset_active_users = queryset.filter(is_active=True)
         results_active_users = self.paginate_queryset(
-            queryset_active_users.distinct(), self.request, view=self
+            queryset_active_users.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="active_cursor",
         )
         active_users = ProfileSerializer(results_active_users, many=True).data
-        if results_active_users:
-            offset = queryset_active_users.filter(
-                id__gte=results_active_users[-1].id
-            ).count()
-            if offset == queryset_active_users.count():
-                offset = None
-        else:
-            offset = 0
         context["active_users"] = {
             "active_users_count": self.count,
             "active_users": active_users,
-            "offset": offset,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
         }
 
         queryset_inactive_users = queryset.filter(is_active=False)
         results_inactive_users = self.paginate_queryset(
-            queryset_inactive_users.distinct(), self.request, view=self
+            queryset_inactive_users.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="inactive_cursor",
         )
         inactive_users = ProfileSerializer(results_inactive_users, many=True).data
-        if results_inactive_users:
-            offset = queryset_inactive_users.filter(
-                id__gte=results_inactive_users[-1].id
-            ).count()
-            if offset == queryset_inactive_users.count():
-                offset = None
-        else:
-            offset = 0
         context["inactive_users"] = {
             "inactive_users_count": self.count,
             "inactive_users": inactive_users,
-            "offset": offset,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
         }
 
         context["admin_email"] = settings.ADMIN_EMAIL
@@ -333,39 +351,374 @@ class ApiHomeView(APIView):
 
     @extend_schema(parameters=swagger_params1.organization_params)
     def get(self, request, format=None):
-        accounts = Account.objects.filter(status="open", org=request.profile.org)
-        contacts = Contact.objects.filter(org=request.profile.org)
-        leads = Lead.objects.filter(org=request.profile.org).exclude(
-            Q(status="converted") | Q(status="closed")
+        org = request.profile.org
+        profile = None
+        if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
+            profile = self.request.profile
+        # counts come from the materialized counters, see common.dashboard
+        counts = get_dashboard_counts(org.id, profile.id if profile else None)
+        context = {}
+        context["accounts_count"] = counts["accounts"]
+        context["contacts_count"] = counts["contacts"]
+        context["leads_count"] = counts["leads"]
+        context["opportunities_count"] = counts["opportunities"]
+        context["accounts"] = AccountSerializer(
+            get_recent_items("accounts", org, profile), many=True
+        ).data
+        context["contacts"] = ContactSerializer(
+            get_recent_items("contacts", org, profile), many=True
+        ).data
+        context["leads"] = LeadSerializer(
+            get_recent_items("leads", org, profile), many=True
+        ).data
+        context["opportunities"] = OpportunitySerializer(
+            get_recent_items("opportunities", org, profile), many=True
+        ).data
+        return Response(context, status=status.HTTP_200_OK)
+
+
+class SearchView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(parameters=swagger_params1.search_params)
+    def get(self, request, format=None):
+        params = request.query_params
+        text = params.get("q", "").strip()
+        entities = [e for e in params.get("entity", "").split(",") if e]
+        errors = {}
+        if not text:
+            errors["q"] = "This field is required."
+        if set(entities) - set(SEARCH_ENTITIES):
+            errors["entity"] = "Choose from %s." % ", ".join(SEARCH_ENTITIES)
+        try:
+            limit = int(params.get("limit", SEARCH_RESULTS_LIMIT))
+            limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+        except ValueError:
+            errors["limit"] = "A valid integer is required."
+        if errors:
+            return Response(
+                {"error": True, "errors": errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # scoped per entity as in its list view
+        results = search(
+            request.profile.org,
+            text,
+            entities=entities,
+            profile=request.profile,
+            limit=limit,
+        )
+        return Response(
+            {
+                "error": False,
+                "results": [
+                    {"entity": entity, "id": object_id, "title": title, "rank": rank}
+                    for entity, object_id, title, rank in results
+                ],
+            },
+            status=status.HTTP_200_OK,
         )
-        opportunities = Opportunity.objects.filter(org=request.profile.org)
 
-        if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
-            accounts = accounts.filter(
-                Q(assigned_to=self.request.profile) | Q(created_by=self.request.profile.user)
+
+class BulkActionView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def apply(self, entity, data):
+        raise NotImplementedError
+
+    def post(self, request, entity, format=None):
+        if entity not in bulk.BULK_ENTITIES:
+            return Response(
+                {
+                    "error": True,
+                    "errors": "Bulk actions apply to %s."
+                    % ", ".join(bulk.BULK_ENTITIES),
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            results = self.apply(entity, request.data)
+        except bulk.BulkActionError as error:
+            return Response(
+                {"error": True, "errors": error.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"error": False, "count": len(results), "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BulkUpdateView(BulkActionView):
+    @extend_schema(
+        parameters=swagger_params1.organization_params,
+        request=serializer.BulkUpdateSwaggerSerializer,
+    )
+    def post(self, request, entity, format=None):
+        """Change the status or assignees of many records at once."""
+        return super().post(request, entity, format)
+
+    def apply(self, entity, data):
+        return bulk.bulk_update(
+            entity,
+            self.request.profile,
+            data.get("changes") or {},
+            ids=data.get("ids"),
+            filters=data.get("filters"),
+        )
+
+
+class BulkDeleteView(BulkActionView):
+    @extend_schema(
+        parameters=swagger_params1.organization_params,
+        request=serializer.BulkDeleteSwaggerSerializer,
+    )
+    def post(self, request, entity, format=None):
+        """Delete many records at once."""
+        return super().post(request, entity, format)
+
+    def apply(self, entity, data):
+        return bulk.bulk_delete(
+            entity,
+            self.request.profile,
+            ids=data.get("ids"),
+            filters=data.get("filters"),
+        )
+
+
+class ExportView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(parameters=swagger_params1.export_params)
+    def get(self, request, entity, format=None):
+        """The records of ``entity`` as CSV or XLSX, streamed, or a
+        ``DataExport`` written in the background for large selections."""
+        if entity not in exports.EXPORT_ENTITIES:
+            return Response(
+                {
+                    "error": True,
+                    "errors": "Exports cover %s." % ", ".join(exports.EXPORT_ENTITIES),
+                },
+                status=status.HTTP_404_NOT_FOUND,
             )
-            contacts = contacts.filter(
-                Q(assigned_to__id__in=self.request.profile)
-                | Q(created_by=self.request.profile.user)
+        # not ``format``, DRF negotiates the renderer with it
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in exports.EXPORT_FORMATS or (
+            file_format == "xlsx" and not exports.xlsx_available()
+        ):
+            return Response(
+                {"error": True, "errors": {"file_format": "Unsupported format."}},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            leads = leads.filter(
-                Q(assigned_to__id__in=self.request.profile)
-                | Q(created_by=self.request.profile.user)
-            ).exclude(status="closed")
-            opportunities = opportunities.filter(
-                Q(assigned_to__id__in=self.request.profile)
-                | Q(created_by=self.request.profile.user)
+        search = request.query_params.get("search", "")[:255]
+        records = exports.get_records(entity, request.profile, search)
+        if records.count() > exports.EXPORT_SYNC_LIMITS[file_format]:
+            data_export = DataExport.objects.create(
+                org=request.profile.org,
+                profile=request.profile,
+                entity=entity,
+                file_format=file_format,
+                search=search,
             )
-        context = {}
-        context["accounts_count"] = accounts.count()
-        context["contacts_count"] = contacts.count()
-        context["leads_count"] = leads.count()
-        context["opportunities_count"] = opportunities.count()
-        context["accounts"] = AccountSerializer(accounts, many=True).data
-        context["contacts"] = ContactSerializer(contacts, many=True).data
-        context["leads"] = LeadSerializer(leads, many=True).data
-        context["opportunities"] = OpportunitySerializer(opportunities, many=True).data
-        return Response(context, status=status.HTTP_200_OK)
+            transaction.on_commit(lambda: export_records.delay(str(data_export.id)))
+            return Response(
+                {
+                    "error": False,
+                    "message": "Export started",
+                    "export": serializer.DataExportSerializer(data_export).data,
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
+        file_name = exports.export_file_name(entity, file_format)
+        if file_format == "csv":
+            response = StreamingHttpResponse(
+                exports.stream_csv(entity, records),
+                content_type=exports.CONTENT_TYPES["csv"],
+            )
+            response["Content-Disposition"] = 'attachment; filename="%s"' % file_name
+            return response
+        temporary = tempfile.TemporaryFile()
+        exports.write_xlsx(entity, records, temporary)
+        temporary.seek(0)
+        return FileResponse(
+            temporary,
+            as_attachment=True,
+            filename=file_name,
+            content_type=exports.CONTENT_TYPES["xlsx"],
+        )
+
+
+class ExportDetailView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self, pk):
+        try:
+            return DataExport.objects.filter(
+                id=pk, org=self.request.profile.org, profile=self.request.profile
+            ).first()
+        except ValidationError:
+            return None
+
+    @extend_schema(parameters=swagger_params1.organization_params)
+    def get(self, request, pk, format=None):
+        data_export = self.get_object(pk)
+        if data_export is None:
+            return Response(
+                {"error": True, "errors": "Export does not exist"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if request.query_params.get("download"):
+            if not data_export.file:
+                return Response(
+                    {"error": True, "errors": "Export is not ready"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return FileResponse(
+                data_export.file.open("rb"),
+                as_attachment=True,
+                filename=data_export.file.name.rsplit("/", 1)[-1],
+                content_type=exports.CONTENT_TYPES[data_export.file_format],
+            )
+        return Response(
+            {
+                "error": False,
+                "export": serializer.DataExportSerializer(data_export).data,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DuplicateCheckView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(parameters=swagger_params1.duplicate_check_params)
+    def get(self, request, format=None):
+        """Likely duplicates of a lead or contact about to be created."""
+        params = request.query_params
+        entity = params.get("entity", "")
+        if entity not in dedupe.DEDUPE_ENTITIES:
+            return Response(
+                {
+                    "error": True,
+                    "errors": {
+                        "entity": "Choose from %s." % ", ".join(dedupe.DEDUPE_ENTITIES)
+                    },
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        records = None
+        if not sees_all(entity, self.request.profile):
+            records = visible_to(
+                dedupe.get_entity_model(entity).objects.all(), self.request.profile
+            )
+        matches = dedupe.find_duplicates(
+            entity, request.profile.org_id, params, records=records
+        )
+        return Response(
+            {"error": False, "duplicates": dedupe.describe(entity, matches)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class DuplicateClusterView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(parameters=swagger_params1.duplicate_cluster_params)
+    def get(self, request, format=None):
+        """Clusters of likely duplicates found by the last cluster_duplicates
+        run, for the profiles seeing every record of the entity."""
+        params = request.query_params
+        entity = params.get("entity", "")
+        errors = {}
+        if entity not in dedupe.DEDUPE_ENTITIES:
+            errors["entity"] = "Choose from %s." % ", ".join(dedupe.DEDUPE_ENTITIES)
+        try:
+            limit = max(1, min(int(params.get("limit", 20)), 100))
+            offset = max(0, int(params.get("offset", 0)))
+        except ValueError:
+            errors["limit"] = "A valid integer is required."
+        if errors:
+            return Response(
+                {"error": True, "errors": errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not sees_all(entity, self.request.profile):
+            return Response(
+                {
+                    "error": True,
+                    "errors": "You do not have Permission to perform this action",
+                },
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        matches = DuplicateMatch.objects.filter(
+            org_id=request.profile.org_id, entity=entity
+        )
+        cluster_ids = list(
+            matches.order_by("cluster_id")
+            .values_list("cluster_id", flat=True)
+            .distinct()[offset : offset + limit]
+        )
+        rows = list(
+            matches.filter(cluster_id__in=cluster_ids)
+            .order_by("-score", "object_id")
+            .values_list("cluster_id", "object_id", "score")
+        )
+        records = dedupe.describe(entity, [row[1:] for row in rows])
+        clusters = {cluster_id: [] for cluster_id in cluster_ids}
+        for (cluster_id, _, _), record in zip(rows, records):
+            clusters[cluster_id].append(record)
+        return Response(
+            {
+                "error": False,
+                "clusters": [
+                    {"id": cluster_id, "records": records}
+                    for cluster_id, records in clusters.items()
+                ],
+                "offset": offset + len(cluster_ids),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class MentionAutocompleteView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(parameters=swagger_params1.mention_autocomplete_params)
+    def get(self, request, format=None):
+        params = request.query_params
+        try:
+            limit = int(params.get("limit", MENTION_AUTOCOMPLETE_LIMIT))
+            limit = max(1, min(limit, MENTION_AUTOCOMPLETE_MAX_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": True, "errors": {"limit": "A valid integer is required."}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        members = get_directory(request.profile.org_id).autocomplete(
+            params.get("q", "").strip(), limit=limit
+        )
+        return Response(
+            {
+                "error": False,
+                "members": [
+                    {
+                        "id": member.profile_id,
+                        "user_id": member.user_id,
+                        "email": member.email,
+                        "handle": member.handle,
+                    }
+                    for member in members
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class OrgProfileCreateView(APIView):
@@ -440,7 +793,126 @@ class ProfileView(APIView):
         context["user_obj"] = ProfileSerializer(self.request.profile).data
         return Response(context, status=status.HTTP_200_OK)
 
-class DocumentListView(APIView, LimitOffsetPagination):
+class UploadListView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(
+        tags=["uploads"],
+        parameters=swagger_params1.organization_params,
+        request=UploadSessionCreateSerializer,
+    )
+    def post(self, request, format=None):
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": True, "errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            upload = uploads.create_upload(request.profile, **serializer.validated_data)
+        except uploads.UploadError as error:
+            return Response(
+                {"error": True, "errors": {"size": str(error)}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {
+                "error": False,
+                "upload": UploadSessionSerializer(upload).data,
+                "chunk_size": uploads.UPLOAD_CHUNK_SIZE,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class UploadDetailView(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self, pk):
+        try:
+            return UploadSession.objects.filter(
+                id=pk, profile=self.request.profile
+            ).first()
+        except ValidationError:
+            return None
+
+    def not_found(self):
+        return Response(
+            {"error": True, "errors": "Upload not found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    def refused(self, error):
+        return Response(
+            {"error": True, "errors": str(error), "offset": error.offset},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    @extend_schema(tags=["uploads"], parameters=swagger_params1.organization_params)
+    def get(self, request, pk, format=None):
+        upload = self.get_object(pk)
+        if upload is None:
+            return self.not_found()
+        return Response(
+            {"error": False, "upload": UploadSessionSerializer(upload).data},
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(
+        tags=["uploads"],
+        parameters=swagger_params1.upload_chunk_params,
+        request={"application/offset+octet-stream": OpenApiTypes.BINARY},
+    )
+    def put(self, request, pk, format=None):
+        upload = self.get_object(pk)
+        if upload is None:
+            return self.not_found()
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            length = int(request.headers.get("Content-Length") or 0)
+        except ValueError:
+            return Response(
+                {"error": True, "errors": "Upload-Offset header is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if length > uploads.UPLOAD_CHUNK_SIZE:
+            return Response(
+                {
+                    "error": True,
+                    "errors": "Chunks hold up to %s bytes" % uploads.UPLOAD_CHUNK_SIZE,
+                },
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        # the raw body, past the request parsers
+        data = request.stream.read(length) if request.stream and length else b""
+        try:
+            upload = uploads.store_chunk(upload.id, offset, data)
+        except uploads.UploadError as error:
+            return self.refused(error)
+        return Response(
+            {"error": False, "upload": UploadSessionSerializer(upload).data},
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(tags=["uploads"], parameters=swagger_params1.organization_params)
+    def post(self, request, pk, format=None):
+        """Complete the upload once every chunk is stored."""
+        upload = self.get_object(pk)
+        if upload is None:
+            return self.not_found()
+        try:
+            upload = uploads.complete_upload(upload.id)
+        except uploads.UploadError as error:
+            return self.refused(error)
+        return Response(
+            {"error": False, "upload": UploadSessionSerializer(upload).data},
+            status=status.HTTP_200_OK,
+        )
+
+
+class DocumentListView(APIView, KeysetPagination):
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
     model = Document
@@ -491,42 +963,34 @@ class DocumentListView(APIView, LimitOffsetPagination):
 
         queryset_documents_active = queryset.filter(status="active")
         results_documents_active = self.paginate_queryset(
-            queryset_documents_active.distinct(), self.request, view=self
+            queryset_documents_active.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="active_cursor",
         )
         documents_active = DocumentSerializer(results_documents_active, many=True).data
-        if results_documents_active:
-            offset = queryset_documents_active.filter(
-                id__gte=results_documents_active[-1].id
-            ).count()
-            if offset == queryset_documents_active.count():
-                offset = None
-        else:
-            offset = 0
         context["documents_active"] = {
             "documents_active_count": self.count,
             "documents_active": documents_active,
-            "offset": offset,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
         }
 
         queryset_documents_inactive = queryset.filter(status="inactive")
         results_documents_inactive = self.paginate_queryset(
-            queryset_documents_inactive.distinct(), self.request, view=self
+            queryset_documents_inactive.distinct(),
+            self.request,
+            view=self,
+            cursor_query_param="inactive_cursor",
         )
         documents_inactive = DocumentSerializer(
             results_documents_inactive, many=True
         ).data
-        if results_documents_inactive:
-            offset = queryset_documents_inactive.filter(
-                id__gte=results_documents_active[-1].id
-            ).count()
-            if offset == queryset_documents_inactive.count():
-                offset = None
-        else:
-            offset = 0
         context["documents_inactive"] = {
             "documents_inactive_count": self.count,
             "documents_inactive": documents_inactive,
-            "offset": offset,
+            "offset": self.next_offset,
+            "next_cursor": self.next_cursor,
         }
 
         context["users"] = ProfileSerializer(profiles, many=True).data
@@ -545,13 +1009,31 @@ class DocumentListView(APIView, LimitOffsetPagination):
     )
     def post(self, request, *args, **kwargs):
         params = request.data
+        upload = None
+        if params.get("document_file_upload"):
+            upload = uploads.get_completed_upload(
+                params.get("document_file_upload"), request.profile
+            )
+            if upload is None:
+                return Response(
+                    {
+                        "error": True,
+                        "errors": {"document_file_upload": "Upload is not complete"},
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
         serializer = DocumentCreateSerializer(data=params, request_obj=request)
         if serializer.is_valid():
             doc = serializer.save(
                 created_by=request.profile.user,
                 org=request.profile.org,
-                document_file=request.FILES.get("document_file"),
+                document_file=request.FILES.get("document_file")
+                if upload is None
+                else upload.stored_file.file.name,
             )
+            if upload is not None:
+                uploads.attach_upload(doc, upload)
+                doc.save()
             if params.get("shared_to"):
                 assinged_to_list = params.get("shared_to")
                 profiles = Profile.objects.filter(
@@ -686,12 +1168,29 @@ class DocumentDetailView(APIView):
                     },
                     status=status.HTTP_403_FORBIDDEN,
                 )
+        upload = None
+        if params.get("document_file_upload"):
+            upload = uploads.get_completed_upload(
+                params.get("document_file_upload"), request.profile
+            )
+            if upload is None:
+                return Response(
+                    {
+                        "error": True,
+                        "errors": {"document_file_upload": "Upload is not complete"},
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
         serializer = DocumentCreateSerializer(
             data=params, instance=self.object, request_obj=request
         )
         if serializer.is_valid():
+            if upload is not None:
+                uploads.attach_upload(self.object, upload)
             doc = serializer.save(
-                document_file=request.FILES.get("document_file"),
+                document_file=self.object.document_file
+                if upload is not None
+                else request.FILES.get("document_file"),
                 status=params.get("status"),
                 org=request.profile.org,
             )
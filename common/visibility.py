@@ -0,0 +1,181 @@
+"""Precomputed record visibility.
+
+A non admin sees the records assigned to them or created by them. Filtering
+with ``Q(assigned_to=profile) | Q(created_by=profile.user)`` joins the
+assignment table into the list query, ORs conditions of two tables and needs a
+``distinct()``, so none of the indexes help. ``RecordVisibility`` stores one
+row per record, profile and reason instead, and ``visible_to`` scopes a
+queryset with a single semi-join on the ``(profile, entity, record_id)`` index.
+
+Rows are kept up to date from the model and assignment signals registered in
+``common.signals``. Writes that bypass signals (``bulk_create``, the team
+propagation writing the through tables) refresh the records explicitly or
+rebuild the org with ``rebuild_org``, also run for every org by the
+``rebuild_record_visibility`` beat task.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from common.models import Profile, RecordVisibility
+
+VISIBILITY_BATCH_SIZE = 1000
+
+# entity -> (model, many to many of the assigned profiles or None)
+VISIBILITY_ENTITIES = {
+    "accounts": ("accounts.Account", "assigned_to"),
+    "cases": ("cases.Case", "assigned_to"),
+    "contacts": ("contacts.Contact", "assigned_to"),
+    "events": ("events.Event", "assigned_to"),
+    "leads": ("leads.Lead", "assigned_to"),
+    "lenders": ("lender.Lender", None),
+    "opportunities": ("opportunity.Opportunity", "assigned_to"),
+    "tasks": ("tasks.Task", "assigned_to"),
+}
+
+
+# entities whose list views also show every record to organization admins,
+# the other list views only to ADMIN profiles and superusers
+ORG_ADMIN_ENTITIES = ("accounts", "cases", "contacts")
+
+
+def sees_all(entity, profile):
+    """Whether ``profile`` sees every record of ``entity`` in its org, as in
+    the list view of ``entity``."""
+    if profile.role == "ADMIN":
+        return True
+    if entity in ORG_ADMIN_ENTITIES:
+        return profile.is_admin
+    return profile.user.is_superuser
+
+
+def get_entity_model(entity):
+    return apps.get_model(VISIBILITY_ENTITIES[entity][0])
+
+
+def get_entity(model):
+    for entity, (label, _) in VISIBILITY_ENTITIES.items():
+        if model._meta.label == label:
+            return entity
+    return None
+
+
+def visible_to(queryset, profile):
+    """``queryset`` restricted to the records ``profile`` can see."""
+    visible = RecordVisibility.objects.filter(
+        profile=profile, entity=get_entity(queryset.model)
+    )
+    return queryset.filter(id__in=visible.values("record_id"))
+
+
+def _assignments(entity, records):
+    """The through table rows ``(record_id, profile_id)`` of ``records``."""
+    field_name = VISIBILITY_ENTITIES[entity][1]
+    if field_name is None:
+        return RecordVisibility.objects.none().values_list("record_id", "profile_id")
+    field = get_entity_model(entity)._meta.get_field(field_name)
+    record_column = field.m2m_field_name()
+    profile_column = field.m2m_reverse_field_name()
+    return field.remote_field.through.objects.filter(
+        **{record_column + "__in": records.values("id")}
+    ).values_list(record_column, profile_column)
+
+
+def _visibility(entity, records):
+    """Rows ``(record_id, profile_id, reason)`` ``records`` should have."""
+    creator = Profile.objects.filter(
+        org_id=OuterRef("org_id"), user_id=OuterRef("created_by_id")
+    ).values("id")[:1]
+    rows = {
+        (record_id, profile_id, RecordVisibility.REASON_CREATOR)
+        for record_id, profile_id in records.exclude(created_by=None)
+        .annotate(creator_profile=Subquery(creator))
+        .exclude(creator_profile=None)
+        .order_by()
+        .values_list("id", "creator_profile")
+    }
+    rows.update(
+        (record_id, profile_id, RecordVisibility.REASON_ASSIGNED)
+        for record_id, profile_id in _assignments(entity, records)
+    )
+    return rows
+
+
+def _sync(entity, current, expected):
+    """Make the rows of ``current`` match the ``expected`` rows."""
+    existing = {
+        (record_id, profile_id, reason): pk
+        for pk, record_id, profile_id, reason in current.values_list(
+            "id", "record_id", "profile_id", "reason"
+        )
+    }
+    stale = [pk for row, pk in existing.items() if row not in expected]
+    missing = [row for row in expected if row not in existing]
+    with transaction.atomic():
+        if stale:
+            RecordVisibility.objects.filter(id__in=stale).delete()
+        if missing:
+            RecordVisibility.objects.bulk_create(
+                [
+                    RecordVisibility(
+                        entity=entity,
+                        record_id=record_id,
+                        profile_id=profile_id,
+                        reason=reason,
+                    )
+                    for record_id, profile_id, reason in missing
+                ],
+                batch_size=VISIBILITY_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+
+
+def refresh_records(entity, record_ids):
+    """Recompute the visibility of the records of ``entity`` with the given
+    ids, e.g. after a save or a change of their assignments."""
+    record_ids = list(record_ids)
+    records = get_entity_model(entity).objects.filter(id__in=record_ids)
+    _sync(
+        entity,
+        RecordVisibility.objects.filter(entity=entity, record_id__in=record_ids),
+        _visibility(entity, records),
+    )
+
+
+def refresh_profile(entity, profile):
+    """Recompute what ``profile`` can see of ``entity``, after assignments
+    were changed from the profile side."""
+    records = get_entity_model(entity).objects.filter(org_id=profile.org_id)
+    field_name = VISIBILITY_ENTITIES[entity][1]
+    condition = Q(created_by_id=profile.user_id)
+    if field_name:
+        condition |= Q(**{field_name: profile})
+    records = records.filter(condition)
+    _sync(
+        entity,
+        RecordVisibility.objects.filter(entity=entity, profile=profile),
+        {row for row in _visibility(entity, records) if row[1] == profile.id},
+    )
+
+
+def remove_records(entity, record_ids):
+    RecordVisibility.objects.filter(entity=entity, record_id__in=record_ids).delete()
+
+
+def rebuild_org(org_id):
+    """Recompute the visibility of every record of ``org_id``."""
+    for entity in VISIBILITY_ENTITIES:
+        records = get_entity_model(entity).objects.filter(org_id=org_id)
+        RecordVisibility.objects.filter(
+            entity=entity, profile__org_id=org_id
+        ).exclude(record_id__in=records.values("id")).delete()
+        chunk = []
+        for record_id in records.values_list("id", flat=True).order_by().iterator(
+            chunk_size=VISIBILITY_BATCH_SIZE
+        ):
+            chunk.append(record_id)
+            if len(chunk) >= VISIBILITY_BATCH_SIZE:
+                refresh_records(entity, chunk)
+                chunk = []
+        if chunk:
+            refresh_records(entity, chunk)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0006_modify_phone_req'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='contacts_org_created_idx'),
+        ),
+    ]
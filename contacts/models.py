@@ -50,6 +50,12 @@ class Contact(BaseModel):
         verbose_name_plural = "Contacts"
         db_table = "contacts"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="contacts_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.first_name
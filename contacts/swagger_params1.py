@@ -1,6 +1,8 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 
+from common.swagger_params1 import keyset_pagination_params
+
 organization_params_in_header = organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
@@ -11,9 +13,11 @@ organization_params = [
 
 contact_list_get_params = [
     organization_params_in_header,
+    OpenApiParameter("search", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter("name", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("city", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("assigned_to", OpenApiTypes.STR,OpenApiParameter.QUERY),
+    *keyset_pagination_params(),
 ]
 
 contact_create_post_params = [
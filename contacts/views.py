@@ -4,18 +4,22 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from common import dedupe
 from common.models import Attachments, Comment, Profile
+from common.pagination import KeysetPagination
+from common.search import filter_by_search
 from common.serializer import (
     AttachmentsSerializer,
     BillingAddressSerializer,
     CommentSerializer,
 )
+from common.tasks import send_email_user_mentions
 from common.utils import COUNTRIES
+from common.visibility import visible_to
 
 #from common.external_auth import CustomDualAuthentication
 from contacts import swagger_params1
@@ -26,7 +30,7 @@ from tasks.serializer import TaskSerializer
 from teams.models import Teams
 
 
-class ContactsListView(APIView, LimitOffsetPagination):
+class ContactsListView(APIView, KeysetPagination):
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
     model = Contact
@@ -35,12 +39,13 @@ class ContactsListView(APIView, LimitOffsetPagination):
         params = self.request.query_params
         queryset = self.model.objects.filter(org=self.request.profile.org).order_by("-id")
         if self.request.profile.role != "ADMIN" and not self.request.profile.is_admin:
-            queryset = queryset.filter(
-                Q(assigned_to__in=[self.request.profile])
-                | Q(created_by=self.request.profile.user)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
 
         if params:
+            if params.get("search"):
+                queryset = filter_by_search(
+                    queryset, "contacts", self.request.profile.org, params.get("search")
+                )
             if params.get("name"):
                 queryset = queryset.filter(first_name__icontains=params.get("name"))
             if params.get("city"):
@@ -59,16 +64,16 @@ class ContactsListView(APIView, LimitOffsetPagination):
             queryset.distinct(), self.request, view=self
         )
         contacts = ContactSerializer(results_contact, many=True).data
-        if results_contact:
-            offset = queryset.filter(id__gte=results_contact[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
-        context["per_page"] = 10
-        page_number = (int(self.offset / 10) + 1,)
+        context["per_page"] = self.limit
+        page_number = (int(self.offset / self.limit) + 1,)
         context["page_number"] = page_number
-        context.update({"contacts_count": self.count, "offset": offset})
+        context.update(
+            {
+                "contacts_count": self.count,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
+            }
+        )
         context["contact_obj_list"] = contacts
         context["countries"] = COUNTRIES
         users = Profile.objects.filter(is_active=True, org=self.request.profile.org).values(
@@ -133,8 +138,17 @@ class ContactsListView(APIView, LimitOffsetPagination):
             attachment.contact = contact_obj
             attachment.attachment = request.FILES.get("contact_attachment")
             attachment.save()
+        profile = None
+        if request.profile.role != "ADMIN" and not request.profile.is_admin:
+            profile = request.profile
         return Response(
-            {"error": False, "message": "Contact created Successfuly"},
+            {
+                "error": False,
+                "message": "Contact created Successfuly",
+                "possible_duplicates": dedupe.possible_duplicates(
+                    "contacts", contact_obj, profile=profile
+                ),
+            },
             status=status.HTTP_200_OK,
         )
 
@@ -358,11 +372,12 @@ class ContactDetailView(APIView):
         comment_serializer = CommentSerializer(data=params)
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     contact_id=self.contact_obj.id,
                     commented_by_id=self.request.profile.id,
                     org=request.profile.org,
                 )
+                send_email_user_mentions.delay(comment.id, "contacts")
 
         if self.request.FILES.get("contact_attachment"):
             attachment = Attachments()
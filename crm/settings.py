@@ -3,6 +3,7 @@ from datetime import timedelta
 
 from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
+from kombu import Queue
 
 # JWT_AUTH = {
 #     'JWT_PAYLOAD_GET_USERNAME_HANDLER':
@@ -58,6 +59,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.sessions",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "phonenumber_field",
     "rest_framework",
     "rest_framework_simplejwt",
@@ -185,6 +187,119 @@ ADMIN_EMAIL = os.environ["ADMIN_EMAIL"]
 # celery Tasks
 CELERY_BROKER_URL = os.environ["CELERY_BROKER_URL"]
 CELERY_RESULT_BACKEND = os.environ["CELERY_RESULT_BACKEND"]
+# not named tasks.py, so not autodiscovered
+CELERY_IMPORTS = ("tasks.celery_tasks",)
+
+# Every task is routed to one of these queues, each served by its own workers
+# (see "Start celery workers" in the README) so a long import or campaign
+# never holds up a password reset:
+# - transactional-email: emails a user is waiting for, short tasks, routed
+#   explicitly
+# - bulk-email: account email campaigns, sent in shards, and by default the
+#   notifications fanned out to assignees, mentioned users and customers
+# - imports: CSV imports and exports, lead conversions and team propagation,
+#   large reads and writes
+# - maintenance: beat jobs rebuilding derived data, history and PDFs
+CELERY_TASK_QUEUES = (
+    Queue("transactional-email"),
+    Queue("bulk-email"),
+    Queue("imports"),
+    Queue("maintenance"),
+)
+CELERY_TASK_DEFAULT_QUEUE = "bulk-email"
+# within a queue, 0 is served first
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+CELERY_TASK_ROUTES = {
+    "common.tasks.send_email_to_reset_password": {
+        "queue": "transactional-email",
+        "priority": 0,
+    },
+    "common.tasks.send_email_to_new_user": {
+        "queue": "transactional-email",
+        "priority": 0,
+    },
+    "common.tasks.resend_activation_link_to_user": {
+        "queue": "transactional-email",
+        "priority": 0,
+    },
+    "common.tasks.send_email_user_status": {"queue": "transactional-email"},
+    "common.tasks.send_email_user_delete": {"queue": "transactional-email"},
+    "accounts.tasks.send_email": {"queue": "bulk-email"},
+    "accounts.tasks.send_email_shard": {"queue": "bulk-email"},
+    # ahead of the shards, it only queues the due emails
+    "accounts.tasks.send_scheduled_emails": {"queue": "bulk-email", "priority": 0},
+    "leads.tasks.import_leads_from_file": {"queue": "imports"},
+    "leads.tasks.convert_leads_to_accounts": {"queue": "imports"},
+    "common.tasks.export_records": {"queue": "imports"},
+    "teams.tasks.*": {"queue": "imports"},
+    "common.tasks.reconcile_dashboard_counters": {"queue": "maintenance"},
+    "common.tasks.reindex_search_documents": {"queue": "maintenance"},
+    "common.tasks.rebuild_record_visibility": {"queue": "maintenance"},
+    "common.tasks.cluster_duplicates": {"queue": "maintenance"},
+    "common.tasks.generate_file_thumbnail": {"queue": "maintenance"},
+    "common.tasks.purge_upload_sessions": {"queue": "maintenance"},
+    "invoices.tasks.create_invoice_history": {"queue": "maintenance"},
+    "invoices.tasks.prerender_invoice_pdfs": {"queue": "maintenance"},
+}
+# seconds, SoftTimeLimitExceeded is raised in the task at the soft limit and
+# the process is killed at the hard one
+CELERY_TASK_SOFT_TIME_LIMIT = 60 * 5
+CELERY_TASK_TIME_LIMIT = CELERY_TASK_SOFT_TIME_LIMIT + 60
+# the long tasks resume from their own progress when run again
+CELERY_TASK_ANNOTATIONS = {
+    name: {"soft_time_limit": limit, "time_limit": limit + 60}
+    for name, limit in {
+        "accounts.tasks.send_email_shard": 60 * 30,
+        "leads.tasks.import_leads_from_file": 60 * 60,
+        "leads.tasks.convert_leads_to_accounts": 60 * 30,
+        "common.tasks.export_records": 60 * 60,
+        "teams.tasks.remove_users": 60 * 30,
+        "teams.tasks.update_team_users": 60 * 30,
+        "common.tasks.reindex_search_documents": 60 * 60 * 2,
+        "common.tasks.rebuild_record_visibility": 60 * 60 * 2,
+        "common.tasks.cluster_duplicates": 60 * 60 * 2,
+    }.items()
+}
+# long tasks are taken one at a time per process, the transactional-email
+# workers are started with a higher --prefetch-multiplier
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    # corrects the dashboard counters after writes that bypass signals
+    "reconcile-dashboard-counters": {
+        "task": "common.tasks.reconcile_dashboard_counters",
+        "schedule": 60 * 60,
+    },
+    # picks up writes that bypass signals, e.g. renamed accounts of opportunities
+    "reindex-search-documents": {
+        "task": "common.tasks.reindex_search_documents",
+        "schedule": 60 * 60 * 24,
+    },
+    # picks up profiles created after the records they created
+    "rebuild-record-visibility": {
+        "task": "common.tasks.rebuild_record_visibility",
+        "schedule": 60 * 60 * 24,
+    },
+    # drops abandoned chunked uploads, see common.uploads
+    "purge-upload-sessions": {
+        "task": "common.tasks.purge_upload_sessions",
+        "schedule": 60 * 60,
+    },
+    # clusters the likely duplicate leads and contacts, see common.dedupe
+    "cluster-duplicates": {
+        "task": "common.tasks.cluster_duplicates",
+        "schedule": 60 * 60 * 24,
+    },
+    # queues the scheduled account emails due, including missed ticks
+    "send-scheduled-emails": {
+        "task": "accounts.tasks.send_scheduled_emails",
+        "schedule": 60,
+    },
+}
 
 
 LOGGING = {
@@ -258,7 +373,7 @@ SETTINGS_EXPORT = ["APPLICATION_NAME"]
 REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "rest_framework.views.exception_handler",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "common.external_auth.CachedJWTAuthentication",
         "common.external_auth.CustomDualAuthentication"
         # "rest_framework.authentication.SessionAuthentication",
         # "rest_framework.authentication.BasicAuthentication",
@@ -331,6 +446,24 @@ SIMPLE_JWT = {
 # it is needed in custome middlewere to get the user from the token
 JWT_ALGO = "HS256"
 
+# shared cache, used for the resolved auth context among others
+if os.getenv("REDIS_CACHE_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_CACHE_URL"),
+        }
+    }
+# the auth, lookup and list caches are skipped unless every worker process
+# shares the cache, see common.utils.shared_cache_enabled
+SHARED_CACHE = bool(os.getenv("REDIS_CACHE_URL"))
+
+# seconds a resolved (user, org) -> profile snapshot is kept in the shared cache
+AUTH_CACHE_TTL = 60 * 15
+# seconds a snapshot is kept in the per-process LRU in front of the shared cache
+AUTH_CACHE_LOCAL_TTL = 30
+AUTH_CACHE_LOCAL_SIZE = 2048
+
 
 DOMAIN_NAME = os.environ["DOMAIN_NAME"]
 SWAGGER_ROOT_URL = os.environ["SWAGGER_ROOT_URL"]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='event_org_created_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 
+from common.swagger_params1 import keyset_pagination_params
+
 organization_params_in_header = organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
@@ -19,6 +21,7 @@ event_list_get_params = [
         OpenApiParameter.QUERY,
         OpenApiTypes.DATE
     ),
+    *keyset_pagination_params(),
 ]
 
 event_detail_post_params = [
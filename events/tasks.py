@@ -1,17 +1,13 @@
-from celery import Celery
 from django.conf import settings
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 
-from common.models import Profile
+from common.notifications import NotificationDispatcher, get_recipient_profiles
+from crm.celery import app
 from events.models import Event
 
-app = Celery("redis://")
-
 
 @app.task
 def send_email(event_id, recipients):
-    event = Event.objects.filter(id=event_id).first()
+    event = Event.objects.select_related("created_by").filter(id=event_id).first()
     subject = " Invitation for an event."
     context = {}
     context["event"] = event.name
@@ -20,29 +16,22 @@ def send_email(event_id, recipients):
     context["event_date_of_meeting"] = event.date_of_meeting
     context["url"] = settings.DOMAIN_NAME
     # recipients = event.assigned_to.filter(is_active=True)
-    for profile_id in recipients:
-        recipients_list = []
-        profile = Profile.objects.filter(id=profile_id, is_active=True).first()
-        if profile:
-            recipients_list.append(profile.user.email)
-            event_members = event.assigned_to.filter(is_active=True)
-
-            context["other_members"] = list(
-                event_members.exclude(id=profile.id).values_list(
-                    "user__email", flat=True
-                )
-            )
-            if len(context["other_members"]) > 0:
-                context["other_members"] = ", ".join(context["other_members"])
-            else:
-                context["other_members"] = ""
-            context["user"] = profile.user.email
-            html_content = render_to_string(
-                "assigned_to_email_template_event.html", context=context
-            )
-            msg = EmailMessage(subject=subject, body=html_content, to=recipients_list)
-            msg.content_subtype = "html"
-            msg.send()
+    event_members = list(
+        event.assigned_to.filter(is_active=True).values_list("id", "user__email")
+    )
+    dispatcher = NotificationDispatcher()
+    for profile in get_recipient_profiles(recipients):
+        context["other_members"] = ", ".join(
+            email
+            for member_id, email in event_members
+            if member_id != profile.id and email
+        )
+        context["user"] = profile.user.email
+        html_content = dispatcher.render(
+            "assigned_to_email_template_event.html", context
+        )
+        dispatcher.add(subject, html_content, [profile.user.email])
+    dispatcher.send()
 
     # if recipients.count() > 0:
     #     for recipient in recipients:
@@ -5,12 +5,12 @@ from django.db.models import Q
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.models import Attachments, Comment, Profile, User
+from common.pagination import KeysetPagination
 
 #from common.external_auth import CustomDualAuthentication
 from common.serializer import (
@@ -18,6 +18,8 @@ from common.serializer import (
     CommentSerializer,
     ProfileSerializer
 )
+from common.tasks import send_email_user_mentions
+from common.visibility import visible_to
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from events import swagger_params1
@@ -38,7 +40,7 @@ WEEKDAYS = (
 )
 
 
-class EventListView(APIView, LimitOffsetPagination):
+class EventListView(APIView, KeysetPagination):
     model = Event
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -48,13 +50,8 @@ class EventListView(APIView, LimitOffsetPagination):
         queryset = self.model.objects.filter(org=self.request.profile.org).order_by("-id")
         contacts = Contact.objects.filter(org=self.request.profile.org)
         if self.request.profile.role != "ADMIN" and not self.request.profile.is_admin:
-            queryset = queryset.filter(
-                Q(assigned_to__in=[self.request.profile])
-                | Q(created_by=self.request.profile.user)
-            )
-            contacts = contacts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
+            contacts = visible_to(contacts, self.request.profile)
 
         if params:
             if params.get("name"):
@@ -72,13 +69,13 @@ class EventListView(APIView, LimitOffsetPagination):
         context = {}
         results_events = self.paginate_queryset(queryset, self.request, view=self)
         events = EventSerializer(results_events, many=True).data
-        if results_events:
-            offset = queryset.filter(id__gte=results_events[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
-        context.update({"events_count": self.count, "offset": offset})
+        context.update(
+            {
+                "events_count": self.count,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
+            }
+        )
         context["events"] = events
         context["recurring_days"] = WEEKDAYS
         context["contacts_list"] = ContactSerializer(contacts, many=True).data
@@ -336,10 +333,11 @@ class EventDetailView(APIView):
         comment_serializer = CommentSerializer(data=params)
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     event_id=self.event_obj.id,
                     commented_by_id=self.request.profile.id,
                 )
+                send_email_user_mentions.delay(comment.id, "events")
 
         if self.request.FILES.get("event_attachment"):
             attachment = Attachments()
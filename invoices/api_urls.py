@@ -5,8 +5,12 @@ from invoices import api_views
 app_name = "api_invoices"
 
 urlpatterns = [
-    path("", api_views.InvoiceListView.as_view()),
-    path("<str:pk>/", api_views.InvoiceDetailView.as_view()),
-    path("comment/<str:pk>/", api_views.InvoiceCommentView.as_view()),
-    path("attachment/<str:pk>/", api_views.InvoiceAttachmentView.as_view()),
+    path("history/", api_views.InvoiceHistoryView.as_view()),
+    path("<str:pk>/as-of/", api_views.InvoiceAsOfView.as_view()),
+    path("<str:pk>/pdf/", api_views.InvoicePdfView.as_view()),
+    # not mounted until ported from request.company to request.profile.org
+    # path("", api_views.InvoiceListView.as_view()),
+    # path("<str:pk>/", api_views.InvoiceDetailView.as_view()),
+    # path("comment/<str:pk>/", api_views.InvoiceCommentView.as_view()),
+    # path("attachment/<str:pk>/", api_views.InvoiceAttachmentView.as_view()),
 ]
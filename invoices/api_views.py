@@ -1,10 +1,15 @@
 import json
+import uuid
 
 import pytz
 from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Q
-from drf_yasg.utils import swagger_auto_schema
+from django.http import FileResponse
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
@@ -25,13 +30,16 @@ from common.serializer import (
 from common.utils import COUNTRIES, CURRENCY_CODES
 from invoices import swagger_params1
 from invoices.models import Invoice
+from invoices.history import get_invoice_history, invoice_as_of
+from invoices.pdf import stored_invoice_pdf
 from invoices.serializer import (
     InvoiceCreateSerializer,
-    InvoiceHistorySerializer,
     InvoiceSerailizer,
+    InvoiceSwaggerSerailizer,
 )
 from invoices.tasks import (
     create_invoice_history,
+    prerender_invoice_pdfs,
     send_email,
     send_invoice_email,
     send_invoice_email_cancel,
@@ -46,6 +54,18 @@ INVOICE_STATUS = (
     ("Pending", "Pending"),
     ("Cancelled", "Cancel"),
 )
+# invoices per request of InvoiceHistoryView
+INVOICE_HISTORY_BATCH_SIZE = 100
+# seconds InvoicePdfView asks to wait while a PDF is rendered
+INVOICE_PDF_RETRY_AFTER = 5
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
 
 
 class InvoiceListView(APIView, LimitOffsetPagination):
@@ -221,6 +241,8 @@ class InvoiceListView(APIView, LimitOffsetPagination):
                             data["assigned_to"] = "Please enter valid user"
                             return Response({"error": True}, data)
             create_invoice_history(invoice_obj.id, request.user.id, [])
+            invoice_id = str(invoice_obj.id)
+            transaction.on_commit(lambda: prerender_invoice_pdfs.delay([invoice_id]))
             assigned_to_list = list(
                 invoice_obj.assigned_to.all().values_list("id", flat=True)
             )
@@ -247,9 +269,7 @@ class InvoiceDetailView(APIView):
     def get_object(self, pk):
         return self.model.objects.filter(id=pk).first()
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_create_post_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_create_post_params)
     def put(self, request, pk, format=None):
         params = request.data
         invoice_obj = self.get_object(pk=pk)
@@ -361,6 +381,9 @@ class InvoiceDetailView(APIView):
                             data["assigned_to"] = "Please enter valid User"
                             return Response({"error": True}, data)
 
+            create_invoice_history(invoice_obj.id, request.user.id, [])
+            invoice_id = str(invoice_obj.id)
+            transaction.on_commit(lambda: prerender_invoice_pdfs.delay([invoice_id]))
             assigned_to_list = list(
                 invoice_obj.assigned_to.all().values_list("id", flat=True)
             )
@@ -380,9 +403,7 @@ class InvoiceDetailView(APIView):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_delete_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_delete_params)
     def delete(self, request, pk, format=None):
         self.object = self.get_object(pk)
         if self.object.company != request.company:
@@ -407,9 +428,7 @@ class InvoiceDetailView(APIView):
             status=status.HTTP_200_OK,
         )
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_delete_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_delete_params)
     def get(self, request, pk, format=None):
         self.invoice = self.get_object(pk=pk)
         if self.invoice.company != request.company:
@@ -462,9 +481,9 @@ class InvoiceDetailView(APIView):
             {
                 "attachments": AttachmentsSerializer(attachments, many=True).data,
                 "comments": CommentSerializer(comments, many=True).data,
-                "invoice_history": InvoiceHistorySerializer(
-                    self.invoice.invoice_history.all(), many=True
-                ).data,
+                "invoice_history": get_invoice_history([self.invoice.id])[
+                    str(self.invoice.id)
+                ],
                 "accounts": AccountSerializer(
                     self.invoice.accounts.all(), many=True
                 ).data,
@@ -484,9 +503,7 @@ class InvoiceDetailView(APIView):
         )
         return Response(context)
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_detail_post_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_detail_post_params)
     def post(self, request, pk, **kwargs):
         params = request.data
         context = {}
@@ -546,9 +563,7 @@ class InvoiceCommentView(APIView):
     def get_object(self, pk):
         return self.model.objects.get(pk=pk)
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_comment_edit_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_comment_edit_params)
     def put(self, request, pk, format=None):
         params = request.data
         obj = self.get_object(pk)
@@ -577,9 +592,7 @@ class InvoiceCommentView(APIView):
                 }
             )
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_delete_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_delete_params)
     def delete(self, request, pk, format=None):
         self.object = self.get_object(pk)
         if (
@@ -606,9 +619,7 @@ class InvoiceAttachmentView(APIView):
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
 
-    @swagger_auto_schema(
-        tags=["Invoices"], manual_parameters=swagger_params1.invoice_delete_params
-    )
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_delete_params)
     def delete(self, request, pk, format=None):
         self.object = self.model.objects.get(pk=pk)
         if (
@@ -628,3 +639,94 @@ class InvoiceAttachmentView(APIView):
                     "errors": "You don't have permission to perform this action.",
                 }
             )
+
+
+class InvoiceHistoryView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get_invoices(self, invoice_ids):
+        invoices = Invoice.objects.filter(id__in=invoice_ids, org=self.request.profile.org)
+        if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
+            invoices = invoices.filter(
+                Q(created_by=self.request.user) | Q(assigned_to=self.request.user)
+            ).distinct()
+        return invoices
+
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_history_params)
+    def get(self, request, format=None):
+        invoice_ids = [
+            invoice_id
+            for invoice_id in request.query_params.get("invoices", "").split(",")
+            if invoice_id
+        ]
+        if not invoice_ids or not all(_is_uuid(invoice_id) for invoice_id in invoice_ids):
+            return Response(
+                {"error": True, "errors": "Enter a comma separated list of invoice ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(invoice_ids) > INVOICE_HISTORY_BATCH_SIZE:
+            return Response(
+                {
+                    "error": True,
+                    "errors": "At most %s invoices per request."
+                    % INVOICE_HISTORY_BATCH_SIZE,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        invoices = self.get_invoices(invoice_ids).values_list("id", flat=True)
+        return Response(
+            {"error": False, "invoice_history": get_invoice_history(list(invoices))},
+            status=status.HTTP_200_OK,
+        )
+
+
+class InvoiceAsOfView(InvoiceHistoryView):
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_as_of_params)
+    def get(self, request, pk, format=None):
+        timestamp = parse_datetime(request.query_params.get("at", ""))
+        if timestamp is None:
+            return Response(
+                {"error": True, "errors": "Enter a valid ISO 8601 timestamp."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        invoice = _is_uuid(pk) and self.get_invoices([pk]).first()
+        state = invoice_as_of(invoice.id, timestamp) if invoice else None
+        if state is None:
+            return Response(
+                {"error": True, "errors": "Invoice not found at that time."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({"error": False, "invoice": state}, status=status.HTTP_200_OK)
+
+
+class InvoicePdfView(InvoiceHistoryView):
+    @extend_schema(tags=["Invoices"], parameters=swagger_params1.invoice_pdf_params)
+    def get(self, request, pk, format=None):
+        invoice = (
+            _is_uuid(pk)
+            and self.get_invoices([pk])
+            .select_related("from_address", "to_address")
+            .first()
+        )
+        if not invoice:
+            return Response(
+                {"error": True, "errors": "Invoice not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        # rendered ahead by prerender_invoice_pdfs on create and update
+        path = stored_invoice_pdf(invoice)
+        if path is None:
+            invoice_id = str(invoice.id)
+            transaction.on_commit(lambda: prerender_invoice_pdfs.delay([invoice_id]))
+            response = Response(
+                {"error": False, "message": "The PDF is being rendered, retry shortly."},
+                status=status.HTTP_202_ACCEPTED,
+            )
+            response["Retry-After"] = INVOICE_PDF_RETRY_AFTER
+            return response
+        return FileResponse(
+            default_storage.open(path, "rb"),
+            as_attachment=True,
+            filename="Invoice-%s.pdf" % invoice.invoice_number,
+            content_type="application/pdf",
+        )
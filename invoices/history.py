@@ -0,0 +1,160 @@
+"""Delta encoded invoice history.
+
+Every edit of an invoice appends an ``InvoiceChange`` holding the new values
+of the fields that changed only. The first change of an invoice, and then
+every ``INVOICE_SNAPSHOT_INTERVAL`` changes, stores the whole tracked state
+instead, so the state at any point in time is the latest snapshot before it
+with at most that many changes applied on top.
+
+The "Status and Amount Due have changed." descriptions are derived when the
+history is read, from the changed fields and the replayed previous values.
+"""
+import datetime
+
+from django.conf import settings
+
+from invoices.models import InvoiceChange
+
+INVOICE_SNAPSHOT_INTERVAL = getattr(settings, "INVOICE_SNAPSHOT_INTERVAL", 20)
+
+# columns tracked, plus the assigned users
+HISTORY_FIELDS = (
+    "invoice_title",
+    "invoice_number",
+    "from_address_id",
+    "to_address_id",
+    "name",
+    "email",
+    "quantity",
+    "rate",
+    "tax",
+    "total_amount",
+    "currency",
+    "phone",
+    "amount_due",
+    "amount_paid",
+    "is_email_sent",
+    "status",
+    "due_date",
+)
+
+
+def _json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    # Decimal, UUID and PhoneNumber
+    return str(value)
+
+
+def invoice_state(invoice):
+    """The tracked state of ``invoice`` as JSON values."""
+    state = {field: _json(getattr(invoice, field)) for field in HISTORY_FIELDS}
+    state["assigned_to"] = sorted(
+        str(user_id) for user_id in invoice.assigned_to.values_list("id", flat=True)
+    )
+    return state
+
+
+def _replay(changes, state=None):
+    state = dict(state or {})
+    for change in changes:
+        if change.is_snapshot:
+            state = dict(change.diff)
+        else:
+            state.update(change.diff)
+    return state
+
+
+def _changes_since_snapshot(invoice_id, until=None):
+    """Changes from the latest snapshot on, up to ``until`` when given."""
+    changes = InvoiceChange.objects.filter(invoice_id=invoice_id)
+    if until is not None:
+        changes = changes.filter(changed_at__lte=until)
+    snapshot_id = (
+        changes.filter(is_snapshot=True)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if snapshot_id is None:
+        return []
+    return list(changes.filter(id__gte=snapshot_id).order_by("id"))
+
+
+def record_change(invoice, changed_by_id=None):
+    """Log the edits made to ``invoice`` since its last change, if any."""
+    state = invoice_state(invoice)
+    changes = _changes_since_snapshot(invoice.id)
+    if not changes:
+        return InvoiceChange.objects.create(
+            invoice=invoice, changed_by_id=changed_by_id, is_snapshot=True, diff=state
+        )
+    previous = _replay(changes)
+    diff = {
+        field: value
+        for field, value in state.items()
+        if field not in previous or previous[field] != value
+    }
+    if not diff:
+        return None
+    is_snapshot = len(changes) >= INVOICE_SNAPSHOT_INTERVAL
+    return InvoiceChange.objects.create(
+        invoice=invoice,
+        changed_by_id=changed_by_id,
+        is_snapshot=is_snapshot,
+        changed_fields=sorted(diff),
+        diff=state if is_snapshot else diff,
+    )
+
+
+def invoice_as_of(invoice_id, timestamp):
+    """The tracked state of the invoice at ``timestamp``, ``None`` before its
+    first change."""
+    changes = _changes_since_snapshot(invoice_id, until=timestamp)
+    if not changes:
+        return None
+    return _replay(changes)
+
+
+def describe_change(changed_fields):
+    if not changed_fields:
+        return "Invoice Created."
+    names = []
+    for field in changed_fields:
+        if field.endswith("_id"):
+            field = field[: -len("_id")]
+        names.append(" ".join(field.split("_")).title())
+    if len(names) == 1:
+        return names[0] + " has changed."
+    return ", ".join(names[:-1]) + " and " + names[-1] + " have changed."
+
+
+def get_invoice_history(invoice_ids):
+    """The history of several invoices with a single query, as
+    ``{str(invoice_id): [entry, ...]}`` oldest first."""
+    history = {str(invoice_id): [] for invoice_id in invoice_ids}
+    states = {}
+    changes = (
+        InvoiceChange.objects.filter(invoice_id__in=invoice_ids)
+        .select_related("changed_by")
+        .order_by("invoice_id", "id")
+    )
+    for change in changes.iterator():
+        previous = states.get(change.invoice_id, {})
+        state = _replay([change], previous)
+        states[change.invoice_id] = state
+        history[str(change.invoice_id)].append(
+            {
+                "id": change.id,
+                "changed_at": change.changed_at,
+                "changed_by": change.changed_by.email if change.changed_by else None,
+                "changes": {
+                    field: [previous.get(field), state.get(field)]
+                    for field in change.changed_fields
+                },
+                "details": describe_change(change.changed_fields),
+            }
+        )
+    return history
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0015_recordvisibility'),
+        ('invoices', '0002_modify_phone_req'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceNumberSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=16)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('org', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='invoice_number_sequences', to='common.org')),
+            ],
+            options={
+                'verbose_name': 'Invoice Number Sequence',
+                'verbose_name_plural': 'Invoice Number Sequences',
+                'db_table': 'invoice_number_sequence',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='invoicenumbersequence',
+            constraint=models.UniqueConstraint(fields=('org', 'period'), name='invoice_number_sequence_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoicenumbersequence',
+            constraint=models.UniqueConstraint(condition=models.Q(('org__isnull', True)), fields=('period',), name='invoice_number_sequence_no_org_unique'),
+        ),
+    ]
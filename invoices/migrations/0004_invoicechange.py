@@ -0,0 +1,115 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:18
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+SNAPSHOT_INTERVAL = 20
+# see invoices.history.HISTORY_FIELDS, invoice_history has no tax column
+HISTORY_FIELDS = (
+    "invoice_title",
+    "invoice_number",
+    "from_address_id",
+    "to_address_id",
+    "name",
+    "email",
+    "quantity",
+    "rate",
+    "total_amount",
+    "currency",
+    "phone",
+    "amount_due",
+    "amount_paid",
+    "is_email_sent",
+    "status",
+    "due_date",
+)
+
+
+def _json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+def convert_invoice_history(apps, schema_editor):
+    """Rewrite the full copies of invoice_history as delta encoded changes."""
+    InvoiceHistory = apps.get_model("invoices", "InvoiceHistory")
+    InvoiceChange = apps.get_model("invoices", "InvoiceChange")
+    rows = (
+        InvoiceHistory.objects.select_related("invoice")
+        .prefetch_related("assigned_to")
+        .order_by("invoice_id", "created_at")
+    )
+    changes = []
+    invoice_id = previous = None
+    since_snapshot = 0
+    for row in rows.iterator(chunk_size=500):
+        state = {field: _json(getattr(row, field)) for field in HISTORY_FIELDS}
+        state["tax"] = _json(row.invoice.tax)
+        state["assigned_to"] = sorted(str(user.id) for user in row.assigned_to.all())
+        if row.invoice_id != invoice_id:
+            invoice_id, since_snapshot = row.invoice_id, 0
+            is_snapshot, changed_fields = True, []
+        else:
+            changed_fields = sorted(
+                field for field, value in state.items() if previous.get(field) != value
+            )
+            if not changed_fields:
+                continue
+            is_snapshot = since_snapshot >= SNAPSHOT_INTERVAL
+        if is_snapshot:
+            since_snapshot = 0
+        since_snapshot += 1
+        changes.append(
+            InvoiceChange(
+                invoice_id=row.invoice_id,
+                changed_at=row.created_at,
+                changed_by_id=row.updated_by_id,
+                is_snapshot=is_snapshot,
+                changed_fields=changed_fields,
+                diff=state
+                if is_snapshot
+                else {field: state[field] for field in changed_fields},
+            )
+        )
+        previous = state
+        if len(changes) >= 500:
+            InvoiceChange.objects.bulk_create(changes)
+            changes = []
+    InvoiceChange.objects.bulk_create(changes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0003_invoicenumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('changed_fields', models.JSONField(default=list)),
+                ('diff', models.JSONField(default=dict)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_changes', to=settings.AUTH_USER_MODEL)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='invoices.invoice')),
+            ],
+            options={
+                'verbose_name': 'Invoice Change',
+                'verbose_name_plural': 'Invoice Changes',
+                'db_table': 'invoice_change',
+                'indexes': [models.Index(fields=['invoice', 'changed_at'], name='invoice_change_invoice_idx')],
+            },
+        ),
+        migrations.RunPython(convert_invoice_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_numbers(apps, schema_editor):
+    """Refuse to add the constraints while numbers are used twice, they have
+    to be renumbered by hand first."""
+    Invoice = apps.get_model("invoices", "Invoice")
+    duplicates = list(
+        Invoice.objects.values("org_id", "invoice_number")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .order_by("org_id", "invoice_number")[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Invoice numbers used more than once, renumber them before "
+            "migrating: %s"
+            % ", ".join(
+                "%s (org %s)" % (row["invoice_number"], row["org_id"])
+                for row in duplicates
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_invoicechange'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_numbers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('org', 'invoice_number'), name='invoice_number_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('org__isnull', True)), fields=('invoice_number',), name='invoice_number_no_org_unique'),
+        ),
+    ]
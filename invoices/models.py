@@ -1,7 +1,6 @@
-import datetime
-
 import arrow
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -75,6 +74,17 @@ class Invoice(BaseModel):
         verbose_name_plural = "Invoices"
         db_table = "invoice"
         ordering = ("-created_at",)
+        # numbers are allocated by invoices.numbering, enforced here
+        constraints = [
+            models.UniqueConstraint(
+                fields=["org", "invoice_number"], name="invoice_number_unique"
+            ),
+            models.UniqueConstraint(
+                fields=["invoice_number"],
+                condition=models.Q(org__isnull=True),
+                name="invoice_number_no_org_unique",
+            ),
+        ]
 
     def __str__(self):
         """Unicode representation of Invoice."""
@@ -83,18 +93,13 @@ class Invoice(BaseModel):
     def save(self, *args, **kwargs):
         if not self.invoice_number:
             self.invoice_number = self.invoice_id_generator()
-            while Invoice.objects.filter(invoice_number=self.invoice_number).exists():
-                self.invoice_number = self.invoice_id_generator(
-                    prev_invoice_number=self.invoice_number
-                )
         super(Invoice, self).save(*args, **kwargs)
 
-    def invoice_id_generator(self, prev_invoice_number=None):
-        if prev_invoice_number:
-            prev_invoice_number += 1
-            return prev_invoice_number
-        date = datetime.datetime.now().strftime("%d%m%Y")
-        return int(date + "0001")
+    def invoice_id_generator(self):
+        # imported here, invoices.numbering imports this module
+        from invoices.numbering import reserve_invoice_numbers
+
+        return reserve_invoice_numbers(self.org_id)[0]
 
     def formatted_total_amount(self):
         return self.currency + " " + str(self.total_amount)
@@ -153,9 +158,77 @@ class Invoice(BaseModel):
         return User.objects.filter(id__in=list(user_ids))
 
 
+class InvoiceNumberSequence(models.Model):
+    """Last invoice number handed out to an org for a period, see
+    ``invoices.numbering``. ``org`` is empty for invoices without an org."""
+
+    org = models.ForeignKey(
+        Org,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="invoice_number_sequences",
+    )
+    period = models.CharField(max_length=16)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Invoice Number Sequence"
+        verbose_name_plural = "Invoice Number Sequences"
+        db_table = "invoice_number_sequence"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["org", "period"], name="invoice_number_sequence_unique"
+            ),
+            models.UniqueConstraint(
+                fields=["period"],
+                condition=models.Q(org__isnull=True),
+                name="invoice_number_sequence_no_org_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.period}: {self.last_value}"
+
+
+class InvoiceChange(models.Model):
+    """One edit of an invoice, see ``invoices.history``. ``diff`` holds the new
+    values of ``changed_fields`` only, or the whole state on snapshots."""
+
+    invoice = models.ForeignKey(
+        Invoice, on_delete=models.CASCADE, related_name="changes"
+    )
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="invoice_changes",
+    )
+    is_snapshot = models.BooleanField(default=False)
+    changed_fields = models.JSONField(default=list)
+    diff = models.JSONField(default=dict)
+
+    class Meta:
+        verbose_name = "Invoice Change"
+        verbose_name_plural = "Invoice Changes"
+        db_table = "invoice_change"
+        indexes = [
+            models.Index(
+                fields=["invoice", "changed_at"], name="invoice_change_invoice_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice_id} {self.changed_at}"
+
+
 class InvoiceHistory(BaseModel):
     """Model definition for InvoiceHistory.
-    This model is used to track/keep a record of the updates made to original invoice object."""
+    This model is used to track/keep a record of the updates made to original invoice object.
+
+    Superseded by ``InvoiceChange``, no longer written to."""
 
     INVOICE_STATUS = (
         ("Draft", "Draft"),
@@ -0,0 +1,93 @@
+"""Invoice number allocation.
+
+Invoice numbers are the day they are issued on followed by a counter,
+``ddmmYYYY0001``, per org. Numbers come from ``reserve_invoice_numbers``,
+which hands out a block of any size in constant time:
+
+* ``"database"`` (default): one ``InvoiceNumberSequence`` row per org and day,
+  bumped with a single ``UPDATE ... SET last_value = last_value + n``. The row
+  lock serialises concurrent writers of the same org and day only, until the
+  surrounding transaction ends, and a rolled back transaction gives its
+  numbers back.
+* ``"redis"``: ``INCRBY`` on the shared cache, which never blocks but leaves a
+  gap for numbers reserved by a rolled back transaction. Requires a cache that
+  doesn't evict, e.g. Redis without an eviction policy.
+
+Either way the sequence of a period starts after the highest number already
+issued for it, so switching over from the old generator or between backends
+never reissues a number.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from invoices.models import Invoice, InvoiceNumberSequence
+
+INVOICE_NUMBER_BACKEND = getattr(settings, "INVOICE_NUMBER_BACKEND", "database")
+INVOICE_NUMBER_DIGITS = 4
+INVOICE_NUMBER_CACHE_TTL = 60 * 60 * 24 * 2
+
+
+def current_period():
+    return timezone.localdate().strftime("%d%m%Y")
+
+
+def format_invoice_number(period, value):
+    return "%s%0*d" % (period, INVOICE_NUMBER_DIGITS, value)
+
+
+def _issued(org_id, period):
+    """Highest counter already used by an invoice of the period."""
+    numbers = Invoice.objects.filter(
+        org_id=org_id, invoice_number__startswith=period
+    ).values_list("invoice_number", flat=True)
+    counters = [
+        int(number[len(period) :])
+        for number in numbers
+        if number[len(period) :].isdigit()
+    ]
+    return max(counters, default=0)
+
+
+def _reserve_in_database(org_id, period, count):
+    sequences = InvoiceNumberSequence.objects.filter(org_id=org_id, period=period)
+    with transaction.atomic():
+        if not sequences.update(last_value=F("last_value") + count):
+            try:
+                with transaction.atomic():
+                    InvoiceNumberSequence.objects.create(
+                        org_id=org_id,
+                        period=period,
+                        last_value=_issued(org_id, period) + count,
+                    )
+            except IntegrityError:
+                # created concurrently by another writer
+                sequences.update(last_value=F("last_value") + count)
+        return sequences.values_list("last_value", flat=True).get()
+
+
+def _reserve_in_cache(org_id, period, count):
+    key = "invoice-number:%s:%s" % (org_id or "", period)
+    try:
+        return cache.incr(key, count)
+    except ValueError:
+        # first number of the period, only one writer gets to seed the counter
+        cache.add(key, _issued(org_id, period), INVOICE_NUMBER_CACHE_TTL)
+        return cache.incr(key, count)
+
+
+def reserve_invoice_numbers(org_id, count=1, period=None):
+    """Reserve ``count`` consecutive invoice numbers of ``org_id`` for
+    ``period``, today by default, e.g. to number a batch of invoices before
+    a ``bulk_create``."""
+    period = period or current_period()
+    if INVOICE_NUMBER_BACKEND == "redis":
+        last_value = _reserve_in_cache(org_id, period, count)
+    else:
+        last_value = _reserve_in_database(org_id, period, count)
+    return [
+        format_invoice_number(period, value)
+        for value in range(last_value - count + 1, last_value + 1)
+    ]
@@ -0,0 +1,96 @@
+"""Cached invoice PDFs.
+
+Turning ``invoice_download_pdf.html`` into a PDF runs wkhtmltopdf and takes
+about a second, while rendering the HTML itself is cheap. The PDF is stored
+under the SHA-256 of its HTML, ``invoice_pdfs/<hash>.pdf`` in the default
+storage, so it is only converted again once something printed on the invoice
+changed, and identical documents share one file whichever path asked first:
+``send_invoice_email`` or ``prerender_invoice_pdfs``. The download endpoint
+never converts within the request, it streams the stored PDF or queues
+``prerender_invoice_pdfs`` and answers 202 for the client to retry.
+
+``render_invoice_pdfs`` converts the missing PDFs of a batch concurrently.
+Each conversion is a wkhtmltopdf child process, so a pool of threads waiting
+on them keeps ``INVOICE_PDF_WORKERS`` processes busy; a multiprocessing pool
+can't be started from the daemonic Celery worker processes anyway.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+
+from invoices.models import Invoice
+
+INVOICE_PDF_TEMPLATE = "invoice_download_pdf.html"
+INVOICE_PDF_DIRECTORY = "invoice_pdfs"
+INVOICE_PDF_WORKERS = getattr(settings, "INVOICE_PDF_WORKERS", 4)
+INVOICE_PDF_OPTIONS = {"encoding": "UTF-8", "quiet": ""}
+
+
+def html_to_pdf(html):
+    """Convert ``html`` with wkhtmltopdf, through the optional pdfkit."""
+    try:
+        import pdfkit
+    except ImportError:
+        raise ImproperlyConfigured("Install pdfkit and wkhtmltopdf to render PDFs.")
+    return pdfkit.from_string(html, False, options=INVOICE_PDF_OPTIONS)
+
+
+def invoice_html(invoice):
+    return render_to_string(INVOICE_PDF_TEMPLATE, context={"invoice": invoice})
+
+
+def pdf_path(html):
+    digest = hashlib.sha256(html.encode("utf-8")).hexdigest()
+    return "%s/%s.pdf" % (INVOICE_PDF_DIRECTORY, digest)
+
+
+def _invoices(invoice_ids):
+    return Invoice.objects.filter(id__in=invoice_ids).select_related(
+        "from_address", "to_address"
+    )
+
+
+def render_invoice_pdfs(invoices, renderer=html_to_pdf):
+    """Storage paths of the PDFs of ``invoices``, as ``{invoice_id: path}``,
+    converting the ones not stored yet."""
+    paths = {}
+    missing = {}
+    for invoice in invoices:
+        html = invoice_html(invoice)
+        path = pdf_path(html)
+        paths[invoice.id] = path
+        if path not in missing and not default_storage.exists(path):
+            missing[path] = html
+    if len(missing) > 1:
+        with ThreadPoolExecutor(
+            max_workers=min(INVOICE_PDF_WORKERS, len(missing))
+        ) as executor:
+            pdfs = list(executor.map(renderer, missing.values()))
+    else:
+        pdfs = [renderer(html) for html in missing.values()]
+    for path, pdf in zip(missing, pdfs):
+        # unless stored concurrently by another worker meanwhile
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(pdf))
+    return paths
+
+
+def stored_invoice_pdf(invoice):
+    """Storage path of the PDF of ``invoice`` if already rendered, else
+    None."""
+    path = pdf_path(invoice_html(invoice))
+    return path if default_storage.exists(path) else None
+
+
+def get_invoice_pdf(invoice, renderer=html_to_pdf):
+    """Storage path of the PDF of ``invoice``, rendered if needed."""
+    return render_invoice_pdfs([invoice], renderer=renderer)[invoice.id]
+
+
+def prerender_invoices(invoice_ids, renderer=html_to_pdf):
+    return render_invoice_pdfs(_invoices(invoice_ids), renderer=renderer)
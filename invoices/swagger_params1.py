@@ -1,7 +1,7 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 
-organization_params_in_header = organization_params_in_header = OpenApiParameter(
+organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
 
@@ -10,70 +10,86 @@ organization_params = [
 ]
 
 invoice_list_get_params = [
-    organization_params,
+    organization_params_in_header,
     OpenApiParameter(
-        "invoice_title_or_number",OpenApiParameter.QUERY, OpenApiTypes.STR
+        "invoice_title_or_number", OpenApiTypes.STR, OpenApiParameter.QUERY
     ),
-    OpenApiParameter("created_by",OpenApiParameter.QUERY, OpenApiTypes.INT),
-    OpenApiParameter("assigned_users",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("status",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("total_amount",OpenApiParameter.QUERY, OpenApiTypes.STR),
+    OpenApiParameter("created_by", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("assigned_users", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("status", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("total_amount", OpenApiTypes.STR, OpenApiParameter.QUERY),
 ]
 
 invoice_detail_post_params = [
-    organization_params,
+    organization_params_in_header,
     OpenApiParameter(
-        "invoice_attachment",
-       OpenApiParameter.QUERY,
-        type=openapi.TYPE_FILE,
+        "invoice_attachment", OpenApiTypes.BINARY, OpenApiParameter.QUERY
     ),
-    OpenApiParameter("comment",OpenApiParameter.QUERY, OpenApiTypes.STR),
+    OpenApiParameter("comment", OpenApiTypes.STR, OpenApiParameter.QUERY),
 ]
 
 invoice_delete_params = [
-    organization_params,
+    organization_params_in_header,
 ]
 
 invoice_create_post_params = [
-    organization_params,
+    organization_params_in_header,
     OpenApiParameter(
-        "invoice_title",OpenApiParameter.QUERY,  OpenApiTypes.STR, required=True,
+        "invoice_title", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True
     ),
-    OpenApiParameter("status",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_address_line",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_street",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_city",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_state",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_postcode",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("from_country",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_address_line",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_street",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_city",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_state",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_postcode",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("to_country",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("name",OpenApiParameter.QUERY, OpenApiTypes.STR),
+    OpenApiParameter("status", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_address_line", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_street", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_city", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_state", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_postcode", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("from_country", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_address_line", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_street", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_city", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_state", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_postcode", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("to_country", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("name", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter(
-        "email",OpenApiParameter.QUERY,  OpenApiTypes.STR, required=True,
+        "email", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True
     ),
-    OpenApiParameter("phone",OpenApiParameter.QUERY, OpenApiTypes.STR),
+    OpenApiParameter("phone", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("due_date", OpenApiTypes.DATE, OpenApiParameter.QUERY),
     OpenApiParameter(
-        "due_date",OpenApiParameter.QUERY, type=openapi.FORMAT_DATE, example="2021-02-28"
+        "currency", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True
     ),
+    OpenApiParameter("teams", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("assigned_to", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("accounts", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter("quality_hours", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("rate", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("tax", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("total_amount", OpenApiTypes.INT, OpenApiParameter.QUERY),
+    OpenApiParameter("details", OpenApiTypes.STR, OpenApiParameter.QUERY),
+]
+
+invoice_comment_edit_params = [
+    organization_params_in_header,
+    OpenApiParameter("comment", OpenApiTypes.STR, OpenApiParameter.QUERY),
+]
+
+invoice_history_params = [
+    organization_params_in_header,
     OpenApiParameter(
-        "currency",OpenApiParameter.QUERY, OpenApiTypes.STR,required=True,
+        "invoices",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        required=True,
+        description="Comma separated invoice ids",
     ),
-    OpenApiParameter("teams",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("assigned_to",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("accounts",OpenApiParameter.QUERY, OpenApiTypes.STR),
-    OpenApiParameter("quality_hours",OpenApiParameter.QUERY, OpenApiTypes.INT),
-    OpenApiParameter("rate",OpenApiParameter.QUERY, OpenApiTypes.INT),
-    OpenApiParameter("tax",OpenApiParameter.QUERY, OpenApiTypes.INT),
-    OpenApiParameter("total_amount",OpenApiParameter.QUERY, OpenApiTypes.INT),
-    OpenApiParameter("details",OpenApiParameter.QUERY, OpenApiTypes.STR),
 ]
 
-invoice_comment_edit_params = [
-    organization_params,
-    OpenApiParameter("comment",OpenApiParameter.QUERY, OpenApiTypes.STR),
+invoice_as_of_params = [
+    organization_params_in_header,
+    OpenApiParameter("at", OpenApiTypes.DATETIME, OpenApiParameter.QUERY, required=True),
+]
+
+invoice_pdf_params = [
+    organization_params_in_header,
 ]
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common.models import Org, Profile, User
+from invoices import history
+from invoices.models import Invoice, InvoiceChange
+
+
+class InvoiceChangeHistoryTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="invoice org")
+        self.user = User.objects.create(email="johnInvoiceHistory@example.com")
+        self.invoice = Invoice.objects.create(
+            invoice_title="invoice",
+            name="name",
+            email="invoice@example.com",
+            status="Draft",
+            org=self.org,
+        )
+        history.record_change(self.invoice, self.user.id)
+
+    def edit(self, **fields):
+        for field, value in fields.items():
+            setattr(self.invoice, field, value)
+        self.invoice.save()
+        return history.record_change(self.invoice, self.user.id)
+
+    def test_only_changed_fields_are_stored(self):
+        change = self.edit(status="Sent", amount_due=Decimal("10.50"))
+        self.assertFalse(change.is_snapshot)
+        self.assertEqual(change.diff, {"amount_due": "10.50", "status": "Sent"})
+        self.assertIsNone(history.record_change(self.invoice, self.user.id))
+
+        entries = history.get_invoice_history([self.invoice.id])[str(self.invoice.id)]
+        self.assertEqual(
+            [entry["details"] for entry in entries],
+            ["Invoice Created.", "Amount Due and Status have changed."],
+        )
+        self.assertEqual(entries[1]["changes"]["status"], ["Draft", "Sent"])
+
+    def test_state_as_of(self):
+        created = self.invoice.changes.get()
+        InvoiceChange.objects.filter(pk=created.pk).update(
+            changed_at=timezone.now() - timedelta(days=2)
+        )
+        for index in range(history.INVOICE_SNAPSHOT_INTERVAL + 2):
+            self.edit(name="name %s" % index)
+        self.assertEqual(
+            self.invoice.changes.filter(is_snapshot=True).count(), 2
+        )
+
+        state = history.invoice_as_of(
+            self.invoice.id, timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(state["name"], "name")
+        state = history.invoice_as_of(self.invoice.id, timezone.now())
+        self.assertEqual(
+            state["name"], "name %s" % (history.INVOICE_SNAPSHOT_INTERVAL + 1)
+        )
+        self.assertIsNone(
+            history.invoice_as_of(self.invoice.id, timezone.now() - timedelta(days=3))
+        )
+
+    def test_history_endpoint(self):
+        self.edit(status="Sent")
+        Profile.objects.create(
+            user=self.user, org=self.org, role="ADMIN", is_active=True
+        )
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = client.get(
+            "/api/invoices/history/", {"invoices": str(self.invoice.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        entries = response.data["invoice_history"][str(self.invoice.id)]
+        self.assertEqual(
+            [entry["details"] for entry in entries],
+            ["Invoice Created.", "Status has changed."],
+        )
+
+        response = client.get("/api/invoices/history/", {"invoices": "nope"})
+        self.assertEqual(response.status_code, 400)
+        # the legacy invoice views aren't mounted
+        self.assertEqual(client.get("/api/invoices/").status_code, 404)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import TestCase
+
+from common.models import Org
+from invoices import numbering
+from invoices.models import Invoice
+
+
+class InvoiceNumberAllocatorTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="invoice org")
+        self.period = numbering.current_period()
+
+    def create_invoice(self, org, **kwargs):
+        return Invoice.objects.create(
+            invoice_title="invoice",
+            name="name",
+            email="invoice@example.com",
+            org=org,
+            **kwargs
+        )
+
+    def test_numbers_are_sequential_per_org(self):
+        self.assertEqual(
+            self.create_invoice(self.org).invoice_number, self.period + "0001"
+        )
+        self.assertEqual(
+            self.create_invoice(self.org).invoice_number, self.period + "0002"
+        )
+        other_org = Org.objects.create(name="other org")
+        self.assertEqual(
+            self.create_invoice(other_org).invoice_number, self.period + "0001"
+        )
+        self.assertEqual(
+            numbering.reserve_invoice_numbers(self.org.id, count=3),
+            [self.period + "0003", self.period + "0004", self.period + "0005"],
+        )
+        self.assertEqual(
+            self.create_invoice(self.org).invoice_number, self.period + "0006"
+        )
+
+    def test_sequence_starts_after_issued_numbers(self):
+        self.create_invoice(self.org, invoice_number=self.period + "0041")
+        self.assertEqual(
+            self.create_invoice(self.org).invoice_number, self.period + "0042"
+        )
+
+    def test_cache_backend(self):
+        cache.clear()
+        self.create_invoice(self.org, invoice_number=self.period + "0007")
+        with mock.patch.object(numbering, "INVOICE_NUMBER_BACKEND", "redis"):
+            self.assertEqual(
+                numbering.reserve_invoice_numbers(self.org.id, count=2),
+                [self.period + "0008", self.period + "0009"],
+            )
+            self.assertEqual(
+                self.create_invoice(self.org).invoice_number, self.period + "0010"
+            )
+
+    def test_numbers_are_unique_per_org(self):
+        self.create_invoice(self.org, invoice_number=self.period + "0001")
+        other_org = Org.objects.create(name="other org")
+        self.create_invoice(other_org, invoice_number=self.period + "0001")
+        with self.assertRaises(IntegrityError):
+            self.create_invoice(self.org, invoice_number=self.period + "0001")
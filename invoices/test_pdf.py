@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common.models import Org, Profile, User
+from invoices import pdf, tasks
+from invoices.models import Invoice
+
+
+class InvoicePdfCacheTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.org = Org.objects.create(name="invoice org")
+        self.invoices = [
+            Invoice.objects.create(
+                invoice_title="invoice %s" % index,
+                name="name",
+                email="invoice@example.com",
+                currency="USD",
+                total_amount=Decimal("100.00"),
+                org=self.org,
+            )
+            for index in range(3)
+        ]
+        self.rendered = []
+
+    def renderer(self, html):
+        self.rendered.append(html)
+        return b"%PDF-" + html.encode("utf-8")
+
+    def test_pdfs_are_rendered_once_per_content(self):
+        ids = [invoice.id for invoice in self.invoices]
+        paths = pdf.prerender_invoices(ids, renderer=self.renderer)
+        self.assertEqual(len(self.rendered), 3)
+        self.assertEqual(len(set(paths.values())), 3)
+        self.assertEqual(pdf.prerender_invoices(ids, renderer=self.renderer), paths)
+        self.assertEqual(len(self.rendered), 3)
+
+        invoice = self.invoices[0]
+        invoice.name = "other name"
+        invoice.save()
+        path = pdf.get_invoice_pdf(invoice, renderer=self.renderer)
+        self.assertEqual(len(self.rendered), 4)
+        self.assertNotEqual(path, paths[invoice.id])
+        with default_storage.open(path, "rb") as stored:
+            self.assertIn(b"other name", stored.read())
+
+    def test_download_queues_missing_pdfs(self):
+        invoice = self.invoices[0]
+        user = User.objects.create(email="johnInvoicePdf@example.com")
+        Profile.objects.create(user=user, org=self.org, role="ADMIN", is_active=True)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s" % RefreshToken.for_user(user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        url = "/api/invoices/%s/pdf/" % invoice.id
+        with mock.patch.object(tasks.prerender_invoice_pdfs, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.get(url)
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with([str(invoice.id)])
+        self.assertEqual(self.rendered, [])
+
+        pdf.prerender_invoices([invoice.id], renderer=self.renderer)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF-"))
@@ -0,0 +1,147 @@
+"""Conversion of leads to accounts.
+
+``convert_leads`` turns any number of leads of an org into accounts in one
+transaction and a constant number of statements per batch of
+``LEAD_CONVERSION_BATCH_SIZE`` leads: the accounts are inserted with
+``bulk_create``, the comments and attachments of the leads re-parented with
+one ``UPDATE`` each, the tags, assignees and teams copied with inserts into
+the through tables of the accounts, and the leads marked converted with one
+more ``UPDATE``. Leads already having an account are left as they are, so
+converting twice doesn't duplicate accounts.
+
+None of this sends model signals; the search documents, visibility and
+cached lists are refreshed per batch and a reconcile of the dashboard
+counters of the org queued once done. Selections of more than ``LEAD_CONVERSION_SYNC_LIMIT``
+leads are converted by the ``convert_leads`` task instead of the request.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from accounts.models import Account
+from common import list_cache
+from common.dashboard import queue_reconcile
+from common.models import Attachments, Comment
+from common.search import index_records
+from common.visibility import refresh_records
+from leads.models import Lead
+
+logger = logging.getLogger(__name__)
+
+LEAD_CONVERSION_BATCH_SIZE = getattr(settings, "LEAD_CONVERSION_BATCH_SIZE", 500)
+LEAD_CONVERSION_SYNC_LIMIT = getattr(settings, "LEAD_CONVERSION_SYNC_LIMIT", 100)
+
+# many to many fields of the lead copied to the account of the same name
+COPIED_RELATIONS = ("tags", "assigned_to", "teams")
+
+
+def build_account(lead, user):
+    """Unsaved account of ``lead``."""
+    contact_name = " ".join(
+        name for name in (lead.first_name, lead.last_name) if name
+    )
+    return Account(
+        created_by=user,
+        name=(lead.account_name or lead.organization or lead.title or "")[:64],
+        email=lead.email or "",
+        phone=lead.phone,
+        contact_name=contact_name[:120],
+        billing_address_line=lead.address_line_1,
+        billing_street=lead.address_line_2,
+        billing_city=lead.city,
+        billing_state=lead.state,
+        billing_postcode=lead.postcode,
+        billing_country=lead.country,
+        website=lead.website,
+        description=lead.description,
+        industry=lead.industry,
+        lead=lead,
+        org_id=lead.org_id,
+        is_active=True,
+    )
+
+
+def _copy_relations(accounts):
+    """Copy the many to many rows of the leads of ``accounts`` to them."""
+    account_ids = {account.lead_id: account.id for account in accounts}
+    for name in COPIED_RELATIONS:
+        lead_field = Lead._meta.get_field(name)
+        account_field = Account._meta.get_field(name)
+        rows = lead_field.remote_field.through.objects.filter(
+            **{lead_field.m2m_field_name() + "_id__in": list(account_ids)}
+        ).values_list(
+            lead_field.m2m_field_name() + "_id",
+            lead_field.m2m_reverse_field_name() + "_id",
+        )
+        through = account_field.remote_field.through
+        through.objects.bulk_create(
+            [
+                through(
+                    **{
+                        account_field.m2m_field_name() + "_id": account_ids[lead_id],
+                        account_field.m2m_reverse_field_name() + "_id": related_id,
+                    }
+                )
+                for lead_id, related_id in rows
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def _convert_batch(lead_ids, user):
+    """Convert the leads of ``lead_ids`` that have no account yet, returns
+    their accounts."""
+    converted = Account.objects.filter(lead_id__in=lead_ids).values("lead_id")
+    leads = list(
+        Lead.objects.select_for_update()
+        .filter(id__in=lead_ids)
+        .exclude(id__in=converted)
+        .order_by()
+    )
+    if not leads:
+        return []
+    accounts = Account.objects.bulk_create(
+        [build_account(lead, user) for lead in leads]
+    )
+    batch_ids = [lead.id for lead in leads]
+    account_of_lead = Subquery(
+        Account.objects.filter(lead_id=OuterRef("lead_id"))
+        .order_by("-created_at")
+        .values("id")[:1]
+    )
+    Comment.objects.filter(lead_id__in=batch_ids).update(account_id=account_of_lead)
+    Attachments.objects.filter(lead_id__in=batch_ids).update(
+        account_id=account_of_lead
+    )
+    _copy_relations(accounts)
+    Lead.objects.filter(id__in=batch_ids).update(status="converted")
+    return accounts
+
+
+def convert_leads(lead_ids, org, user, batch_size=LEAD_CONVERSION_BATCH_SIZE):
+    """Convert the leads of ``org`` with the given ids to accounts created
+    by ``user``, returns the ids of the accounts created."""
+    lead_ids = list(
+        Lead.objects.filter(id__in=lead_ids, org=org).values_list("id", flat=True)
+    )
+    account_ids = []
+    with transaction.atomic():
+        for start in range(0, len(lead_ids), batch_size):
+            batch = lead_ids[start : start + batch_size]
+            accounts = _convert_batch(batch, user)
+            if not accounts:
+                continue
+            created = [account.id for account in accounts]
+            # bulk writes don't send the signals indexing the records
+            index_records("accounts", Account.objects.filter(id__in=created))
+            refresh_records("accounts", created)
+            account_ids.extend(created)
+    if account_ids:
+        list_cache.invalidate("leads", org.id)
+        queue_reconcile(org.id)
+    logger.info(
+        "converted %s of %s leads of org %s", len(account_ids), len(lead_ids), org.id
+    )
+    return account_ids
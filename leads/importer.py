@@ -0,0 +1,232 @@
+"""Streaming CSV import of leads.
+
+The upload is stored once on a ``LeadImport`` and parsed incrementally by the
+``import_leads_from_file`` task, so neither the web process nor the broker ever
+holds the whole file. Rows are checked against an in-memory index of the
+titles and emails already present in the org, inserted with ``bulk_create`` in
+batches of ``LEAD_IMPORT_BATCH_SIZE`` (one transaction per batch) and every
+rejected row is written, with the reason, to a failed-rows CSV attached to the
+job once the import finishes.
+"""
+import codecs
+import csv
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from common import dedupe, list_cache
+from common.search import index_records
+from common.utils import COUNTRIES, LEAD_STATUS
+from common.visibility import refresh_records
+from leads.models import Lead, LeadImport
+
+LEAD_IMPORT_BATCH_SIZE = getattr(settings, "LEAD_IMPORT_BATCH_SIZE", 1000)
+REQUIRED_HEADERS = ("title",)
+SNIFF_SIZE = 64 * 1024
+
+COUNTRY_CODES = {code for code, _ in COUNTRIES}
+STATUS_VALUES = {value for value, _ in LEAD_STATUS}
+
+
+class CountingReader(object):
+    """Binary file wrapper keeping track of how many bytes were read."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def detect_encoding(sample, final=True):
+    """Best guess of the encoding of ``sample``, the first bytes of a file.
+    ``final`` is False when the file continues after the sample."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # not final: a character cut in half by the end of the sample is fine
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=final)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "iso-8859-1"
+
+
+def normalise_headers(row):
+    return [header.strip().lower() for header in row]
+
+
+def read_headers(fileobj):
+    """Return ``(encoding, headers)`` of an uploaded CSV without reading it
+    all, raising ``ValueError`` when a required header is missing."""
+    sample = fileobj.read(SNIFF_SIZE)
+    fileobj.seek(0)
+    encoding = detect_encoding(sample, final=len(sample) < SNIFF_SIZE)
+    reader = csv.reader(io.StringIO(sample.decode(encoding, errors="replace")))
+    headers = normalise_headers(next(reader, []))
+    missing_headers = [name for name in REQUIRED_HEADERS if name not in headers]
+    if missing_headers:
+        raise ValueError("Missing headers: %s" % ", ".join(missing_headers))
+    return encoding, headers
+
+
+def load_dedupe_index(org):
+    """Titles and lower cased emails of the leads already in ``org``."""
+    titles = set()
+    emails = set()
+    rows = Lead.objects.filter(org=org).values_list("title", "email")
+    for title, email in rows.iterator(chunk_size=5000):
+        titles.add(title)
+        if email:
+            emails.add(email.lower())
+    return titles, emails
+
+
+def validate_row(row):
+    """Return the reason ``row`` can't be imported, or None."""
+    if not row.get("title"):
+        return "title is required"
+    if row.get("email"):
+        try:
+            validate_email(row["email"])
+        except ValidationError:
+            return "invalid email"
+    return None
+
+
+def build_lead(row, org, user):
+    country = row.get("country", "").upper()
+    status = row.get("status", "").lower()
+    return Lead(
+        title=row["title"][:64],
+        first_name=row.get("first name", "")[:255],
+        last_name=row.get("last name", "")[:255],
+        website=row.get("website", "")[:255] or None,
+        email=row.get("email") or None,
+        phone=row.get("phone", "")[:15] or None,
+        address_line_1=row.get("address", "")[:255] or None,
+        city=row.get("city", "")[:255] or None,
+        state=row.get("state", "")[:255] or None,
+        postcode=row.get("postcode", "")[:64] or None,
+        country=country if country in COUNTRY_CODES else None,
+        description=row.get("description") or None,
+        status=status if status in STATUS_VALUES else None,
+        account_name=row.get("account_name", "")[:255] or None,
+        org=org,
+        created_by=user,
+    )
+
+
+def import_leads(lead_import, batch_size=LEAD_IMPORT_BATCH_SIZE):
+    """Run ``lead_import`` to completion, recording progress on the way."""
+    LeadImport.objects.filter(pk=lead_import.pk).update(
+        status=LeadImport.STATUS_RUNNING, started_at=timezone.now()
+    )
+    lead_import.refresh_from_db()
+    try:
+        _import_leads(lead_import, batch_size)
+    except Exception as e:
+        LeadImport.objects.filter(pk=lead_import.pk).update(
+            status=LeadImport.STATUS_FAILED, error=str(e), finished_at=timezone.now()
+        )
+        raise
+    finally:
+        lead_import.file.close()
+    # BaseModel.save() would clear created_by outside of a request
+    LeadImport.objects.filter(pk=lead_import.pk).update(
+        status=LeadImport.STATUS_COMPLETED,
+        finished_at=timezone.now(),
+        failed_rows_file=lead_import.failed_rows_file.name or None,
+    )
+    lead_import.refresh_from_db()
+    return lead_import
+
+
+def _import_leads(lead_import, batch_size):
+    org = lead_import.org
+    user = lead_import.created_by
+    titles, emails = load_dedupe_index(org)
+
+    lead_import.file.open("rb")
+    encoding, headers = read_headers(lead_import.file)
+    source = CountingReader(lead_import.file)
+    reader = csv.reader(codecs.getreader(encoding)(source, errors="replace"))
+    next(reader, None)
+
+    failed_file = tempfile.TemporaryFile()
+    failed_writer_stream = io.TextIOWrapper(failed_file, encoding="utf-8", newline="")
+    failed_writer = csv.writer(failed_writer_stream)
+    failed_writer.writerow(headers + ["error"])
+
+    stats = {
+        "processed_rows": 0,
+        "created_rows": 0,
+        "duplicate_rows": 0,
+        "failed_rows": 0,
+    }
+    batch = []
+
+    def flush():
+        if batch:
+            with transaction.atomic():
+                Lead.objects.bulk_create(batch, batch_size=batch_size)
+                # bulk_create doesn't send the signals indexing new records
+                lead_ids = [lead.id for lead in batch]
+                index_records("leads", Lead.objects.filter(id__in=lead_ids))
+                dedupe.index_records("leads", Lead.objects.filter(id__in=lead_ids))
+                refresh_records("leads", lead_ids)
+                list_cache.invalidate("leads", lead_import.org_id)
+            stats["created_rows"] += len(batch)
+            del batch[:]
+        LeadImport.objects.filter(pk=lead_import.pk).update(
+            encoding=encoding, bytes_processed=source.bytes_read, **stats
+        )
+
+    for cells in reader:
+        if not any(cell.strip() for cell in cells):
+            continue
+        row = {
+            header: cell.strip() for header, cell in zip(headers, cells) if header
+        }
+        stats["processed_rows"] += 1
+        error = validate_row(row)
+        title = row.get("title", "")[:64]
+        email = row.get("email", "").lower()
+        if error is None and (title in titles or (email and email in emails)):
+            error = "duplicate lead"
+            stats["duplicate_rows"] += 1
+        elif error is not None:
+            stats["failed_rows"] += 1
+
+        if error is not None:
+            failed_writer.writerow(cells + [error])
+        else:
+            titles.add(title)
+            if email:
+                emails.add(email)
+            batch.append(build_lead(row, org, user))
+        if stats["processed_rows"] % batch_size == 0:
+            flush()
+    flush()
+
+    failed_writer_stream.flush()
+    if stats["failed_rows"] or stats["duplicate_rows"]:
+        failed_file.seek(0)
+        name = "failed_leads_%s.csv" % lead_import.pk
+        lead_import.failed_rows_file.save(name, File(failed_file, name), save=False)
+    failed_writer_stream.close()
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_alter_lead_tasks_alter_lead_teams'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['org', '-created_at', '-id'], name='lead_org_created_idx'),
+        ),
+    ]
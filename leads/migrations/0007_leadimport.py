@@ -0,0 +1,48 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0012_document_document_org_created_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('leads', '0006_lead_lead_org_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadImport',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Modified At')),
+                ('id', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('file', models.FileField(max_length=1001, upload_to='lead_imports/%Y/%m/')),
+                ('file_size', models.PositiveBigIntegerField(default=0)),
+                ('failed_rows_file', models.FileField(blank=True, max_length=1001, null=True, upload_to='lead_imports/failed/%Y/%m/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('encoding', models.CharField(blank=True, max_length=32, null=True)),
+                ('bytes_processed', models.PositiveBigIntegerField(default=0)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('created_rows', models.PositiveIntegerField(default=0)),
+                ('duplicate_rows', models.PositiveIntegerField(default=0)),
+                ('failed_rows', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created_by', to=settings.AUTH_USER_MODEL, verbose_name='Created By')),
+                ('org', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lead_imports', to='common.org')),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated_by', to=settings.AUTH_USER_MODEL, verbose_name='Last Modified By')),
+            ],
+            options={
+                'verbose_name': 'Lead Import',
+                'verbose_name_plural': 'Lead Imports',
+                'db_table': 'lead_import',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
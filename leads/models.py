@@ -1,5 +1,6 @@
 import arrow
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import pgettext_lazy
 from accounts.models import Tags
@@ -72,6 +73,12 @@ class Lead(BaseModel):
         verbose_name_plural = "Leads"
         db_table = "lead"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="lead_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.account} - {self.last_name}, {self.first_name}"
@@ -106,4 +113,66 @@ class Lead(BaseModel):
         team_user_ids = list(self.teams.values_list("users__id", flat=True))
         assigned_user_ids = list(self.assigned_to.values_list("id", flat=True))
         user_ids = set(assigned_user_ids) - set(team_user_ids)
-        return Profile.objects.filter(id__in=list(user_ids))
\ No newline at end of file
+        return Profile.objects.filter(id__in=list(user_ids))
+
+class LeadImport(BaseModel):
+    """A CSV upload being imported into leads by ``import_leads_from_file``."""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    org = models.ForeignKey(
+        Org, on_delete=models.CASCADE, related_name="lead_imports"
+    )
+    file = models.FileField(max_length=1001, upload_to="lead_imports/%Y/%m/")
+    file_size = models.PositiveBigIntegerField(default=0)
+    failed_rows_file = models.FileField(
+        max_length=1001, upload_to="lead_imports/failed/%Y/%m/", null=True, blank=True
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    encoding = models.CharField(max_length=32, blank=True, null=True)
+    bytes_processed = models.PositiveBigIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_rows = models.PositiveIntegerField(default=0)
+    duplicate_rows = models.PositiveIntegerField(default=0)
+    failed_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lead Import"
+        verbose_name_plural = "Lead Imports"
+        db_table = "lead_import"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.file.name} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == self.STATUS_COMPLETED:
+            return 100.0
+        if not self.file_size:
+            return 0.0
+        return round(min(self.bytes_processed / self.file_size, 1) * 100, 1)
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return None
+        finished_at = self.finished_at or timezone.now()
+        elapsed = (finished_at - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return round(self.processed_rows / elapsed, 1)
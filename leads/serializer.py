@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from accounts.models import Account, Tags
 from tasks.models import Task
+from common.fieldsets import SparseFieldsetMixin
 from common.serializer import (
     AttachmentsSerializer,
     LeadCommentSerializer,
@@ -10,7 +11,7 @@ from common.serializer import (
     UserSerializer,
 )
 
-from leads.models import Company, Lead
+from leads.models import Company, Lead, LeadImport
 from tasks.serializer import TaskSerializer
 
 class TagsSerializer(serializers.ModelSerializer):
@@ -30,7 +31,7 @@ class CompanySerializer(serializers.ModelSerializer):
         fields = ("id", "name", "org")
 
 
-class LeadSerializer(serializers.ModelSerializer):
+class LeadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     assigned_to = ProfileSerializer(read_only=True, many=True)
     created_by = UserSerializer()
     country = serializers.SerializerMethodField()
@@ -45,6 +46,8 @@ class LeadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lead
         fields = "__all__"
+        # only rendered with ?expand=, see common.fieldsets
+        expandable_fields = ("lead_attachment", "lead_comments", "tasks")
 
 class LeadCreateSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
@@ -93,6 +96,7 @@ class CreateLeadFromSiteSwaggerSerializer(serializers.Serializer):
 class LeadDetailEditSwaggerSerializer(serializers.Serializer):
     comment = serializers.CharField()
     lead_attachment = serializers.FileField()
+    lead_attachment_upload = serializers.UUIDField(required=False)
 
 class LeadCommentEditSwaggerSerializer(serializers.Serializer):
     comment = serializers.CharField()
@@ -100,3 +104,36 @@ class LeadCommentEditSwaggerSerializer(serializers.Serializer):
 class LeadUploadSwaggerSerializer(serializers.Serializer):
     leads_file = serializers.FileField()
 
+
+class LeadConvertSwaggerSerializer(serializers.Serializer):
+    lead_ids = serializers.ListField(child=serializers.UUIDField())
+
+
+class LeadImportSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    rows_per_second = serializers.FloatField(read_only=True)
+    has_failed_rows = serializers.SerializerMethodField()
+
+    def get_has_failed_rows(self, obj):
+        return bool(obj.failed_rows_file)
+
+    class Meta:
+        model = LeadImport
+        fields = (
+            "id",
+            "status",
+            "file_size",
+            "encoding",
+            "bytes_processed",
+            "progress",
+            "processed_rows",
+            "created_rows",
+            "duplicate_rows",
+            "failed_rows",
+            "rows_per_second",
+            "has_failed_rows",
+            "error",
+            "started_at",
+            "finished_at",
+            "created_at",
+        )
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Tags
+from common.lookups import bump_lookup_version
+from common.models import Profile, User
+from contacts.models import Contact
+from leads.models import Company, Lead
+
+LEAD_LOOKUPS = "leads"
+
+
+@receiver([post_save, post_delete], sender=Contact)
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_lead_lookups(sender, instance, **kwargs):
+    if instance.org_id:
+        bump_lookup_version(LEAD_LOOKUPS, instance.org_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_lead_lookups_for_user(sender, instance, **kwargs):
+    # the lookups list members by email
+    for org_id in Profile.objects.filter(user=instance).values_list(
+        "org_id", flat=True
+    ):
+        bump_lookup_version(LEAD_LOOKUPS, org_id)
+
+
+@receiver([post_save, post_delete], sender=Tags)
+def invalidate_lead_lookups_for_tags(sender, instance, **kwargs):
+    # tags are shared between orgs
+    bump_lookup_version(LEAD_LOOKUPS)
+
+
+@receiver(m2m_changed, sender=Lead.tags.through)
+def invalidate_lead_lookups_for_lead_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        org_ids = [instance.org_id]
+    elif pk_set:
+        org_ids = Lead.objects.filter(id__in=pk_set).values_list("org_id", flat=True).distinct()
+    else:
+        # clearing from the tag side, the affected leads are already gone
+        bump_lookup_version(LEAD_LOOKUPS)
+        return
+    for org_id in org_ids:
+        if org_id:
+            bump_lookup_version(LEAD_LOOKUPS, org_id)
@@ -1,6 +1,8 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 
+from common.swagger_params1 import keyset_pagination_params
+
 organization_params_in_header = organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
@@ -11,6 +13,7 @@ organization_params = [
 
 lead_list_get_params = [
     organization_params_in_header,
+    OpenApiParameter("search", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter("title", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter("source", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter("assigned_to", OpenApiTypes.STR, OpenApiParameter.QUERY),
@@ -21,4 +24,23 @@ lead_list_get_params = [
         enum=["assigned", "in process", "converted", "recycled", "closed"],
     ),
     OpenApiParameter("tags", OpenApiTypes.STR, OpenApiParameter.QUERY),
+    OpenApiParameter(
+        "bucket",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        enum=["all", "open", "closed"],
+    ),
+    OpenApiParameter(
+        "fields",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Comma separated fields to return",
+    ),
+    OpenApiParameter(
+        "expand",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Comma separated nested fields to add: lead_attachment, tasks",
+    ),
+    *keyset_pagination_params("open_cursor", "close_cursor"),
 ]
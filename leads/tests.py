@@ -0,0 +1,350 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Account, Tags
+from common import list_cache
+from common.models import Attachments, Comment, Org, Profile, User
+from common.search import search
+from common.tasks import reconcile_dashboard_counters
+from contacts.models import Contact
+from leads.importer import detect_encoding, import_leads
+from leads import views
+from leads.conversion import convert_leads
+from leads.models import Lead, LeadImport
+
+
+class TestLeadModel(object):
+    def setUp(self):
+        cache.clear()
+        self.org = Org.objects.create(name="test org")
+        self.user = User.objects.create(email="johnLead@example.com")
+        self.profile = Profile.objects.create(
+            user=self.user, org=self.org, role="ADMIN", is_active=True
+        )
+        self.user1 = User.objects.create(email="janeLead@example.com")
+        self.profile1 = Profile.objects.create(
+            user=self.user1, org=self.org, role="USER", is_active=True
+        )
+        self.lead = Lead.objects.create(
+            title="lead title",
+            first_name="john",
+            last_name="doe",
+            email="johnDoeLead@example.com",
+            status="assigned",
+            org=self.org,
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.user).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+
+
+@override_settings(SHARED_CACHE=True)
+class LeadLookupViewTestCase(TestLeadModel, TestCase):
+    def test_lookups_are_not_part_of_the_list_response(self):
+        response = self.client.get("/api/leads/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("contacts", response.data)
+        self.assertNotIn("users", response.data)
+
+    def test_lookups_revalidate_with_etag(self):
+        response = self.client.get("/api/leads/lookups/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["users"]), 2)
+        etag = response["ETag"]
+
+        response = self.client.get("/api/leads/lookups/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_lookups(self):
+        etag = self.client.get("/api/leads/lookups/")["ETag"]
+        Contact.objects.create(
+            first_name="jane",
+            last_name="doe",
+            primary_email="janeDoeContact@example.com",
+            org=self.org,
+        )
+        response = self.client.get("/api/leads/lookups/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["contacts"]), 1)
+
+    def test_tags_are_scoped_to_the_org(self):
+        other_org = Org.objects.create(name="other org")
+        other_lead = Lead.objects.create(title="other", org=other_org)
+        other_lead.tags.add(Tags.objects.create(name="other tag"))
+        self.lead.tags.add(Tags.objects.create(name="own tag"))
+
+        response = self.client.get("/api/leads/lookups/")
+        self.assertEqual([tag["name"] for tag in response.data["tags"]], ["own tag"])
+
+
+class LeadListBucketTestCase(TestLeadModel, TestCase):
+    def setUp(self):
+        super(LeadListBucketTestCase, self).setUp()
+        for index in range(3):
+            Lead.objects.create(title="closed %s" % index, status="closed", org=self.org)
+
+    def test_each_bucket_reports_its_own_count(self):
+        response = self.client.get("/api/leads/")
+        self.assertEqual(response.data["open_leads"]["leads_count"], 1)
+        self.assertEqual(response.data["close_leads"]["leads_count"], 3)
+        self.assertEqual(len(response.data["close_leads"]["close_leads"]), 3)
+        self.assertEqual(response.data["status_counts"]["assigned"], 1)
+        self.assertEqual(response.data["status_counts"]["closed"], 3)
+
+    def test_open_bucket_skips_closed_query(self):
+        response = self.client.get("/api/leads/", {"bucket": "open"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("open_leads", response.data)
+        self.assertNotIn("close_leads", response.data)
+
+        response = self.client.get("/api/leads/", {"bucket": "archived"})
+        self.assertEqual(response.status_code, 400)
+
+
+class LeadImportTestCase(TestLeadModel, TestCase):
+    def setUp(self):
+        super(LeadImportTestCase, self).setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, content):
+        return self.client.post(
+            "/api/leads/upload/",
+            {"leads_file": SimpleUploadedFile("leads.csv", content)},
+        )
+
+    def test_encoding_is_sniffed(self):
+        self.assertEqual(detect_encoding("title\nCaf\u00e9".encode("utf-8")), "utf-8")
+        self.assertEqual(detect_encoding("title\nCaf\u00e9".encode("cp1252")), "cp1252")
+        self.assertEqual(detect_encoding(b"\xef\xbb\xbftitle"), "utf-8-sig")
+
+    def test_missing_headers_are_rejected_on_upload(self):
+        response = self.upload(b"name,email\njohn,john@example.com\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LeadImport.objects.exists())
+
+    def test_import_in_batches_with_failed_rows_report(self):
+        content = (
+            "Title,First Name,Email,Status\n"
+            "lead title,jane,jane@example.com,assigned\n"
+            "Caf\u00e9 lead,jane,cafe@example.com,closed\n"
+            ",nobody,nobody@example.com,\n"
+            "bad email,bob,not-an-email,\n"
+            "second,joe,JOHNDOELEAD@example.com,\n"
+            "third,joe,third@example.com,recycled\n"
+            "third,joe,third-copy@example.com,\n"
+        ).encode("cp1252")
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 202)
+        lead_import = LeadImport.objects.get(id=response.data["lead_import"]["id"])
+        self.assertEqual(lead_import.created_by, self.user)
+
+        import_leads(lead_import, batch_size=2)
+
+        lead_import.refresh_from_db()
+        self.assertEqual(lead_import.status, LeadImport.STATUS_COMPLETED)
+        self.assertEqual(lead_import.encoding, "cp1252")
+        self.assertEqual(lead_import.processed_rows, 7)
+        self.assertEqual(lead_import.created_rows, 2)
+        self.assertEqual(lead_import.duplicate_rows, 3)
+        self.assertEqual(lead_import.failed_rows, 2)
+        self.assertEqual(lead_import.progress, 100.0)
+        cafe = Lead.objects.get(title="Caf\u00e9 lead")
+        self.assertEqual(cafe.status, "closed")
+        self.assertEqual(cafe.created_by, self.user)
+
+        response = self.client.get("/api/leads/upload/%s/" % lead_import.id)
+        self.assertEqual(response.data["lead_import"]["created_rows"], 2)
+        self.assertTrue(response.data["lead_import"]["has_failed_rows"])
+
+        response = self.client.get("/api/leads/upload/%s/failed-rows/" % lead_import.id)
+        self.assertEqual(response.status_code, 200)
+        failed_rows = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(failed_rows[0], "title,first name,email,status,error")
+        self.assertEqual(len(failed_rows), 6)
+        self.assertTrue(failed_rows[-1].endswith(",duplicate lead"))
+
+        response = self.client.get("/api/leads/upload/not-an-id/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/leads/upload/not-an-id/failed-rows/")
+        self.assertEqual(response.status_code, 404)
+
+
+class LeadSerializerFieldsetTestCase(TestLeadModel, TestCase):
+    def add_leads(self, count):
+        tag = Tags.objects.create(name="tag %s" % Lead.objects.count())
+        for index in range(count):
+            lead = Lead.objects.create(title="lead %s" % index, org=self.org)
+            lead.assigned_to.add(self.profile, self.profile1)
+            lead.tags.add(tag)
+
+    def count_queries(self, **params):
+        # the uncached response
+        list_cache.invalidate("leads", self.org.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/leads/", params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        params = {"bucket": "open", "expand": "tasks,lead_attachment"}
+        self.add_leads(2)
+        # warm the auth cache
+        self.count_queries(**params)
+        small_page = self.count_queries(**params)
+        self.add_leads(6)
+        self.assertEqual(self.count_queries(**params), small_page)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get("/api/leads/", {"fields": "title,tags"})
+        lead = response.data["open_leads"]["open_leads"][0]
+        self.assertEqual(set(lead), {"id", "title", "tags"})
+
+        response = self.client.get("/api/leads/")
+        lead = response.data["open_leads"]["open_leads"][0]
+        self.assertIn("assigned_to", lead)
+        self.assertNotIn("tasks", lead)
+
+        response = self.client.get("/api/leads/", {"expand": "tasks"})
+        self.assertIn("tasks", response.data["open_leads"]["open_leads"][0])
+
+
+@override_settings(SHARED_CACHE=True)
+class LeadListCacheTestCase(TestLeadModel, TestCase):
+    def count_queries(self, client, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/leads/", params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries.captured_queries)
+
+    def test_list_is_served_from_cache_until_a_lead_changes(self):
+        # warm the auth cache
+        self.count_queries(self.client)
+        self.count_queries(self.client, bucket="open")
+        hits = list_cache.stats[("leads", "hit")]
+        response, queries = self.count_queries(self.client, bucket="open")
+        self.assertEqual(queries, 0)
+        self.assertEqual(list_cache.stats[("leads", "hit")], hits + 1)
+        self.assertEqual(response.data["open_leads"]["leads_count"], 1)
+
+        # filters and users get their own entries
+        _, queries = self.count_queries(self.client, bucket="open", status="closed")
+        self.assertGreater(queries, 0)
+        member = APIClient()
+        member.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.user1).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response, _ = self.count_queries(member, bucket="open")
+        self.assertEqual(response.data["open_leads"]["leads_count"], 0)
+
+        self.lead.assigned_to.add(self.profile1)
+        response, _ = self.count_queries(member, bucket="open")
+        self.assertEqual(response.data["open_leads"]["leads_count"], 1)
+        Lead.objects.create(title="new lead", org=self.org)
+        response, queries = self.count_queries(self.client, bucket="open")
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.data["open_leads"]["leads_count"], 2)
+
+
+class LeadConversionTestCase(TestLeadModel, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.lead.account_name = "Doe Trading"
+        self.lead.city = "Lisbon"
+        self.lead.save()
+        self.tag = Tags.objects.create(name="vip")
+        self.lead.tags.add(self.tag)
+        self.lead.assigned_to.add(self.profile1)
+        self.other = Lead.objects.create(
+            title="other lead", account_name="Other Ltd", org=self.org
+        )
+        self.comment = Comment.objects.create(comment="call back", lead=self.lead)
+        self.attachment = Attachments.objects.create(
+            file_name="brief.txt", attachment="attachments/brief.txt", lead=self.lead
+        )
+
+    def test_leads_are_converted_in_one_pass(self):
+        with mock.patch.object(
+            reconcile_dashboard_counters, "delay"
+        ) as delay, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/leads/convert/",
+                {"lead_ids": [str(self.lead.id), str(self.other.id)]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        # the dashboard counters are recounted in the background
+        delay.assert_called_once_with(str(self.org.id))
+        self.assertEqual(len(response.data["accounts"]), 2)
+        account = Account.objects.get(lead=self.lead)
+        self.assertEqual(account.name, "Doe Trading")
+        self.assertEqual(account.contact_name, "john doe")
+        self.assertEqual(account.billing_city, "Lisbon")
+        self.assertEqual(list(account.tags.all()), [self.tag])
+        self.assertEqual(list(account.assigned_to.all()), [self.profile1])
+        self.comment.refresh_from_db()
+        self.attachment.refresh_from_db()
+        self.assertEqual(self.comment.account, account)
+        self.assertEqual(self.attachment.account, account)
+        self.assertEqual(
+            set(Lead.objects.values_list("status", flat=True)), {"converted"}
+        )
+        # indexed despite the bulk writes
+        results = search(self.org, "Doe Trading", entities=["accounts"])
+        self.assertEqual([result[1] for result in results], [account.id])
+
+        # converting again doesn't duplicate the accounts
+        self.assertEqual(convert_leads([self.lead.id], self.org, self.user), [])
+        self.assertEqual(Account.objects.filter(org=self.org).count(), 2)
+
+    def test_users_convert_only_the_leads_they_see(self):
+        member = APIClient()
+        member.credentials(
+            HTTP_AUTHORIZATION="Bearer %s"
+            % RefreshToken.for_user(self.user1).access_token,
+            HTTP_ORG=str(self.org.id),
+        )
+        response = member.post(
+            "/api/leads/convert/",
+            {"lead_ids": [str(self.lead.id), str(self.other.id)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Account.objects.values_list("lead_id", flat=True)), [self.lead.id]
+        )
+
+    def test_large_selections_are_converted_in_the_background(self):
+        with mock.patch.object(
+            views, "LEAD_CONVERSION_SYNC_LIMIT", 1
+        ), mock.patch.object(views.convert_leads_to_accounts, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/leads/convert/",
+                    {"lead_ids": [str(self.lead.id), str(self.other.id)]},
+                    format="json",
+                )
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Account.objects.exists())
+        lead_ids, org_id, user_id = delay.call_args[0]
+        self.assertEqual(set(lead_ids), {str(self.lead.id), str(self.other.id)})
+        self.assertEqual(org_id, str(self.org.id))
@@ -1,12 +1,17 @@
+import csv
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.test.utils import override_settings
 
 from leads.tasks import (
-    create_lead_from_file,
+    import_leads_from_file,
     send_email,
     send_email_to_assigned_user,
     send_lead_assigned_emails,
 )
+from leads.models import LeadImport
 from leads.tests import TestLeadModel
 
 
@@ -127,7 +132,13 @@ class TestCeleryTasks(TestLeadModel, TestCase):
                 "address": "address for lead4",
             },
         ]
-        task = create_lead_from_file.apply(
-            (valid_rows, invalid_rows, self.user.id, "example.com"),
+        csv_file = io.StringIO()
+        writer = csv.DictWriter(csv_file, fieldnames=list(valid_rows[0]))
+        writer.writeheader()
+        writer.writerows(valid_rows + invalid_rows)
+        lead_import = LeadImport.objects.create(
+            org=self.org,
+            file=SimpleUploadedFile("leads.csv", csv_file.getvalue().encode("utf-8")),
         )
+        task = import_leads_from_file.apply((lead_import.id,))
         self.assertEqual("SUCCESS", task.state)
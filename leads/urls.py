@@ -12,8 +12,14 @@ urlpatterns = [
         name="create_lead_from_site",
     ),
     path("", views.LeadListView.as_view()),
-    path("<str:pk>/", views.LeadDetailView.as_view()),
+    path("lookups/", views.LeadLookupView.as_view()),
     path("upload/", views.LeadUploadView.as_view()),
+    path("upload/<str:pk>/", views.LeadImportDetailView.as_view()),
+    path(
+        "upload/<str:pk>/failed-rows/", views.LeadImportFailedRowsView.as_view()
+    ),
+    path("convert/", views.LeadConvertView.as_view()),
+    path("<str:pk>/", views.LeadDetailView.as_view()),
     path("comment/<str:pk>/", views.LeadCommentView.as_view()),
     path("attachment/<str:pk>/", views.LeadAttachmentView.as_view()),
     path("companies",views.CompaniesView.as_view()),
@@ -1,14 +1,21 @@
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from accounts.models import Account, Tags
+from accounts.models import Tags
+from common import dedupe, list_cache
+from common.fieldsets import apply_eager_loading
+from common.lookups import lookup_response
 from common.models import APISettings, Attachments, Comment, Profile
+from common.pagination import COUNT_NONE, KeysetPagination
+from common.search import filter_by_search
 
 #from common.external_auth import CustomDualAuthentication
 from common.serializer import (
@@ -19,11 +26,16 @@ from common.serializer import (
 )
 from .forms import LeadListForm
 from .models import Company,Lead
+from common.tasks import send_email_user_mentions
+from common.uploads import create_attachment, get_completed_upload
 from common.utils import COUNTRIES, INDCHOICES, LEAD_SOURCE, LEAD_STATUS
+from common.visibility import sees_all, visible_to
 from contacts.models import Contact
 from leads import swagger_params1
+from leads.conversion import LEAD_CONVERSION_SYNC_LIMIT, convert_leads
 from leads.forms import LeadListForm
-from leads.models import Company, Lead
+from leads.models import Company, Lead, LeadImport
+from leads.signals import LEAD_LOOKUPS
 from leads.serializer import (
     CompanySerializer,
     CompanySwaggerSerializer,
@@ -34,11 +46,14 @@ from leads.serializer import (
     LeadDetailEditSwaggerSerializer,
     LeadCommentEditSwaggerSerializer,
     CreateLeadFromSiteSwaggerSerializer,
+    LeadConvertSwaggerSerializer,
+    LeadImportSerializer,
     LeadUploadSwaggerSerializer
 )
 from common.models import User
 from leads.tasks import (
-    create_lead_from_file,
+    convert_leads_to_accounts,
+    import_leads_from_file,
     send_email_to_assigned_user,
     send_lead_assigned_emails,
 )
@@ -46,28 +61,49 @@ from teams.models import Teams
 from teams.serializer import TeamsSerializer
 
 
-class LeadListView(APIView, LimitOffsetPagination):
+LEAD_BUCKET_ALL = "all"
+LEAD_BUCKET_OPEN = "open"
+LEAD_BUCKET_CLOSED = "closed"
+LEAD_BUCKETS = (LEAD_BUCKET_ALL, LEAD_BUCKET_OPEN, LEAD_BUCKET_CLOSED)
+
+
+class LeadListView(APIView, KeysetPagination):
     model = Lead
     permission_classes = (IsAuthenticated,)
 
+    def get_status_counts(self, queryset):
+        """Lead counts per status, computed in a single aggregate query."""
+        aggregates = {
+            "status_%s" % index: Count("id", filter=Q(status=value), distinct=True)
+            for index, (value, _) in enumerate(LEAD_STATUS)
+        }
+        aggregates["total"] = Count("id", distinct=True)
+        result = queryset.order_by().aggregate(**aggregates)
+        status_counts = {
+            value: result["status_%s" % index]
+            for index, (value, _) in enumerate(LEAD_STATUS)
+        }
+        # leads without a status are listed with the open ones
+        return {
+            "open": result["total"] - status_counts["closed"],
+            "closed": status_counts["closed"],
+            "status": status_counts,
+        }
+
     def get_context_data(self, **kwargs):
         params = self.request.query_params
-        queryset = (
-            self.model.objects.filter(org=self.request.profile.org)
-            .exclude(status="converted")
-            .select_related("created_by")
-            .prefetch_related( 
-                "tags",
-                "assigned_to",
-            )
-        ).order_by("-id")
+        bucket = params.get("bucket", LEAD_BUCKET_ALL)
+        queryset = self.model.objects.filter(org=self.request.profile.org).exclude(
+            status="converted"
+        )
         if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
-            queryset = queryset.filter(
-                Q(assigned_to__in=[self.request.profile])
-                | Q(created_by=self.request.profile.user)
-            )
+            queryset = visible_to(queryset, self.request.profile)
 
         if params:
+            if params.get("search"):
+                queryset = filter_by_search(
+                    queryset, "leads", self.request.profile.org, params.get("search")
+                )
             if params.get("name"):
                 queryset = queryset.filter(
                     Q(first_name__icontains=params.get("name"))
@@ -90,66 +126,74 @@ class LeadListView(APIView, LimitOffsetPagination):
             if params.get("email"):
                 queryset = queryset.filter(email__icontains=params.get("email"))
         context = {}
-        queryset_open = queryset.exclude(status="closed")
-        results_leads_open = self.paginate_queryset(
-            queryset_open.distinct(), self.request, view=self
+        counts = None
+        if params.get(self.count_query_param, self.default_count) != COUNT_NONE:
+            counts = self.get_status_counts(queryset)
+            context["status_counts"] = counts["status"]
+        serializer_context = {"request": self.request}
+        queryset = apply_eager_loading(
+            queryset, LeadSerializer(context=serializer_context)
         )
-        open_leads = LeadSerializer(results_leads_open, many=True).data
-        if results_leads_open:
-            offset = queryset_open.filter(id__gte=results_leads_open[-1].id).count()
-            if offset == queryset_open.count():
-                offset = None
-        else:
-            offset = 0
-        context["per_page"] = 10
-        page_number = (int(self.offset / 10) + 1,)
-        context["page_number"] = page_number
-        context["open_leads"] = {
-            "leads_count": self.count,
-            "open_leads": open_leads,
-            "offset": offset,
-        }
-
-        queryset_close = queryset.filter(status="closed")
-        results_leads_close = self.paginate_queryset(
-            queryset_close.distinct(), self.request, view=self
-        )
-        close_leads = LeadSerializer(results_leads_close, many=True).data
-        if results_leads_close:
-            offset = queryset_close.filter(id__gte=results_leads_close[-1].id).count()
-            if offset == queryset_close.count():
-                offset = None
-        else:
-            offset = 0
 
-        context["close_leads"] = {
-            "leads_count": self.count,
-            "close_leads": close_leads,
-            "offset": offset,
-        }
-        contacts = Contact.objects.filter(org=self.request.profile.org).values(
-            "id", "first_name"
-        )
+        if bucket in (LEAD_BUCKET_ALL, LEAD_BUCKET_OPEN):
+            results_leads_open = self.paginate_queryset(
+                queryset.exclude(status="closed").distinct(),
+                self.request,
+                view=self,
+                cursor_query_param="open_cursor",
+                with_count=False,
+            )
+            context["open_leads"] = {
+                "leads_count": counts["open"] if counts else None,
+                "open_leads": LeadSerializer(
+                    results_leads_open, many=True, context=serializer_context
+                ).data,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
+            }
 
-        context["contacts"] = contacts
-        context["status"] = LEAD_STATUS
-        context["source"] = LEAD_SOURCE
-        context["companies"] = CompanySerializer(
-            Company.objects.filter(org=self.request.profile.org), many=True
-        ).data
-        context["tags"] = TagsSerializer(Tags.objects.all(), many=True).data
+        if bucket in (LEAD_BUCKET_ALL, LEAD_BUCKET_CLOSED):
+            results_leads_close = self.paginate_queryset(
+                queryset.filter(status="closed").distinct(),
+                self.request,
+                view=self,
+                cursor_query_param="close_cursor",
+                with_count=False,
+            )
+            context["close_leads"] = {
+                "leads_count": counts["closed"] if counts else None,
+                "close_leads": LeadSerializer(
+                    results_leads_close, many=True, context=serializer_context
+                ).data,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
+            }
 
-        users = Profile.objects.filter(is_active=True, org=self.request.profile.org).values(
-            "id", "user__email"
-        )
-        context["users"] = users
-        context["countries"] = COUNTRIES
-        context["industries"] = INDCHOICES
+        context["per_page"] = self.limit
+        context["page_number"] = (int(self.offset / self.limit) + 1,)
+        # contacts, companies, tags, users etc. are served by LeadLookupView
         return context
 
     @extend_schema(tags=["Leads"], parameters=swagger_params1.lead_list_get_params)
     def get(self, request, *args, **kwargs):
-        context = self.get_context_data(**kwargs)
+        if request.query_params.get("bucket", LEAD_BUCKET_ALL) not in LEAD_BUCKETS:
+            return Response(
+                {
+                    "error": True,
+                    "errors": "bucket must be one of %s" % ", ".join(LEAD_BUCKETS),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        is_admin = (
+            self.request.profile.role == "ADMIN" or self.request.user.is_superuser
+        )
+        context = list_cache.get_or_build(
+            "leads",
+            request.profile,
+            request.query_params,
+            is_admin,
+            lambda: self.get_context_data(**kwargs),
+        )
         return Response(context)
 
     @extend_schema(
@@ -192,6 +236,11 @@ class LeadListView(APIView, LimitOffsetPagination):
                 attachment.lead = lead_obj
                 attachment.attachment = request.FILES.get("lead_attachment")
                 attachment.save()
+            upload = get_completed_upload(
+                data.get("lead_attachment_upload"), request.profile
+            )
+            if upload is not None:
+                create_attachment(upload, request.profile.user, lead=lead_obj)
 
             if data.get("teams",None):
                 teams_list = data.get("teams")
@@ -247,8 +296,17 @@ class LeadListView(APIView, LimitOffsetPagination):
             #        },
             #        status=status.HTTP_200_OK,
             #    )
+            profile = None
+            if not sees_all("leads", request.profile):
+                profile = request.profile
             return Response(
-                {"error": False, "message": "Lead Created Successfully"},
+                {
+                    "error": False,
+                    "message": "Lead Created Successfully",
+                    "possible_duplicates": dedupe.possible_duplicates(
+                        "leads", lead_obj, profile=profile
+                    ),
+                },
                 status=status.HTTP_200_OK,
             )
         return Response(
@@ -257,6 +315,45 @@ class LeadListView(APIView, LimitOffsetPagination):
         )
 
 
+def build_lead_lookups(org):
+    return {
+        "contacts": list(
+            Contact.objects.filter(org=org).values("id", "first_name")
+        ),
+        "status": LEAD_STATUS,
+        "source": LEAD_SOURCE,
+        "companies": list(
+            CompanySerializer(Company.objects.filter(org=org), many=True).data
+        ),
+        "tags": list(
+            TagsSerializer(
+                Tags.objects.filter(lead__org=org).distinct(), many=True
+            ).data
+        ),
+        "users": list(
+            Profile.objects.filter(is_active=True, org=org).values(
+                "id", "user__email"
+            )
+        ),
+        "countries": COUNTRIES,
+        "industries": INDCHOICES,
+    }
+
+
+class LeadLookupView(APIView):
+    """Reference data for the lead list and forms, cached per org and
+    invalidated from leads.signals, served with an ETag."""
+
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(tags=["Leads"], parameters=swagger_params1.organization_params)
+    def get(self, request, *args, **kwargs):
+        org = request.profile.org
+        return lookup_response(
+            request, LEAD_LOOKUPS, org.id, lambda: build_lead_lookups(org)
+        )
+
+
 class LeadDetailView(APIView):
     model = Lead
     #authentication_classes = (CustomDualAuthentication,)
@@ -386,10 +483,11 @@ class LeadDetailView(APIView):
         comment_serializer = CommentSerializer(data=params)
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     lead_id=self.lead_obj.id,
                     commented_by_id=self.request.profile.id,
                 )
+                send_email_user_mentions.delay(comment.id, "leads")
 
             if self.request.FILES.get("lead_attachment"):
                 attachment = Attachments()
@@ -399,6 +497,13 @@ class LeadDetailView(APIView):
                 attachment.lead = self.lead_obj
                 attachment.attachment = self.request.FILES.get("lead_attachment")
                 attachment.save()
+            upload = get_completed_upload(
+                params.get("lead_attachment_upload"), self.request.profile
+            )
+            if upload is not None:
+                create_attachment(
+                    upload, self.request.profile.user, lead=self.lead_obj
+                )
 
         comments = Comment.objects.filter(lead__id=self.lead_obj.id).order_by("-id")
         attachments = Attachments.objects.filter(lead__id=self.lead_obj.id).order_by(
@@ -464,6 +569,11 @@ class LeadDetailView(APIView):
                 attachment.lead = lead_obj
                 attachment.attachment = request.FILES.get("lead_attachment")
                 attachment.save()
+            upload = get_completed_upload(
+                params.get("lead_attachment_upload"), request.profile
+            )
+            if upload is not None:
+                create_attachment(upload, request.profile.user, lead=lead_obj)
 
             lead_obj.contacts.clear()
             if params.get("contacts"):
@@ -487,45 +597,12 @@ class LeadDetailView(APIView):
                 lead_obj.assigned_to.add(*profiles)
 
             if params.get("status") == "converted":
-                account_object = Account.objects.create(
-                    created_by=request.profile.user,
-                    name=lead_obj.account_name,
-                    email=lead_obj.email,
-                    phone=lead_obj.phone,
-                    description=params.get("description"),
-                    website=params.get("website"),
-                    lead=lead_obj,
-                    org=request.profile.org,
-                )
-                account_object.billing_address_line = lead_obj.address_line
-                account_object.billing_street = lead_obj.street
-                account_object.billing_city = lead_obj.city
-                account_object.billing_state = lead_obj.state
-                account_object.billing_postcode = lead_obj.postcode
-                account_object.billing_country = lead_obj.country
-                comments = Comment.objects.filter(lead=self.lead_obj)
-                if comments.exists():
-                    for comment in comments:
-                        comment.account_id = account_object.id
-                attachments = Attachments.objects.filter(lead=self.lead_obj)
-                if attachments.exists():
-                    for attachment in attachments:
-                        attachment.account_id = account_object.id
-                for tag in lead_obj.tags.all():
-                    account_object.tags.add(tag)
+                convert_leads([lead_obj.id], request.profile.org, request.profile.user)
                 if params.get("assigned_to"):
-                    # account_object.assigned_to.add(*params.getlist('assigned_to'))
-                    assigned_to_list = params.get("assigned_to")
-                    recipients = assigned_to_list
                     send_email_to_assigned_user.delay(
-                        recipients,
+                        params.get("assigned_to"),
                         lead_obj.id,
                     )
-
-                for comment in lead_obj.leads_comments.all():
-                    comment.account = account_object
-                    comment.save()
-                account_object.save()
                 return Response(
                     {
                         "error": False,
@@ -563,7 +640,7 @@ class LeadDetailView(APIView):
 
 
 class LeadUploadView(APIView):
-    model = Lead
+    model = LeadImport
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
 
@@ -571,16 +648,20 @@ class LeadUploadView(APIView):
     def post(self, request, *args, **kwargs):
         lead_form = LeadListForm(request.POST, request.FILES)
         if lead_form.is_valid():
-            create_lead_from_file.delay(
-                lead_form.validated_rows,
-                lead_form.invalid_rows,
-                request.profile.id,
-                request.get_host(),
-                request.profile.org.id,
+            document = lead_form.cleaned_data["leads_file"]
+            lead_import = self.model.objects.create(
+                org=request.profile.org, file=document, file_size=document.size
+            )
+            transaction.on_commit(
+                lambda: import_leads_from_file.delay(str(lead_import.id))
             )
             return Response(
-                {"error": False, "message": "Leads created Successfully"},
-                status=status.HTTP_200_OK,
+                {
+                    "error": False,
+                    "message": "Leads import started",
+                    "lead_import": LeadImportSerializer(lead_import).data,
+                },
+                status=status.HTTP_202_ACCEPTED,
             )
         return Response(
             {"error": True, "errors": lead_form.errors},
@@ -588,6 +669,102 @@ class LeadUploadView(APIView):
         )
 
 
+class LeadImportDetailView(APIView):
+    model = LeadImport
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self, pk):
+        queryset = self.model.objects.filter(org=self.request.profile.org)
+        if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
+            queryset = queryset.filter(created_by=self.request.profile.user)
+        try:
+            return queryset.filter(id=pk).first()
+        except ValidationError:
+            return None
+
+    @extend_schema(tags=["Leads"], parameters=swagger_params1.organization_params)
+    def get(self, request, pk, format=None):
+        lead_import = self.get_object(pk)
+        if lead_import is None:
+            return Response(
+                {"error": True, "errors": "Lead import does not exist"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            {"error": False, "lead_import": LeadImportSerializer(lead_import).data},
+            status=status.HTTP_200_OK,
+        )
+
+
+class LeadImportFailedRowsView(LeadImportDetailView):
+    @extend_schema(tags=["Leads"], parameters=swagger_params1.organization_params)
+    def get(self, request, pk, format=None):
+        lead_import = self.get_object(pk)
+        if lead_import is None or not lead_import.failed_rows_file:
+            return Response(
+                {"error": True, "errors": "No failed rows for this lead import"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return FileResponse(
+            lead_import.failed_rows_file.open("rb"),
+            as_attachment=True,
+            filename="failed_leads.csv",
+            content_type="text/csv",
+        )
+
+
+class LeadConvertView(APIView):
+    model = Lead
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(
+        tags=["Leads"],
+        parameters=swagger_params1.organization_params,
+        request=LeadConvertSwaggerSerializer,
+        description="Convert leads to accounts",
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = LeadConvertSwaggerSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": True, "errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = self.model.objects.filter(
+            org=request.profile.org, id__in=serializer.validated_data["lead_ids"]
+        ).exclude(status="converted")
+        if request.profile.role != "ADMIN" and not request.user.is_superuser:
+            queryset = visible_to(queryset, request.profile)
+        lead_ids = [str(lead_id) for lead_id in queryset.values_list("id", flat=True)]
+        if not lead_ids:
+            return Response(
+                {"error": True, "errors": "No leads to convert"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(lead_ids) > LEAD_CONVERSION_SYNC_LIMIT:
+            org_id, user_id = str(request.profile.org_id), str(request.profile.user_id)
+            transaction.on_commit(
+                lambda: convert_leads_to_accounts.delay(lead_ids, org_id, user_id)
+            )
+            return Response(
+                {
+                    "error": False,
+                    "message": "Leads conversion started",
+                    "leads": len(lead_ids),
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
+        account_ids = convert_leads(lead_ids, request.profile.org, request.profile.user)
+        return Response(
+            {
+                "error": False,
+                "message": "Leads Converted to Accounts Successfully",
+                "accounts": [str(account_id) for account_id in account_ids],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class LeadCommentView(APIView):
     model = Comment
     #authentication_classes = (CustomDualAuthentication,)
@@ -732,7 +909,11 @@ class CreateLeadFromSite(APIView):
                 pass
 
             return Response(
-                {"error": False, "message": "Lead Created sucessfully."},
+                {
+                    "error": False,
+                    "message": "Lead Created sucessfully.",
+                    "possible_duplicates": dedupe.possible_duplicates("leads", lead),
+                },
                 status=status.HTTP_200_OK,
             )
         return Response(
@@ -11,4 +11,12 @@ from common.models import Org
 class Lender(BaseModel):
     name = models.CharField(pgettext_lazy("Name of Lender", "Name"), max_length=64)
     contacts = models.ManyToManyField(Contact)
-    org = models.ForeignKey(Org, on_delete=models.SET_NULL, null=True, blank=True, related_name="lender_org")
\ No newline at end of file
+    org = models.ForeignKey(Org, on_delete=models.SET_NULL, null=True, blank=True, related_name="lender_org")
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="lender_org_created_idx"
+            ),
+        ]
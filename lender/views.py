@@ -3,19 +3,20 @@ from django.shortcuts import render
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from lender.models import Lender
 from lender.serializer import *
 from common.models import Profile
+from common.pagination import KeysetPagination
 from drf_spectacular.utils import extend_schema
 from common.serializer import ProfileSerializer
+from common.visibility import visible_to
 
 
 # Create your views here.
-class LenderListView(APIView, LimitOffsetPagination):
+class LenderListView(APIView, KeysetPagination):
 
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -26,12 +27,8 @@ class LenderListView(APIView, LimitOffsetPagination):
         queryset = self.model.objects.filter(org=self.request.profile.org).order_by("-id")
         contacts = Contact.objects.filter(org=self.request.profile.org)
         if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
-            queryset = queryset.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            contacts = contacts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
+            contacts = visible_to(contacts, self.request.profile)
 
         if params:
             if params.get("name"):
@@ -42,19 +39,14 @@ class LenderListView(APIView, LimitOffsetPagination):
             queryset.distinct(), self.request, view=self
         )
         lenders = LenderSerializer(results_opportunities, many=True).data
-        if results_opportunities:
-            offset = queryset.filter(id__gte=results_opportunities[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
-        context["per_page"] = 10
-        page_number = (int(self.offset / 10) + 1,)
+        context["per_page"] = self.limit
+        page_number = (int(self.offset / self.limit) + 1,)
         context["page_number"] = page_number
         context.update(
             {
                 "lenders_count": self.count,
-                "offset": offset,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
             }
         )
         context["lenders"] = lenders
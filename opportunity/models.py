@@ -62,6 +62,12 @@ class Opportunity(BaseModel):
         verbose_name_plural = "Opportunities"
         db_table = "opportunity"
         ordering = ("-created_at",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="opportunity_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
@@ -1,6 +1,8 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 
+from common.swagger_params1 import keyset_pagination_params
+
 organization_params_in_header = organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
@@ -12,11 +14,13 @@ organization_params = [
 
 opportunity_list_get_params = [
     organization_params_in_header,
+    OpenApiParameter("search", OpenApiTypes.STR, OpenApiParameter.QUERY),
     OpenApiParameter("name", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("account", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("stage", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("lead_source", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("tags", OpenApiTypes.STR,OpenApiParameter.QUERY),
+    *keyset_pagination_params(),
 ]
 
 opportunity_detail_get_params = [
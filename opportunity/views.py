@@ -3,7 +3,6 @@ import json
 from django.db.models import Q
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,6 +10,8 @@ from rest_framework.views import APIView
 from accounts.models import Account, Tags
 from accounts.serializer import AccountSerializer, TagsSerailizer
 from common.models import Attachments, Comment, Profile
+from common.pagination import KeysetPagination
+from common.search import filter_by_search
 
 #from common.external_auth import CustomDualAuthentication
 from common.serializer import (
@@ -18,7 +19,9 @@ from common.serializer import (
     CommentSerializer,
     ProfileSerializer,
 )
+from common.tasks import send_email_user_mentions
 from common.utils import CURRENCY_CODES, SOURCES, STAGES
+from common.visibility import visible_to
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from opportunity import swagger_params1
@@ -28,7 +31,7 @@ from opportunity.tasks import send_email_to_assigned_user
 from teams.models import Teams
 
 
-class OpportunityListView(APIView, LimitOffsetPagination):
+class OpportunityListView(APIView, KeysetPagination):
 
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -40,17 +43,15 @@ class OpportunityListView(APIView, LimitOffsetPagination):
         accounts = Account.objects.filter(org=self.request.profile.org)
         contacts = Contact.objects.filter(org=self.request.profile.org)
         if self.request.profile.role != "ADMIN" and not self.request.user.is_superuser:
-            queryset = queryset.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            accounts = accounts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            contacts = contacts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
+            accounts = visible_to(accounts, self.request.profile)
+            contacts = visible_to(contacts, self.request.profile)
 
         if params:
+            if params.get("search"):
+                queryset = filter_by_search(
+                    queryset, "opportunities", self.request.profile.org, params.get("search")
+                )
             if params.get("name"):
                 queryset = queryset.filter(name__icontains=params.get("name"))
             if params.get("account"):
@@ -71,19 +72,14 @@ class OpportunityListView(APIView, LimitOffsetPagination):
             queryset.distinct(), self.request, view=self
         )
         opportunities = OpportunitySerializer(results_opportunities, many=True).data
-        if results_opportunities:
-            offset = queryset.filter(id__gte=results_opportunities[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
-        context["per_page"] = 10
-        page_number = (int(self.offset / 10) + 1,)
+        context["per_page"] = self.limit
+        page_number = (int(self.offset / self.limit) + 1,)
         context["page_number"] = page_number
         context.update(
             {
                 "opportunities_count": self.count,
-                "offset": offset,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
             }
         )
         context["opportunities"] = opportunities
@@ -416,10 +412,11 @@ class OpportunityDetailView(APIView):
                 )
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     opportunity_id=self.opportunity_obj.id,
                     commented_by_id=self.request.profile.id,
                 )
+                send_email_user_mentions.delay(comment.id, "opportunity")
 
             if self.request.FILES.get("opportunity_attachment"):
                 attachment = Attachments()
@@ -1,39 +1,28 @@
-from celery import Celery
 from django.conf import settings
-from django.core.mail import EmailMessage
 from django.shortcuts import reverse
-from django.template.loader import render_to_string
 
-from accounts.models import Account, Email
 from common.models import User
-from contacts.models import Contact
+from common.notifications import NotificationDispatcher
+from crm.celery import app
 from tasks.models import Task
 
-app = Celery("redis://")
-
 
 @app.task
 def send_email(task_id, recipients, domain="demo.django-crm.io", protocol="http"):
-    task = Task.objects.filter(id=task_id).first()
+    task = Task.objects.select_related("created_by").filter(id=task_id).first()
     created_by = task.created_by
-    for user in recipients:
-        recipients_list = []
-        user = User.objects.filter(id=user, is_active=True).first()
-        if user:
-            recipients_list.append(user.email)
-            subject = " Assigned a task for you ."
-            context = {}
-            context["task_title"] = task.title
-            context["task_id"] = task.id
-            context["task_created_by"] = task.created_by
-            context["url"] = protocol + "://" + domain
-            context["user"] = user
-            html_content = render_to_string(
-                "tasks_email_template.html", context=context
-            )
-            msg = EmailMessage(subject=subject, body=html_content, to=recipients_list)
-            msg.content_subtype = "html"
-            msg.send()
+    subject = " Assigned a task for you ."
+    context = {}
+    context["task_title"] = task.title
+    context["task_id"] = task.id
+    context["task_created_by"] = task.created_by
+    context["url"] = protocol + "://" + domain
+    dispatcher = NotificationDispatcher()
+    for user in User.objects.filter(id__in=recipients, is_active=True):
+        context["user"] = user
+        html_content = dispatcher.render("tasks_email_template.html", context)
+        dispatcher.add(subject, html_content, [user.email])
+    dispatcher.send()
 
     # if task:
     #     subject = ' Assigned a task for you .'
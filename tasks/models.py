@@ -59,6 +59,12 @@ class Task(BaseModel):
         verbose_name_plural = "Tasks"
         db_table = "task"
         ordering = ("-due_date",)
+        indexes = [
+            # keyset pagination of the list views, see common.pagination
+            models.Index(
+                fields=["org", "-created_at", "-id"], name="task_org_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title}"
@@ -3,7 +3,6 @@ import json
 from django.db.models import Q
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,6 +10,7 @@ from rest_framework.views import APIView
 from accounts.models import Account
 from accounts.serializer import AccountSerializer
 from common.models import Attachments, Comment, Profile
+from common.pagination import KeysetPagination
 
 #from common.external_auth import CustomDualAuthentication
 from common.serializer import (
@@ -18,6 +18,8 @@ from common.serializer import (
     CommentSerializer,
     ProfileSerializer,
 )
+from common.tasks import send_email_user_mentions
+from common.visibility import visible_to
 from contacts.models import Contact
 from contacts.serializer import ContactSerializer
 from tasks import swagger_params1
@@ -28,7 +30,7 @@ from teams.models import Teams
 from teams.serializer import TeamsSerializer
 
 
-class TaskListView(APIView, LimitOffsetPagination):
+class TaskListView(APIView, KeysetPagination):
     model = Task
     #authentication_classes = (CustomDualAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -39,16 +41,9 @@ class TaskListView(APIView, LimitOffsetPagination):
         accounts = Account.objects.filter(org=self.request.profile.org)
         contacts = Contact.objects.filter(org=self.request.profile.org)
         if self.request.profile.role != "ADMIN" and not self.request.profile.is_admin:
-            queryset = queryset.filter(
-                Q(assigned_to__in=[self.request.profile])
-                | Q(created_by=self.request.profile.user)
-            )
-            accounts = accounts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
-            contacts = contacts.filter(
-                Q(created_by=self.request.profile.user) | Q(assigned_to=self.request.profile)
-            ).distinct()
+            queryset = visible_to(queryset, self.request.profile)
+            accounts = visible_to(accounts, self.request.profile)
+            contacts = visible_to(contacts, self.request.profile)
 
         if params:
             if params.get("title"):
@@ -62,16 +57,11 @@ class TaskListView(APIView, LimitOffsetPagination):
             queryset.distinct(), self.request, view=self
         )
         tasks = TaskSerializer(results_tasks, many=True).data
-        if results_tasks:
-            offset = queryset.filter(id__gte=results_tasks[-1].id).count()
-            if offset == queryset.count():
-                offset = None
-        else:
-            offset = 0
         context.update(
             {
                 "tasks_count": self.count,
-                "offset": offset,
+                "offset": self.next_offset,
+                "next_cursor": self.next_cursor,
             }
         )
         context["tasks"] = tasks
@@ -239,10 +229,11 @@ class TaskDetailView(APIView):
         comment_serializer = CommentSerializer(data=params)
         if comment_serializer.is_valid():
             if params.get("comment"):
-                comment_serializer.save(
+                comment = comment_serializer.save(
                     task_id=self.task_obj.id,
                     commented_by_id=self.request.profile.id,
                 )
+                send_email_user_mentions.delay(comment.id, "tasks")
 
         if self.request.FILES.get("task_attachment"):
             attachment = Attachments()
@@ -0,0 +1,59 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from common.models import Org, Profile, User
+from leads.models import Lead
+from teams.models import Teams
+from teams.tasks import remove_users, update_team_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Time update_team_users and remove_users for a team assigned to many "
+        "records. Everything is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--records", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            team = self.create_team(options["users"], options["records"])
+            profile_ids = [str(_id) for _id in team.users.values_list("id", flat=True)]
+            self.run("update_team_users", update_team_users, str(team.id))
+            self.run("remove_users", remove_users, profile_ids, str(team.id))
+            transaction.set_rollback(True)
+
+    def create_team(self, users, records):
+        org = Org.objects.create(name="benchmark %s" % uuid.uuid4().hex[:8])
+        user_objs = User.objects.bulk_create(
+            [User(email="bench-%s@example.com" % uuid.uuid4().hex) for _ in range(users)]
+        )
+        profiles = Profile.objects.bulk_create(
+            [Profile(user=user, org=org, is_active=True) for user in user_objs]
+        )
+        team = Teams.objects.create(name="benchmark", description="", org=org)
+        team.users.add(*profiles)
+        leads = Lead.objects.bulk_create(
+            [Lead(title="lead %s" % index, org=org) for index in range(records)],
+            batch_size=5000,
+        )
+        Lead.teams.through.objects.bulk_create(
+            [Lead.teams.through(lead_id=lead.id, teams_id=team.id) for lead in leads],
+            batch_size=5000,
+        )
+        return team
+
+    def run(self, name, task, *args):
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.monotonic()
+            task(*args)
+            elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            "%s: %.2fs, %s queries" % (name, elapsed, len(queries.captured_queries))
+        )
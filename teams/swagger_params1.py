@@ -1,6 +1,8 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 
+from common.swagger_params1 import keyset_pagination_params
+
 organization_params_in_header = organization_params_in_header = OpenApiParameter(
     "org", OpenApiTypes.STR, OpenApiParameter.HEADER
 )
@@ -14,4 +16,5 @@ teams_list_get_params = [
     OpenApiParameter("team_name", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("created_by", OpenApiTypes.STR,OpenApiParameter.QUERY),
     OpenApiParameter("assigned_users", OpenApiTypes.STR,OpenApiParameter.QUERY),
+    *keyset_pagination_params(),
 ]
@@ -1,146 +1,161 @@
-from celery import Celery
-
-from common.models import Profile
+from django.conf import settings
+from django.db import connection, transaction
+
+from common import list_cache
+from common.dashboard import reconcile_org
+from common.models import Profile, User
+from common.list_cache import LIST_CACHE_ENTITIES
+from common.visibility import get_entity, refresh_records
+from crm.celery import app
 from teams.models import Teams
 
-app = Celery("redis://")
+# rows written or deleted per statement on the through tables
+TEAM_PROPAGATION_CHUNK_SIZE = getattr(settings, "TEAM_PROPAGATION_CHUNK_SIZE", 10000)
+
+# (related name of the team's records, many to many field holding the members)
+TEAM_MEMBER_FIELDS = (
+    ("account_teams", "assigned_to"),
+    ("contact_teams", "assigned_to"),
+    ("lead_teams", "assigned_to"),
+    ("oppurtunity_teams", "assigned_to"),
+    ("cases_teams", "assigned_to"),
+    ("document_teams", "shared_to"),
+    ("tasks_teams", "assigned_to"),
+    ("invoices_teams", "assigned_to"),
+    ("event_teams", "assigned_to"),
+)
+
+
+def get_member_relations(team):
+    """Yield ``(field, record_ids)`` for every entity type a team propagates
+    its members to, ``field`` being the many to many holding the members."""
+    for related_name, field_name in TEAM_MEMBER_FIELDS:
+        records = getattr(team, related_name)
+        yield (
+            records.model._meta.get_field(field_name),
+            records.values_list("id", flat=True).order_by(),
+        )
+
+
+def _member_ids(profile_ids, by_user):
+    # invoices assign users rather than profiles
+    if by_user:
+        return list(
+            Profile.objects.filter(id__in=profile_ids).values_list("user_id", flat=True)
+        )
+    return list(profile_ids)
+
+
+def _chunks(record_ids, size):
+    chunk = []
+    for record_id in record_ids.iterator(chunk_size=size):
+        chunk.append(record_id)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 @app.task
 def remove_users(removed_users_list, team_id):
-    removed_users_list = [i for i in removed_users_list if i.isdigit()]
-    users_list = Profile.objects.filter(id__in=removed_users_list)
-    if users_list.exists():
-        team = Teams.objects.filter(id=team_id).first()
-        if team:
-            accounts = team.account_teams.all()
-            for account in accounts:
-                for user in users_list:
-                    account.assigned_to.remove(user)
-
-            # for contacts
-            contacts = team.contact_teams.all()
-            for contact in contacts:
-                for user in users_list:
-                    contact.assigned_to.remove(user)
-
-            # for leads
-            leads = team.lead_teams.all()
-            for lead in leads:
-                for user in users_list:
-                    lead.assigned_to.remove(user)
-
-            # for opportunities
-            opportunities = team.oppurtunity_teams.all()
-            for opportunity in opportunities:
-                for user in users_list:
-                    opportunity.assigned_to.remove(user)
-
-            # for cases
-            cases = team.cases_teams.all()
-            for case in cases:
-                for user in users_list:
-                    case.assigned_to.remove(user)
-
-            # for documents
-            docs = team.document_teams.all()
-            for doc in docs:
-                for user in users_list:
-                    doc.shared_to.remove(user)
-
-            # for tasks
-            tasks = team.tasks_teams.all()
-            for task in tasks:
-                for user in users_list:
-                    task.assigned_to.remove(user)
-
-            # for invoices
-            invoices = team.invoices_teams.all()
-            for invoice in invoices:
-                for user in users_list:
-                    invoice.assigned_to.remove(user)
-
-            # for events
-            events = team.event_teams.all()
-            for event in events:
-                for user in users_list:
-                    event.assigned_to.remove(user)
+    """Unassign ``removed_users_list`` from every record of the team with one
+    DELETE per entity type and chunk of records."""
+    profile_ids = list(
+        Profile.objects.filter(id__in=removed_users_list).values_list("id", flat=True)
+    )
+    team = Teams.objects.filter(id=team_id).first()
+    if not (profile_ids and team):
+        return
+    with transaction.atomic():
+        for field, record_ids in get_member_relations(team):
+            through = field.remote_field.through
+            member_ids = _member_ids(profile_ids, field.related_model is User)
+            entity = get_entity(field.model)
+            for chunk in _chunks(record_ids, TEAM_PROPAGATION_CHUNK_SIZE):
+                through.objects.filter(
+                    **{
+                        field.m2m_column_name() + "__in": chunk,
+                        field.m2m_reverse_name() + "__in": member_ids,
+                    }
+                ).delete()
+                if entity:
+                    refresh_records(entity, chunk)
+    if team.org_id:
+        reconcile_org(team.org_id)
+        for entity in LIST_CACHE_ENTITIES:
+            list_cache.invalidate(entity, team.org_id)
+
+
+def _assign_team_members_sql(field):
+    """INSERT ... SELECT adding every team member to the records of the team
+    that don't have them yet, restricted to a chunk of records."""
+    quote = connection.ops.quote_name
+    record_teams = field.model._meta.get_field("teams")
+    team_users = Teams._meta.get_field("users")
+    if field.related_model is User:
+        # invoices assign users rather than profiles
+        member = "profile.%s" % quote(Profile._meta.get_field("user").column)
+        join_profile = "JOIN %s profile ON profile.%s = team_users.%s" % (
+            quote(Profile._meta.db_table),
+            quote(Profile._meta.pk.column),
+            quote(team_users.m2m_reverse_name()),
+        )
+    else:
+        member = "team_users.%s" % quote(team_users.m2m_reverse_name())
+        join_profile = ""
+    return (
+        "INSERT INTO {table} ({record_column}, {member_column}) "
+        "SELECT record_teams.{record_team_record}, {member} "
+        "FROM {record_teams} record_teams "
+        "JOIN {team_users} team_users "
+        "ON team_users.{team_users_team} = record_teams.{record_team_team} "
+        "{join_profile} "
+        "WHERE record_teams.{record_team_team} = %s "
+        "AND record_teams.{record_team_record} IN ({{chunk}}) "
+        "ON CONFLICT DO NOTHING"
+    ).format(
+        table=quote(field.remote_field.through._meta.db_table),
+        record_column=quote(field.m2m_column_name()),
+        member_column=quote(field.m2m_reverse_name()),
+        member=member,
+        record_teams=quote(record_teams.remote_field.through._meta.db_table),
+        record_team_record=quote(record_teams.m2m_column_name()),
+        record_team_team=quote(record_teams.m2m_reverse_name()),
+        team_users=quote(team_users.remote_field.through._meta.db_table),
+        team_users_team=quote(team_users.m2m_column_name()),
+        join_profile=join_profile,
+    )
 
 
 @app.task
 def update_team_users(team_id):
     """this function updates assigned_to field on all models when a team is updated"""
     team = Teams.objects.filter(id=team_id).first()
-    if team:
-        teams_members = team.users.all()
-        # for accounts
-        accounts = team.account_teams.all()
-        for account in accounts:
-            account_assigned_to_users = account.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in account_assigned_to_users:
-                    account.assigned_to.add(team_member)
-
-        # for contacts
-        contacts = team.contact_teams.all()
-        for contact in contacts:
-            contact_assigned_to_users = contact.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in contact_assigned_to_users:
-                    contact.assigned_to.add(team_member)
-
-        # for leads
-        leads = team.lead_teams.all()
-        for lead in leads:
-            lead_assigned_to_users = lead.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in lead_assigned_to_users:
-                    lead.assigned_to.add(team_member)
-
-        # for opportunities
-        opportunities = team.oppurtunity_teams.all()
-        for opportunity in opportunities:
-            opportunity_assigned_to_users = opportunity.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in opportunity_assigned_to_users:
-                    opportunity.assigned_to.add(team_member)
-
-        # for cases
-        cases = team.cases_teams.all()
-        for case in cases:
-            case_assigned_to_users = case.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in case_assigned_to_users:
-                    case.assigned_to.add(team_member)
-
-        # for documents
-        docs = team.document_teams.all()
-        for doc in docs:
-            doc_assigned_to_users = doc.shared_to.all()
-            for team_member in teams_members:
-                if team_member not in doc_assigned_to_users:
-                    doc.shared_to.add(team_member)
-
-        # for tasks
-        tasks = team.tasks_teams.all()
-        for task in tasks:
-            task_assigned_to_users = task.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in task_assigned_to_users:
-                    task.assigned_to.add(team_member)
-
-        # for invoices
-        invoices = team.invoices_teams.all()
-        for invoice in invoices:
-            invoice_assigned_to_users = invoice.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in invoice_assigned_to_users:
-                    invoice.assigned_to.add(team_member)
-
-        # for events
-        events = team.event_teams.all()
-        for event in events:
-            event_assigned_to_users = event.assigned_to.all()
-            for team_member in teams_members:
-                if team_member not in event_assigned_to_users:
-                    event.assigned_to.add(team_member)
+    if not team:
+        return
+    members = team.users.count()
+    if not members:
+        return
+    # records per INSERT so a statement writes around the chunk size in rows
+    records_per_chunk = max(1, TEAM_PROPAGATION_CHUNK_SIZE // members)
+    team_id = Teams._meta.pk.get_db_prep_value(team.pk, connection)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for field, record_ids in get_member_relations(team):
+            sql = _assign_team_members_sql(field)
+            record_pk = field.model._meta.pk
+            entity = get_entity(field.model)
+            for chunk in _chunks(record_ids, records_per_chunk):
+                cursor.execute(
+                    sql.format(chunk=", ".join(["%s"] * len(chunk))),
+                    [team_id]
+                    + [record_pk.get_db_prep_value(pk, connection) for pk in chunk],
+                )
+                if entity:
+                    refresh_records(entity, chunk)
+    # the through tables are written directly, without m2m_changed signals,
+    # the visibility of the records is refreshed per chunk above
+    if team.org_id:
+        reconcile_org(team.org_id)
+        for entity in LIST_CACHE_ENTITIES:
+            list_cache.invalidate(entity, team.org_id)
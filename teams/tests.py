@@ -0,0 +1,82 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from common.models import Org, Profile, User
+from common.visibility import visible_to
+from invoices.models import Invoice
+from leads.models import Lead
+from teams.models import Teams
+from teams.tasks import remove_users, update_team_users
+
+
+class TeamMembersPropagationTestCase(TestCase):
+    def setUp(self):
+        self.org = Org.objects.create(name="test org")
+        self.profiles = []
+        for index in range(2):
+            user = User.objects.create(email="teamMember%s@example.com" % index)
+            self.profiles.append(
+                Profile.objects.create(user=user, org=self.org, is_active=True)
+            )
+        self.team = Teams.objects.create(name="team", description="", org=self.org)
+        self.team.users.add(*self.profiles)
+        self.leads = [
+            Lead.objects.create(title="lead %s" % index, org=self.org)
+            for index in range(3)
+        ]
+        for lead in self.leads:
+            lead.teams.add(self.team)
+        self.leads[0].assigned_to.add(self.profiles[0])
+        self.invoice = Invoice.objects.create(
+            invoice_title="invoice", name="invoice", email="invoice@example.com"
+        )
+        self.invoice.teams.add(self.team)
+
+    def add_members(self, count):
+        for index in range(count):
+            user = User.objects.create(
+                email="teamMember%s@example.com" % len(self.profiles)
+            )
+            profile = Profile.objects.create(user=user, org=self.org, is_active=True)
+            self.profiles.append(profile)
+            self.team.users.add(profile)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            update_team_users(str(self.team.id))
+        return len(queries.captured_queries)
+
+    def test_queries_do_not_grow_with_the_members(self):
+        two_members = self.count_queries()
+        # from the same starting point, with twice the members
+        for lead in self.leads:
+            lead.assigned_to.clear()
+        self.leads[0].assigned_to.add(self.profiles[0])
+        self.invoice.assigned_to.clear()
+        self.add_members(2)
+        self.assertEqual(self.count_queries(), two_members)
+
+    def test_members_are_assigned_to_every_team_record(self):
+        update_team_users(str(self.team.id))
+        for lead in self.leads:
+            self.assertEqual(
+                set(lead.assigned_to.all()), set(self.profiles)
+            )
+        self.assertEqual(
+            set(visible_to(Lead.objects.all(), self.profiles[1])), set(self.leads)
+        )
+        self.assertEqual(
+            set(self.invoice.assigned_to.all()),
+            {profile.user for profile in self.profiles},
+        )
+
+    def test_removed_members_are_unassigned(self):
+        update_team_users(str(self.team.id))
+        remove_users([str(self.profiles[0].id)], str(self.team.id))
+        for lead in self.leads:
+            self.assertEqual(list(lead.assigned_to.all()), [self.profiles[1]])
+        self.assertFalse(visible_to(Lead.objects.all(), self.profiles[0]).exists())
+        self.assertEqual(
+            list(self.invoice.assigned_to.all()), [self.profiles[1].user]
+        )